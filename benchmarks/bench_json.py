@@ -0,0 +1,150 @@
+"""
+Benchmark for json loading (see graph_creation.json_backend)
+
+Compares standard json loader with every installed fast parser,
+with and without projection on fields used by graph builders,
+on files from data directory and on synthetic one image file
+and VG dump.
+
+Usage (in main directory):
+    python benchmarks/bench_json.py
+    python benchmarks/bench_json.py --relationships 200 --images 1000
+
+@by Vadbeg
+"""
+
+
+import os
+import time
+import argparse
+import tempfile
+
+from typing import List, Tuple
+
+from synthetic import write_dataset
+
+from graph_creation import json_backend
+from graph_creation.reader import iter_images
+
+
+DATA_FILES = (('relationships.json', 'attributes.json'),
+              ('relationships2.json', 'attributes2.json'),
+              ('relationships3.json', 'attributes3.json'))
+
+
+def get_backends() -> List[str]:
+    """
+    Gets installed json parsers (standard json first, it is baseline)
+
+    :return: names of parsers
+    """
+
+    res = ['json']
+
+    for name in json_backend.BACKENDS[:-1]:
+        try:
+            json_backend.set_backend(name)
+        except ImportError:
+            continue
+
+        res.append(name)
+
+    json_backend.set_backend()
+
+    return res
+
+
+def measure(relationships_path: str, attributes_path: str, backend: str,
+            projected: bool, repeats: int = 3) -> float:
+    """
+    Measures best time of reading all images
+
+    :param relationships_path: relationships file
+    :param attributes_path: attributes file
+    :param backend: json parser
+    :param projected: keep only fields used by graph builders
+    :param repeats: number of runs
+    :return: time in seconds
+    """
+
+    json_backend.set_backend(backend)
+
+    best = float('inf')
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+
+        for _ in iter_images(relationships_path, attributes_path, projected=projected):
+            pass
+
+        best = min(best, time.perf_counter() - start)
+
+    json_backend.set_backend()
+
+    return best
+
+
+def run(name: str, relationships_path: str, attributes_path: str, repeats: int):
+    """
+    Measures all parsers on one dataset and prints table rows
+
+    :param name: name of dataset
+    :param relationships_path: relationships file
+    :param attributes_path: attributes file
+    :param repeats: number of runs
+    """
+
+    size = (os.path.getsize(relationships_path) + os.path.getsize(attributes_path)) / 2 ** 20
+    baseline = None
+
+    for backend in get_backends():
+        for projected in (False, True):
+            curr_time = measure(relationships_path, attributes_path, backend, projected, repeats=repeats)
+
+            if baseline is None:
+                baseline = curr_time
+
+            print(f'{name:>24} {backend:>9} {str(projected):>9} {curr_time * 1000:>10.1f} '
+                  f'{size / curr_time:>8.1f} {baseline / curr_time:>8.2f}')
+
+
+def main():
+    """
+    Runs benchmark and prints table with times
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark for json loading')
+
+    parser.add_argument('--data', default='data', help='directory with sample files')
+    parser.add_argument('--relationships', type=int, default=200, help='number of relationships in image')
+    parser.add_argument('--images', type=int, default=500, help='number of images in synthetic dump')
+    parser.add_argument('--repeats', type=int, default=3, help='number of runs')
+
+    args = parser.parse_args()
+
+    print(f'{"dataset":>24} {"parser":>9} {"projected":>9} {"time, ms":>10} {"MB/s":>8} {"speedup":>8}')
+
+    datasets: List[Tuple[str, str, str]] = list()
+
+    for relationships_file, attributes_file in DATA_FILES:
+        relationships_path = os.path.join(args.data, relationships_file)
+        attributes_path = os.path.join(args.data, attributes_file)
+
+        if os.path.exists(relationships_path) and os.path.exists(attributes_path):
+            datasets.append((relationships_file, relationships_path, attributes_path))
+
+    with tempfile.TemporaryDirectory() as directory:
+        image_directory = os.path.join(directory, 'image')
+        dump_directory = os.path.join(directory, 'dump')
+
+        datasets.append((f'image, {args.relationships * 50} rel',
+                         *write_dataset(image_directory, args.relationships * 50)))
+        datasets.append((f'dump, {args.images} images',
+                         *write_dataset(dump_directory, args.relationships, images=args.images)))
+
+        for name, relationships_path, attributes_path in datasets:
+            run(name, relationships_path, attributes_path, repeats=args.repeats)
+
+
+if __name__ == '__main__':
+    main()
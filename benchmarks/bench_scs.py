@@ -0,0 +1,129 @@
+"""
+Benchmark for .scs exporter (see gwf_graph.scs_template)
+
+Compares .gwf exporters (GWF built in memory and StreamingGWF) with
+StreamingSCs on synthetic images of different size: best time, size of
+result file and peak memory (measured with tracemalloc in separate run).
+
+Usage (in main directory):
+    python benchmarks/bench_scs.py
+    python benchmarks/bench_scs.py --sizes 100 1000 10000 100000 --repeats 5
+
+@by Vadbeg
+"""
+
+
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+from typing import Callable, Dict, List, Tuple
+
+from synthetic import SceneGenerator
+
+from graph_creation.structure import create_graph_structure, create_graph_structure_attributes
+from gwf_graph.builder import transform
+from gwf_graph.gwf_template import GWF, StreamingGWF
+from gwf_graph.scs_template import StreamingSCs
+
+
+SIZES = (100, 1000, 10000)
+
+
+def create_exporters() -> List[Tuple[str, str, Callable]]:
+    """
+    Creates exporters. Every exporter takes relations, attributes and path
+
+    :return: list of (name, extension, function)
+    """
+
+    def gwf(all_relations: List, all_attributes: List, path: str):
+        transform(GWF(), all_relations=all_relations, all_attributes=all_attributes, name='image', save_path=path)
+
+    def streaming_gwf(all_relations: List, all_attributes: List, path: str):
+        with StreamingGWF(path) as document:
+            transform(document, all_relations=all_relations, all_attributes=all_attributes,
+                      name='image', save_path=path)
+
+    def streaming_scs(all_relations: List, all_attributes: List, path: str):
+        with StreamingSCs(path) as document:
+            transform(document, all_relations=all_relations, all_attributes=all_attributes,
+                      name='image', save_path=path)
+
+    exporters = [('gwf', '.gwf', gwf),
+                 ('streaming gwf', '.gwf', streaming_gwf),
+                 ('streaming scs', '.scs', streaming_scs)]
+
+    return exporters
+
+
+def measure(function: Callable, all_relations: List, all_attributes: List, path: str,
+            repeats: int) -> Dict:
+    """
+    Measures best time, file size and peak memory of exporter
+
+    :param function: exporter
+    :param all_relations: processed relationships
+    :param all_attributes: processed attributes
+    :param path: path of result file
+    :param repeats: number of runs
+    :return: dict with time (s), size (bytes) and peak memory (bytes)
+    """
+
+    best = float('inf')
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(all_relations, all_attributes, path)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(all_relations, all_attributes, path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    res = {'time': best, 'size': os.path.getsize(path), 'peak_memory': peak}
+
+    return res
+
+
+def main():
+    """
+    Runs benchmark and prints table
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark for .scs exporter')
+
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='number of relationships in image')
+    parser.add_argument('--repeats', type=int, default=3, help='number of runs')
+
+    args = parser.parse_args()
+
+    print(f'{"relationships":>13} {"exporter":>14} {"time, ms":>10} {"size, KB":>10} '
+          f'{"peak, KB":>10} {"speedup":>8} {"size ratio":>10}')
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            relationships, attributes = SceneGenerator().create_image(image_id=1, n_relationships=size)
+
+            all_relations = list(create_graph_structure(relationships).items())
+            all_attributes = list(create_graph_structure_attributes(attributes).items())
+
+            baseline = None
+
+            for name, extension, function in create_exporters():
+                res = measure(function, all_relations, all_attributes,
+                              path=os.path.join(directory, f'res{extension}'), repeats=args.repeats)
+
+                if baseline is None:
+                    baseline = res
+
+                print(f'{size:>13} {name:>14} {res["time"] * 1000:>10.1f} {res["size"] / 2 ** 10:>10.1f} '
+                      f'{res["peak_memory"] / 2 ** 10:>10.1f} {baseline["time"] / res["time"]:>8.2f} '
+                      f'{baseline["size"] / res["size"]:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Benchmark for spatial relations (see graph_creation.spatial)
+
+For synthetic images with different number of objects compares
+vectorized pairwise stage (compute_relations + spatial_edges) with
+python loop over pairs. GridIndex queries are compared with full
+vectorized scan of boxes on random small boxes (thousands of objects,
+like merged images).
+
+Usage (in main directory):
+    python benchmarks/bench_spatial.py
+    python benchmarks/bench_spatial.py --objects 100 300 1000 --index-objects 10000 100000
+
+@by Vadbeg
+"""
+
+
+import time
+import random
+import argparse
+
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from synthetic import SceneGenerator
+
+from graph_creation.spatial import Boxes, GridIndex, compute_relations, spatial_edges
+
+
+OBJECTS = (50, 100, 300, 1000)
+INDEX_OBJECTS = (1000, 10000, 100000)
+
+
+def measure(function: Callable, repeats: int) -> float:
+    """
+    Measures best time of function
+
+    :param function: function without arguments
+    :param repeats: number of runs
+    :return: time in seconds
+    """
+
+    best = float('inf')
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def loop_relations(boxes: Boxes) -> List[Tuple[int, int, float]]:
+    """
+    Computes IoU of all pairs with python loop (baseline)
+
+    :param boxes: boxes of image
+    :return: list of (i, j, iou) for overlapping pairs
+    """
+
+    rows = boxes.boxes.tolist()
+    res = list()
+
+    for i, (ax0, ay0, ax1, ay1) in enumerate(rows):
+        area_a = (ax1 - ax0) * (ay1 - ay0)
+
+        for j, (bx0, by0, bx1, by1) in enumerate(rows):
+            width = min(ax1, bx1) - max(ax0, bx0)
+            height = min(ay1, by1) - max(ay0, by0)
+
+            if i == j or width <= 0 or height <= 0:
+                continue
+
+            intersection = width * height
+            res.append((i, j, intersection / (area_a + (bx1 - bx0) * (by1 - by0) - intersection)))
+
+    return res
+
+
+def create_boxes(n_objects: int, size: float = 10000.0, max_box: float = 50.0, seed: int = 0) -> Boxes:
+    """
+    Creates random small boxes on big canvas
+
+    :param n_objects: number of boxes
+    :param size: size of canvas
+    :param max_box: max width and height of box
+    :param seed: seed for random
+    :return: boxes
+    """
+
+    rand = np.random.default_rng(seed)
+
+    corners = rand.uniform(0, size, (n_objects, 2))
+    sizes = rand.uniform(1, max_box, (n_objects, 2))
+
+    res = Boxes(ids=np.arange(n_objects), names=[f'object{idx}' for idx in range(n_objects)],
+                boxes=np.hstack([corners, corners + sizes]))
+
+    return res
+
+
+def run_pairwise(objects: List[int], repeats: int):
+    """
+    Measures pairwise stage and prints table
+
+    :param objects: numbers of objects in image
+    :param repeats: number of runs
+    """
+
+    print(f'{"objects":>8} {"loop, ms":>10} {"numpy, ms":>10} {"speedup":>8} {"edges":>7}')
+
+    for n_objects in objects:
+        relationships, attributes = SceneGenerator().create_image(image_id=1, n_relationships=n_objects * 2)
+        boxes = Boxes.from_json(relationships, attributes)
+
+        loop_time = measure(lambda: loop_relations(boxes), repeats=repeats)
+        numpy_time = measure(lambda: spatial_edges(boxes, relations=compute_relations(boxes)), repeats=repeats)
+
+        print(f'{len(boxes):>8} {loop_time * 1000:>10.1f} {numpy_time * 1000:>10.1f} '
+              f'{loop_time / numpy_time:>8.1f} {len(spatial_edges(boxes)):>7}')
+
+
+def run_index(objects: List[int], queries: int, repeats: int):
+    """
+    Measures region queries and prints table
+
+    :param objects: numbers of boxes
+    :param queries: number of region queries
+    :param repeats: number of runs
+    """
+
+    print(f'{"objects":>8} {"build, ms":>10} {"scan, us":>10} {"grid, us":>10} {"speedup":>8}')
+
+    rand = random.Random(0)
+    regions = list()
+
+    for _ in range(queries):
+        x0, y0 = rand.uniform(0, 9900), rand.uniform(0, 9900)
+        regions.append((x0, y0, x0 + 100, y0 + 100))
+
+    for n_objects in objects:
+        boxes = create_boxes(n_objects)
+        coords = boxes.boxes
+
+        def scan():
+            for x0, y0, x1, y1 in regions:
+                np.flatnonzero((coords[:, 0] <= x1) & (coords[:, 2] >= x0) &
+                               (coords[:, 1] <= y1) & (coords[:, 3] >= y0))
+
+        build_time = measure(lambda: GridIndex(boxes), repeats=repeats)
+
+        index = GridIndex(boxes)
+        index.scan_limit = 0
+
+        def grid():
+            for region in regions:
+                index.query(*region)
+
+        scan_time = measure(scan, repeats=repeats) / queries
+        grid_time = measure(grid, repeats=repeats) / queries
+
+        print(f'{n_objects:>8} {build_time * 1000:>10.1f} {scan_time * 10 ** 6:>10.1f} '
+              f'{grid_time * 10 ** 6:>10.1f} {scan_time / grid_time:>8.2f}')
+
+
+def main():
+    """
+    Runs benchmark and prints tables
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark for spatial relations')
+
+    parser.add_argument('--objects', type=int, nargs='+', default=list(OBJECTS),
+                        help='number of objects in image (pairwise stage)')
+    parser.add_argument('--index-objects', type=int, nargs='+', default=list(INDEX_OBJECTS),
+                        help='number of boxes in grid index')
+    parser.add_argument('--queries', type=int, default=1000, help='number of region queries')
+    parser.add_argument('--repeats', type=int, default=3, help='number of runs')
+
+    args = parser.parse_args()
+
+    run_pairwise(args.objects, repeats=args.repeats)
+    print()
+    run_index(args.index_objects, queries=args.queries, repeats=args.repeats)
+
+
+if __name__ == '__main__':
+    main()
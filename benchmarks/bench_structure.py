@@ -0,0 +1,122 @@
+"""
+Benchmark for create_graph_structure on dense images with hub nodes
+
+Compares indexed duplicate check with the old scan over all
+(predicate, object) tuples of subject (have_predicate).
+
+Usage (in main directory):
+    python benchmarks/bench_structure.py
+
+@by Vadbeg
+"""
+
+
+import time
+import random
+
+from typing import Dict, Set, Tuple
+
+from graph_creation.structure import create_graph_structure, have_predicate
+
+
+SIZES = (1000, 2000, 4000, 8000, 16000)
+
+
+def create_relationships(size: int, hubs: int = 3, seed: int = 0) -> Dict:
+    """
+    Creates raw relationships dict where most relationships start in few hub nodes
+
+    :param size: number of relationships
+    :param hubs: number of hub nodes
+    :param seed: seed for random
+    :return: raw dict of relationships
+    """
+
+    rand = random.Random(seed)
+    predicates = ('on', 'has', 'near', 'wears', 'behind')
+
+    relationships = list()
+
+    for _ in range(size):
+        subject_name = f'hub{rand.randrange(hubs)}'
+        object_name = f'object{rand.randrange(size)}'
+
+        relationship = {'predicate': rand.choice(predicates),
+                        'subject': {'name': subject_name},
+                        'object': {'names': [object_name]}}
+        relationships.append(relationship)
+
+    res = {'relationships': relationships, 'image_id': 0}
+
+    return res
+
+
+def create_graph_structure_scan(relationships: Dict) -> Dict[str, Set[Tuple[str, str]]]:
+    """
+    Old version of create_graph_structure (linear scan for every relationship)
+
+    :param relationships: raw dict of relationships
+    :return: processed relationships
+    """
+
+    result = dict()
+
+    for relationship in relationships['relationships']:
+        predicate = relationship['predicate']
+        object_info = relationship['object']
+        subject_info = relationship['subject']
+
+        object_name = object_info['names'][0] if 'names' in object_info else object_info.get('name', '')
+        subject_name = subject_info['names'][0] if 'names' in subject_info else subject_info.get('name', '')
+
+        result.setdefault(subject_name, set())
+
+        if have_predicate(result[subject_name], object_name):
+            continue
+
+        result[subject_name].add((predicate, object_name))
+
+    return result
+
+
+def measure(function, relationships: Dict, repeats: int = 3) -> float:
+    """
+    Measures best time of function call
+
+    :param function: function to measure
+    :param relationships: raw dict of relationships
+    :param repeats: number of calls
+    :return: time in seconds
+    """
+
+    best = float('inf')
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(relationships)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main():
+    """
+    Runs benchmark and prints table with times
+    """
+
+    print(f'{"size":>8} {"indexed, ms":>12} {"us/rel":>8} {"scan, ms":>10} {"us/rel":>8}')
+
+    for size in SIZES:
+        relationships = create_relationships(size)
+
+        assert create_graph_structure(relationships) == create_graph_structure_scan(relationships)
+
+        indexed_time = measure(create_graph_structure, relationships)
+        scan_time = measure(create_graph_structure_scan, relationships, repeats=1)
+
+        print(f'{size:>8} {indexed_time * 1000:>12.2f} {indexed_time / size * 10**6:>8.2f} '
+              f'{scan_time * 1000:>10.2f} {scan_time / size * 10**6:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+Benchmark suite for all conversion stages
+
+For every size synthetic image is generated (see synthetic.py) and
+every stage is timed separately. Peak memory of stage is measured
+with tracemalloc in separate run (tracemalloc slows code down).
+Results are written into json file, which can be compared with
+results of other run.
+
+Usage (in main directory):
+    python benchmarks/run_benchmarks.py --sizes 10 100 1000 10000 -o results.json
+    python benchmarks/run_benchmarks.py -o new.json --compare results.json
+
+@by Vadbeg
+"""
+
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+from synthetic import write_dataset
+
+from graph_creation.structure import create_graph_structure, create_graph_structure_attributes
+from pyvis_graph.GraphCreation import create_graph
+from gwf_graph.builder import transform
+from gwf_graph.gwf_template import GWF
+
+
+SIZES = (10, 100, 1000, 10000, 100000)
+STAGES = ('json_load', 'create_graph_structure', 'create_graph_structure_attributes',
+          'create_graph', 'transform+save')
+
+
+def create_stages(directory: str) -> List[Tuple[str, Callable[[Dict], None]]]:
+    """
+    Creates stages. Every stage takes state dict, reads outputs of previous stages
+    from it and adds its own
+
+    :param directory: directory with relationships.json and attributes.json
+    :return: list of (name, function) pairs
+    """
+
+    def json_load(state: Dict):
+        with open(os.path.join(directory, 'relationships.json'), 'rb') as file:
+            state['relationships'] = json.load(file)
+
+        with open(os.path.join(directory, 'attributes.json'), 'rb') as file:
+            state['attributes'] = json.load(file)
+
+    def structure(state: Dict):
+        state['graph_structure'] = create_graph_structure(state['relationships'])
+
+    def structure_attributes(state: Dict):
+        state['graph_structure_attributes'] = create_graph_structure_attributes(state['attributes'])
+
+    def html(state: Dict):
+        filepath = os.path.join(directory, 'res.html')
+
+        create_graph(state['graph_structure'], state['graph_structure_attributes'], filepath,
+                     image_src=state['attributes']['image_url'])
+
+    def gwf(state: Dict):
+        transform(GWF(), all_relations=list(state['graph_structure'].items()),
+                  all_attributes=list(state['graph_structure_attributes'].items()),
+                  name='image', save_path=os.path.join(directory, 'res.gwf'))
+
+    stages = [('json_load', json_load),
+              ('create_graph_structure', structure),
+              ('create_graph_structure_attributes', structure_attributes),
+              ('create_graph', html),
+              ('transform+save', gwf)]
+
+    return stages
+
+
+def run_stages(stages: List[Tuple[str, Callable[[Dict], None]]], selected: Tuple[str, ...],
+               trace_memory: bool) -> Dict[str, float]:
+    """
+    Runs all stages once
+
+    :param stages: list of (name, function) pairs
+    :param selected: names of stages which are measured (others are run only to get their outputs)
+    :param trace_memory: measure peak memory instead of time
+    :return: time (or peak memory in bytes) of every selected stage
+    """
+
+    state = dict()
+    res = dict()
+
+    for name, function in stages:
+        if trace_memory and name in selected:
+            tracemalloc.start()
+            function(state)
+            res[name] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            start = time.perf_counter()
+            function(state)
+            res[name] = time.perf_counter() - start
+
+    res = {name: value for name, value in res.items() if name in selected}
+
+    return res
+
+
+def run_size(size: int, selected: Tuple[str, ...], repeats: int) -> List[Dict]:
+    """
+    Runs benchmark for one size
+
+    :param size: number of relationships in image
+    :param selected: names of measured stages
+    :param repeats: number of timed runs (best time is used)
+    :return: list of results
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_dataset(directory, n_relationships=size)
+        stages = create_stages(directory)
+
+        times = dict()
+
+        for _ in range(repeats):
+            for name, seconds in run_stages(stages, selected, trace_memory=False).items():
+                times[name] = min(times.get(name, float('inf')), seconds)
+
+        peaks = run_stages(stages, selected, trace_memory=True)
+
+    results = [{'size': size, 'stage': name, 'seconds': times[name], 'peak_bytes': peaks[name]}
+               for name in STAGES if name in selected]
+
+    return results
+
+
+def get_meta() -> Dict:
+    """
+    Creates description of environment
+
+    :return: meta information
+    """
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    meta = {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': commit}
+
+    return meta
+
+
+def compare(results: List[Dict], baseline: List[Dict], threshold: float) -> List[str]:
+    """
+    Compares results with baseline
+
+    :param results: current results
+    :param baseline: results of other run
+    :param threshold: relative slowdown (or memory growth) which is regression
+    :return: list of regressions
+    """
+
+    baseline = {(result['size'], result['stage']): result for result in baseline}
+    regressions = list()
+
+    print(f'{"size":>8} {"stage":<36} {"time":>8} {"memory":>8}')
+
+    for result in results:
+        old = baseline.get((result['size'], result['stage']))
+
+        if old is None:
+            continue
+
+        time_ratio = result['seconds'] / max(old['seconds'], 1e-9)
+        memory_ratio = result['peak_bytes'] / max(old['peak_bytes'], 1)
+
+        print(f'{result["size"]:>8} {result["stage"]:<36} {time_ratio:>7.2f}x {memory_ratio:>7.2f}x')
+
+        if time_ratio > 1 + threshold or memory_ratio > 1 + threshold:
+            regressions.append(f'{result["stage"]} ({result["size"]}): '
+                               f'time {time_ratio:.2f}x, memory {memory_ratio:.2f}x')
+
+    return regressions
+
+
+def main(args: Optional[List[str]] = None):
+    """
+    Command line entry point
+
+    :param args: command line arguments (sys.argv by default)
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmarks all conversion stages on synthetic images')
+
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES),
+                        help='numbers of relationships in image')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES), help='measured stages')
+    parser.add_argument('--repeats', type=int, default=3, help='number of timed runs')
+    parser.add_argument('-o', '--output', default='bench_results.json', help='file for results')
+    parser.add_argument('--compare', default=None, help='results of other run')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative change which is regression')
+
+    args = parser.parse_args(args)
+
+    results = list()
+
+    print(f'{"size":>8} {"stage":<36} {"seconds":>10} {"peak, MB":>10}')
+
+    for size in args.sizes:
+        for result in run_size(size, selected=tuple(args.stages), repeats=args.repeats):
+            results.append(result)
+
+            print(f'{size:>8} {result["stage"]:<36} {result["seconds"]:>10.4f} '
+                  f'{result["peak_bytes"] / 2 ** 20:>10.2f}')
+
+    with open(args.output, 'w') as file:
+        json.dump({'meta': get_meta(), 'results': results}, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+
+        regressions = compare(results, baseline, threshold=args.threshold)
+
+        for regression in regressions:
+            print(f'regression: {regression}')
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
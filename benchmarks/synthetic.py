@@ -0,0 +1,203 @@
+"""
+Generator of synthetic VisualGenome-like relationships and attributes
+
+Names are drawn from Zipf distribution, so there are hub nodes
+(like "man" or "building") and names repeat as in real images.
+
+Usage (in main directory):
+    python benchmarks/synthetic.py out_dir --relationships 10000 --images 1
+
+@by Vadbeg
+"""
+
+
+import os
+import json
+import random
+import argparse
+import itertools
+
+from typing import Dict, List, Tuple, Optional
+
+
+HUB_NAMES = ['man', 'building', 'tree', 'window', 'person', 'woman', 'shirt', 'wall', 'sign', 'table']
+PREDICATES = ['on', 'has', 'in', 'of', 'wearing', 'near', 'with', 'above', 'behind', 'holding',
+              'ON', 'wears', 'next to', 'under', 'sitting on', 'in front of', 'on top of', 'by']
+ATTRIBUTES = ['white', 'black', 'blue', 'green', 'red', 'brown', 'large', 'small', 'tall', 'wooden',
+              'metal', 'grey', 'parked', 'standing', 'open', 'yellow', 'long', 'dark', 'round', 'far away']
+
+
+def get_zipf_weights(size: int, exponent: float = 1.1) -> List[float]:
+    """
+    Creates cumulative Zipf weights
+
+    :param size: number of values
+    :param exponent: Zipf exponent
+    :return: cumulative weights (for random.choices)
+    """
+
+    weights = [1 / (rank ** exponent) for rank in range(1, size + 1)]
+    cum_weights = list(itertools.accumulate(weights))
+
+    return cum_weights
+
+
+class SceneGenerator:
+    """
+    Generates images in VG format
+    """
+
+    def __init__(self, vocabulary_size: int = 5000, seed: int = 0):
+        """
+        :param vocabulary_size: number of object names
+        :param seed: seed for random
+        """
+
+        self.rand = random.Random(seed)
+
+        self.names = HUB_NAMES + [f'object{idx}' for idx in range(max(vocabulary_size - len(HUB_NAMES), 0))]
+        self.names_weights = get_zipf_weights(len(self.names))
+
+        self.predicates_weights = get_zipf_weights(len(PREDICATES))
+        self.attributes_weights = get_zipf_weights(len(ATTRIBUTES))
+
+        self.object_id = 0
+        self.relationship_id = 0
+
+    def create_object(self) -> Dict:
+        """
+        Creates object record (with box, synsets and attributes)
+
+        :return: object record
+        """
+
+        self.object_id += 1
+
+        name = self.rand.choices(self.names, cum_weights=self.names_weights)[0]
+        n_attributes = self.rand.choice((0, 0, 1, 1, 2, 3))
+
+        object_record = {'synsets': [f'{name.split()[0]}.n.01'],
+                         'h': self.rand.randint(5, 500), 'w': self.rand.randint(5, 500),
+                         'x': self.rand.randint(0, 800), 'y': self.rand.randint(0, 600),
+                         'object_id': self.object_id,
+                         'names': [name]}
+
+        if n_attributes:
+            object_record['attributes'] = self.rand.choices(ATTRIBUTES, cum_weights=self.attributes_weights,
+                                                            k=n_attributes)
+
+        return object_record
+
+    def create_image(self, image_id: int, n_relationships: int) -> Tuple[Dict, Dict]:
+        """
+        Creates relationships and attributes records for one image
+
+        :param image_id: id of image
+        :param n_relationships: number of relationships
+        :return: relationships and attributes records
+        """
+
+        objects = [self.create_object() for _ in range(max(n_relationships // 2, 2))]
+        objects_weights = get_zipf_weights(len(objects), exponent=0.8)
+
+        relationships = list()
+
+        for _ in range(n_relationships):
+            subject, object_record = self.rand.choices(objects, cum_weights=objects_weights, k=2)
+            self.relationship_id += 1
+
+            relationship = {'predicate': self.rand.choices(PREDICATES, cum_weights=self.predicates_weights)[0],
+                            'object': self.__as_relationship_object__(object_record),
+                            'relationship_id': self.relationship_id,
+                            'synsets': [],
+                            'subject': self.__as_relationship_object__(subject)}
+            relationships.append(relationship)
+
+        relationships_record = {'relationships': relationships, 'image_id': image_id}
+        attributes_record = {'image_id': image_id,
+                             'image_url': f'https://example.com/VG_100K/{image_id}.jpg',
+                             'attributes': objects}
+
+        return relationships_record, attributes_record
+
+    def __as_relationship_object__(self, object_record: Dict) -> Dict:
+        """
+        Creates object in relationship format (VG uses both "name" and "names")
+
+        :param object_record: object record
+        :return: object for relationship
+        """
+
+        res = {key: value for key, value in object_record.items() if key not in ('attributes', 'names')}
+
+        if self.rand.random() < 0.5:
+            res['name'] = object_record['names'][0]
+        else:
+            res['names'] = object_record['names']
+
+        return res
+
+
+def write_dataset(directory: str, n_relationships: int, images: int = 1,
+                  seed: int = 0) -> Tuple[str, str]:
+    """
+    Writes relationships.json and attributes.json. One image is written
+    in one image format, several images are written as full VG dumps
+
+    :param directory: directory for files
+    :param n_relationships: number of relationships in every image
+    :param images: number of images
+    :param seed: seed for random
+    :return: paths to relationships and attributes files
+    """
+
+    os.makedirs(directory, exist_ok=True)
+
+    generator = SceneGenerator(seed=seed)
+
+    relationships_path = os.path.join(directory, 'relationships.json')
+    attributes_path = os.path.join(directory, 'attributes.json')
+
+    with open(relationships_path, 'w') as relationships_file, open(attributes_path, 'w') as attributes_file:
+        if images > 1:
+            relationships_file.write('[')
+            attributes_file.write('[')
+
+        for image_id in range(1, images + 1):
+            relationships, attributes = generator.create_image(image_id, n_relationships)
+
+            if image_id > 1:
+                relationships_file.write(',\n')
+                attributes_file.write(',\n')
+
+            json.dump(relationships, relationships_file)
+            json.dump(attributes, attributes_file)
+
+        if images > 1:
+            relationships_file.write(']')
+            attributes_file.write(']')
+
+    return relationships_path, attributes_path
+
+
+def main(args: Optional[List[str]] = None):
+    """
+    Command line entry point
+
+    :param args: command line arguments (sys.argv by default)
+    """
+
+    parser = argparse.ArgumentParser(description='Writes synthetic VG relationships and attributes')
+
+    parser.add_argument('directory', help='directory for files')
+    parser.add_argument('--relationships', type=int, default=1000, help='number of relationships in image')
+    parser.add_argument('--images', type=int, default=1, help='number of images')
+    parser.add_argument('--seed', type=int, default=0, help='seed for random')
+
+    args = parser.parse_args(args)
+
+    write_dataset(args.directory, n_relationships=args.relationships, images=args.images, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,553 @@
+"""
+Knowledge graph of whole dataset, built incrementally
+
+Every subject-predicate-object triple (and subject-attribute pair)
+of all images is stored once, with number of occurrences and ids
+of images where it was found. Images are added one by one, already
+added images are skipped, so graph can be checkpointed and extended
+later without reprocessing old images. Checkpoint keeps offsets of
+reader in dataset files, so resumed build doesn't parse added images.
+
+Unlike create_graph_structure, all predicates between subject and
+object are kept (first predicate rule is for one image view only).
+
+Usage:
+    python -m graph_creation.aggregate relationships.json attributes.json \
+        --checkpoint kg.pickle --html kg.html --gwf kg.gwf --top-k 500
+
+@by Vadbeg
+"""
+
+
+import os
+import json
+import pickle
+import hashlib
+import argparse
+import tempfile
+
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from graph_creation.reader import iter_images_with_offsets
+from graph_creation.scene_graph import Vocabulary, get_name
+from graph_creation.instrumentation import logger
+
+if TYPE_CHECKING:
+    from pyvis_graph.level_of_detail import LevelOfDetail
+
+
+CHECKPOINT_VERSION = 2
+TYPECODE = 'I'
+
+
+class KnowledgeGraph:
+    """
+    Merged graph of many images. Strings are interned in vocabulary,
+    triples and attribute pairs are stored in array columns
+    """
+
+    def __init__(self, max_images_per_edge: Optional[int] = 100):
+        """
+        :param max_images_per_edge: max number of image ids stored for every triple
+            and attribute pair (None to store all). Counts are always exact
+        """
+
+        self.max_images_per_edge = max_images_per_edge
+
+        self.vocabulary = Vocabulary()
+        self.image_ids = set()
+
+        # dataset files and reader offsets in them after the last added image
+        self.source = None
+        self.offsets = None
+
+        self.triple_index = dict()  # (subject, predicate, object) ids -> row
+        self.triple_subjects = array(TYPECODE)
+        self.triple_predicates = array(TYPECODE)
+        self.triple_objects = array(TYPECODE)
+        self.triple_counts = array(TYPECODE)
+        self.triple_images = list()
+
+        self.attribute_index = dict()  # (subject, attribute) ids -> row
+        self.attribute_subjects = array(TYPECODE)
+        self.attribute_values = array(TYPECODE)
+        self.attribute_counts = array(TYPECODE)
+        self.attribute_images = list()
+
+    def __len__(self) -> int:
+        return len(self.triple_counts) + len(self.attribute_counts)
+
+    def __str__(self) -> str:
+        res = (f'KnowledgeGraph(images: {len(self.image_ids)}, triples: {len(self.triple_counts)}, '
+               f'attribute pairs: {len(self.attribute_counts)}, strings: {len(self.vocabulary)})')
+
+        return res
+
+    def __add_images__(self, images: List[array], row: int, image_id: Optional[int]):
+        """
+        Adds image id to row (if limit isn't reached)
+
+        :param images: list of image ids arrays
+        :param row: row index
+        :param image_id: id of image
+        """
+
+        if image_id is None:
+            return
+
+        row_images = images[row]
+
+        if self.max_images_per_edge is None or len(row_images) < self.max_images_per_edge:
+            row_images.append(image_id)
+
+    def add_image(self, relationships: Dict, attributes: Optional[Dict] = None) -> bool:
+        """
+        Adds one image into graph
+
+        :param relationships: raw dict of relationships for image
+        :param attributes: raw dict of attributes for image
+        :return: False if image was already added
+        """
+
+        image_id = relationships.get('image_id')
+
+        if image_id is None and attributes is not None:
+            image_id = attributes.get('image_id')
+
+        # image without id is keyed by its content, so it isn't added again on resume
+        image_key = image_id if image_id is not None else get_content_key(relationships, attributes)
+
+        if image_key in self.image_ids:
+            return False
+
+        self.image_ids.add(image_key)
+
+        add = self.vocabulary.add
+
+        triples = Counter((add(get_name(relationship['subject'])),
+                           add(relationship['predicate']),
+                           add(get_name(relationship['object'])))
+                          for relationship in relationships['relationships'])
+
+        for triple, count in triples.items():
+            row = self.triple_index.get(triple)
+
+            if row is None:
+                row = len(self.triple_counts)
+                self.triple_index[triple] = row
+
+                self.triple_subjects.append(triple[0])
+                self.triple_predicates.append(triple[1])
+                self.triple_objects.append(triple[2])
+                self.triple_counts.append(0)
+                self.triple_images.append(array(TYPECODE))
+
+            self.triple_counts[row] += count
+            self.__add_images__(self.triple_images, row, image_id)
+
+        if attributes is None:
+            return True
+
+        pairs = Counter((add(subject), add(real_attribute))
+                        for attribute in attributes['attributes']
+                        for subject in attribute.get('names', list())
+                        for real_attribute in attribute.get('attributes', list()))
+
+        for pair, count in pairs.items():
+            row = self.attribute_index.get(pair)
+
+            if row is None:
+                row = len(self.attribute_counts)
+                self.attribute_index[pair] = row
+
+                self.attribute_subjects.append(pair[0])
+                self.attribute_values.append(pair[1])
+                self.attribute_counts.append(0)
+                self.attribute_images.append(array(TYPECODE))
+
+            self.attribute_counts[row] += count
+            self.__add_images__(self.attribute_images, row, image_id)
+
+        return True
+
+    def add_images(self, images: Iterable[Tuple[Dict, Dict]], checkpoint_path: Optional[str] = None,
+                   checkpoint_every: int = 10000) -> int:
+        """
+        Adds images into graph, saving checkpoint every checkpoint_every new images
+
+        :param images: iterator over (relationships, attributes) pairs (for example iter_images)
+        :param checkpoint_path: path to checkpoint file (None to disable checkpoints)
+        :param checkpoint_every: number of new images between checkpoints
+        :return: number of new images
+        """
+
+        added = 0
+
+        for relationships, attributes in images:
+            if not self.add_image(relationships, attributes):
+                continue
+
+            added += 1
+
+            if checkpoint_path is not None and added % checkpoint_every == 0:
+                self.save(checkpoint_path)
+                logger.info('checkpoint: %s', self)
+
+        if checkpoint_path is not None and added:
+            self.save(checkpoint_path)
+
+        return added
+
+    def __iter_dataset__(self, relationships_path: str, attributes_path: str) -> Iterator[Tuple[Dict, Dict]]:
+        """
+        Reads images of dataset files. If they are the files of checkpoint,
+        reading starts from saved offsets. Offsets are updated before image
+        is yielded, so checkpoint saved after image is added holds them
+
+        :param relationships_path: relationships file (one image or VG dump)
+        :param attributes_path: attributes file (one image or VG dump)
+        :return: iterator over (relationships, attributes) pairs
+        """
+
+        source = get_source(relationships_path, attributes_path)
+        offsets = self.offsets if source == self.source else None
+
+        if offsets is not None:
+            logger.info('reading from offsets %s of %s', offsets, source)
+
+        self.source = source
+        self.offsets = offsets
+
+        for relationships, attributes, curr_offsets in iter_images_with_offsets(relationships_path, attributes_path,
+                                                                                 offsets=offsets):
+            if curr_offsets is not None:
+                self.offsets = curr_offsets
+
+            yield relationships, attributes
+
+    def add_dataset(self, relationships_path: str, attributes_path: str, checkpoint_path: Optional[str] = None,
+                    checkpoint_every: int = 10000) -> int:
+        """
+        Adds images of dataset files (images before offsets of checkpoint aren't read again)
+
+        :param relationships_path: relationships file (one image or VG dump)
+        :param attributes_path: attributes file (one image or VG dump)
+        :param checkpoint_path: path to checkpoint file (None to disable checkpoints)
+        :param checkpoint_every: number of new images between checkpoints
+        :return: number of new images
+        """
+
+        res = self.add_images(self.__iter_dataset__(relationships_path, attributes_path),
+                              checkpoint_path=checkpoint_path, checkpoint_every=checkpoint_every)
+
+        return res
+
+    def triples(self) -> Iterator[Tuple[str, str, str, int, List[int]]]:
+        """
+        Iterates over all triples
+
+        :return: iterator over (subject, predicate, object, count, image ids)
+        """
+
+        names = self.vocabulary.names
+
+        for row in range(len(self.triple_counts)):
+            yield (names[self.triple_subjects[row]], names[self.triple_predicates[row]],
+                   names[self.triple_objects[row]], self.triple_counts[row], self.triple_images[row].tolist())
+
+    def attribute_pairs(self) -> Iterator[Tuple[str, str, int, List[int]]]:
+        """
+        Iterates over all subject-attribute pairs
+
+        :return: iterator over (subject, attribute, count, image ids)
+        """
+
+        names = self.vocabulary.names
+
+        for row in range(len(self.attribute_counts)):
+            yield (names[self.attribute_subjects[row]], names[self.attribute_values[row]],
+                   self.attribute_counts[row], self.attribute_images[row].tolist())
+
+    def to_structures(self, top_k: Optional[int] = 1000, top_k_attributes: Optional[int] = None,
+                      min_count: int = 1, with_counts: bool = False
+                      ) -> Tuple[Dict[str, Set[Tuple[str, str]]], Dict[str, Set[str]]]:
+        """
+        Creates processed relationships and attributes (format of create_graph_structure
+        and create_graph_structure_attributes) from most frequent triples and pairs
+
+        :param top_k: number of most frequent triples (None for all)
+        :param top_k_attributes: number of most frequent attribute pairs (top_k if None)
+        :param min_count: min number of occurrences
+        :param with_counts: add number of occurrences to predicate labels (for example 'on (12)')
+        :return: processed relationships and attributes
+        """
+
+        if top_k_attributes is None:
+            top_k_attributes = top_k
+
+        names = self.vocabulary.names
+
+        graph_structure = dict()
+
+        for row in get_top_rows(self.triple_counts, top_k, min_count):
+            predicate = names[self.triple_predicates[row]]
+
+            if with_counts:
+                predicate = f'{predicate} ({self.triple_counts[row]})'
+
+            graph_structure.setdefault(names[self.triple_subjects[row]], set()).add(
+                (predicate, names[self.triple_objects[row]]))
+
+        graph_structure_attributes = dict()
+
+        for row in get_top_rows(self.attribute_counts, top_k_attributes, min_count):
+            graph_structure_attributes.setdefault(names[self.attribute_subjects[row]], set()).add(
+                names[self.attribute_values[row]])
+
+        return graph_structure, graph_structure_attributes
+
+    def save_html(self, filepath: str, top_k: Optional[int] = 1000, min_count: int = 1,
+                  static_layout: bool = False, level_of_detail: Optional['LevelOfDetail'] = None):
+        """
+        Writes most frequent part of graph into .html file (pyvis-like page)
+
+        :param filepath: path to .html file
+        :param top_k: number of most frequent triples and attribute pairs
+        :param min_count: min number of occurrences
+        :param static_layout: compute node positions in python and turn off physics in browser
+        :param level_of_detail: level-of-detail cut (None to render all top_k triples and attribute pairs)
+        """
+
+        from pyvis_graph.html_renderer import save_graph
+
+        graph_structure, graph_structure_attributes = self.to_structures(top_k=top_k, min_count=min_count,
+                                                                         with_counts=True)
+
+        save_graph(graph_structure, graph_structure_attributes, filepath=filepath, static_layout=static_layout,
+                   level_of_detail=level_of_detail)
+
+    def save_gwf(self, save_path: str, name: str = 'knowledge_graph', top_k: Optional[int] = 1000,
+                 min_count: int = 1):
+        """
+        Writes most frequent part of graph into .gwf file
+
+        :param save_path: path to .gwf file
+        :param name: name of contour
+        :param top_k: number of most frequent triples and attribute pairs
+        :param min_count: min number of occurrences
+        """
+
+        from gwf_graph.builder import transform
+        from gwf_graph.gwf_template import StreamingGWF
+
+        graph_structure, graph_structure_attributes = self.to_structures(top_k=top_k, min_count=min_count)
+
+        with StreamingGWF(save_path) as gwf:
+            transform(gwf, all_relations=list(graph_structure.items()),
+                      all_attributes=list(graph_structure_attributes.items()),
+                      name=name, save_path=save_path)
+
+    def save(self, path: str):
+        """
+        Saves checkpoint (file is replaced atomically, so interrupted save doesn't break old checkpoint)
+
+        :param path: path to checkpoint file
+        """
+
+        state = {'version': CHECKPOINT_VERSION,
+                 'max_images_per_edge': self.max_images_per_edge,
+                 'names': self.vocabulary.names,
+                 'image_ids': self.image_ids,
+                 'source': self.source,
+                 'offsets': self.offsets,
+                 'triples': (self.triple_subjects, self.triple_predicates, self.triple_objects,
+                             self.triple_counts, self.triple_images),
+                 'attributes': (self.attribute_subjects, self.attribute_values,
+                                self.attribute_counts, self.attribute_images)}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.')
+
+        with os.fdopen(fd, mode='wb') as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'KnowledgeGraph':
+        """
+        Loads checkpoint (only trusted files, checkpoint is pickle)
+
+        :param path: path to checkpoint file
+        :return: knowledge graph
+        """
+
+        with open(path, mode='rb') as file:
+            state = pickle.load(file)
+
+        if state.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f'Unsupported checkpoint version: {state.get("version")}')
+
+        graph = cls(max_images_per_edge=state['max_images_per_edge'])
+
+        for name in state['names']:
+            graph.vocabulary.add(name)
+
+        graph.image_ids = state['image_ids']
+
+        graph.source = state['source']
+        graph.offsets = state['offsets']
+
+        (graph.triple_subjects, graph.triple_predicates, graph.triple_objects,
+         graph.triple_counts, graph.triple_images) = state['triples']
+        (graph.attribute_subjects, graph.attribute_values,
+         graph.attribute_counts, graph.attribute_images) = state['attributes']
+
+        graph.triple_index = {triple: row for row, triple in enumerate(zip(graph.triple_subjects,
+                                                                           graph.triple_predicates,
+                                                                           graph.triple_objects))}
+        graph.attribute_index = {pair: row for row, pair in enumerate(zip(graph.attribute_subjects,
+                                                                          graph.attribute_values))}
+
+        return graph
+
+
+def get_content_key(relationships: Dict, attributes: Optional[Dict]) -> str:
+    """
+    Creates key of image without image_id from its content
+
+    :param relationships: raw dict of relationships for image
+    :param attributes: raw dict of attributes for image
+    :return: key
+    """
+
+    encoded = json.dumps([relationships, attributes], sort_keys=True, separators=(',', ':'),
+                         ensure_ascii=False).encode('utf-8')
+
+    res = 'sha256:' + hashlib.sha256(encoded).hexdigest()
+
+    return res
+
+
+def get_source(relationships_path: str, attributes_path: str) -> Tuple[Tuple[str, int, int], ...]:
+    """
+    Identifies dataset files (offsets of checkpoint are valid only for the same files)
+
+    :param relationships_path: relationships file
+    :param attributes_path: attributes file
+    :return: (absolute path, size, modification time in ns) of both files
+    """
+
+    res = list()
+
+    for path in (relationships_path, attributes_path):
+        stat = os.stat(path)
+        res.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+
+    res = tuple(res)
+
+    return res
+
+
+def get_top_rows(counts: array, top_k: Optional[int], min_count: int = 1) -> List[int]:
+    """
+    Gets rows with biggest counts
+
+    :param counts: counts column
+    :param top_k: number of rows (None for all)
+    :param min_count: min count
+    :return: row indices (from most frequent)
+    """
+
+    rows = [row for row, count in enumerate(counts) if count >= min_count]
+    rows.sort(key=counts.__getitem__, reverse=True)
+
+    if top_k is not None:
+        rows = rows[:top_k]
+
+    return rows
+
+
+def build_knowledge_graph(relationships_path: str, attributes_path: str,
+                          checkpoint_path: Optional[str] = None, checkpoint_every: int = 10000,
+                          max_images_per_edge: Optional[int] = 100) -> KnowledgeGraph:
+    """
+    Builds knowledge graph from dataset files. If checkpoint exists,
+    graph is loaded from it and only new images are added (for the same
+    files reading starts after the last image of checkpoint)
+
+    :param relationships_path: relationships file (one image or VG dump)
+    :param attributes_path: attributes file (one image or VG dump)
+    :param checkpoint_path: path to checkpoint file (None to disable checkpoints)
+    :param checkpoint_every: number of new images between checkpoints
+    :param max_images_per_edge: max number of image ids stored for every edge (for new graph)
+    :return: knowledge graph
+    """
+
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        graph = KnowledgeGraph.load(checkpoint_path)
+        logger.info('resumed from %s: %s', checkpoint_path, graph)
+    else:
+        graph = KnowledgeGraph(max_images_per_edge=max_images_per_edge)
+
+    added = graph.add_dataset(relationships_path, attributes_path,
+                              checkpoint_path=checkpoint_path, checkpoint_every=checkpoint_every)
+
+    logger.info('added %d images: %s', added, graph)
+
+    return graph
+
+
+def cli(args: Optional[List[str]] = None):
+    """
+    Command line entry point
+
+    :param args: command line arguments (sys.argv by default)
+    """
+
+    from graph_creation.instrumentation import configure
+
+    parser = argparse.ArgumentParser(description='Builds knowledge graph of whole dataset')
+
+    parser.add_argument('relationships', help='relationships file (one image or VG dump)')
+    parser.add_argument('attributes', help='attributes file (one image or VG dump)')
+    parser.add_argument('--checkpoint', default=None, help='checkpoint file (graph is resumed from it)')
+    parser.add_argument('--checkpoint-every', type=int, default=10000, help='number of images between checkpoints')
+    parser.add_argument('--max-images-per-edge', type=int, default=100,
+                        help='max number of image ids stored for every edge')
+    parser.add_argument('--html', default=None, help='path to .html file')
+    parser.add_argument('--gwf', default=None, help='path to .gwf file')
+    parser.add_argument('--top-k', type=int, default=1000,
+                        help='number of most frequent triples (and attribute pairs) in .html and .gwf files')
+    parser.add_argument('--min-count', type=int, default=1, help='min number of occurrences in .html and .gwf files')
+    parser.add_argument('--max-nodes', type=int, default=None,
+                        help='level-of-detail cut of .html file: max number of nodes (highest degree first)')
+    parser.add_argument('--cluster-predicates', action='store_true',
+                        help='merge leaf objects of the same subject and predicate in .html file')
+
+    args = parser.parse_args(args)
+
+    configure(level='INFO')
+
+    graph = build_knowledge_graph(args.relationships, args.attributes, checkpoint_path=args.checkpoint,
+                                  checkpoint_every=args.checkpoint_every,
+                                  max_images_per_edge=args.max_images_per_edge)
+
+    if args.html:
+        level_of_detail = None
+
+        if args.max_nodes is not None:
+            from pyvis_graph.level_of_detail import LevelOfDetail
+
+            level_of_detail = LevelOfDetail(max_nodes=args.max_nodes, cluster_predicates=args.cluster_predicates)
+
+        graph.save_html(args.html, top_k=args.top_k, min_count=args.min_count, level_of_detail=level_of_detail)
+
+    if args.gwf:
+        graph.save_gwf(args.gwf, top_k=args.top_k, min_count=args.min_count)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,477 @@
+"""
+Batch conversion of all images in dataset into .html, .gwf and .scs files
+
+Dataset is a directory with one image files (relationships<suffix>.json
+and attributes<suffix>.json), a pair of full VG dumps
+or binary store (see graph_creation.store).
+
+Usage:
+    python -m graph_creation.batch ../data -o res --format html gwf --workers 8
+    python -m graph_creation.batch relationships.json --attributes attributes.json -o res
+
+@by Vadbeg
+"""
+
+
+import os
+import sys
+import time
+import glob
+import argparse
+import contextlib
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple, Union, TYPE_CHECKING
+
+from graph_creation.reader import iter_images
+from graph_creation.json_backend import load
+from graph_creation.cache import get_cache
+from graph_creation.store import is_store, open_store
+from graph_creation.instrumentation import Profiler, Stats, configure, logger, stats
+
+if TYPE_CHECKING:
+    from pyvis_graph.level_of_detail import LevelOfDetail
+
+
+FORMATS = ('html', 'gwf', 'scs')
+DEFAULT_FORMATS = ('html', 'gwf')
+
+
+class BatchResult:
+    """
+    Summary of batch conversion
+    """
+
+    def __init__(self):
+        self.converted = 0
+        self.failed = list()
+        self.retried = 0
+        self.elapsed = 0.0
+
+        self.stats = Stats(enabled=True)
+
+    @property
+    def throughput(self) -> float:
+        """
+        Number of converted images per second
+        """
+
+        if self.elapsed == 0:
+            return 0.0
+
+        return self.converted / self.elapsed
+
+    def __str__(self) -> str:
+        res = (f'converted: {self.converted}, failed: {len(self.failed)}, '
+               f'retried: {self.retried}, {self.elapsed:.1f}s, '
+               f'{self.throughput:.1f} images/s')
+
+        return res
+
+
+def iter_directory_tasks(directory: str) -> Iterator[Dict]:
+    """
+    Creates task for every one image file pair in directory.
+    Files are read by workers. Files of different pairs can hold the same
+    image, so names of result files start with stem of relationships file
+
+    :param directory: directory with relationships<suffix>.json and attributes<suffix>.json
+    :return: iterator over tasks
+    """
+
+    pattern = os.path.join(directory, 'relationships*.json')
+
+    for relationships_path in sorted(glob.glob(pattern)):
+        filename = os.path.basename(relationships_path)
+        attributes_path = os.path.join(directory, filename.replace('relationships', 'attributes', 1))
+
+        if not os.path.exists(attributes_path):
+            attributes_path = None
+
+        task = {'key': filename,
+                'prefix': os.path.splitext(filename)[0] + '_',
+                'relationships': relationships_path,
+                'attributes': attributes_path}
+
+        yield task
+
+
+def iter_dump_tasks(relationships_path: str, attributes_path: str) -> Iterator[Dict]:
+    """
+    Creates task for every image in full VG dumps
+
+    :param relationships_path: path to relationships dump
+    :param attributes_path: path to attributes dump
+    :return: iterator over tasks
+    """
+
+    for relationships, attributes in iter_images(relationships_path, attributes_path):
+        task = {'key': str(relationships.get('image_id')),
+                'relationships': relationships,
+                'attributes': attributes}
+
+        yield task
+
+
+def iter_store_tasks(directory: str) -> Iterator[Dict]:
+    """
+    Creates task for every image in store (see graph_creation.store).
+    Workers load images from memory mapped store
+
+    :param directory: store directory
+    :return: iterator over tasks
+    """
+
+    for image_id in open_store(directory).image_ids():
+        task = {'key': str(image_id),
+                'store': directory,
+                'image_id': image_id}
+
+        yield task
+
+
+def convert_store_task(task: Dict, output_dir: str, formats: Tuple[str, ...], layout: bool = False,
+                       level_of_detail: Optional['LevelOfDetail'] = None) -> str:
+    """
+    Converts one image of store. Runs in worker process.
+    Raw json isn't available here, so result cache isn't used
+
+    :param task: task with store directory and image id
+    :param output_dir: directory for result files
+    :param formats: output formats ('html', 'gwf' and/or 'scs')
+    :param layout: compute node coordinates (static layout for .html files)
+    :param level_of_detail: level-of-detail cut of .html files (None to render all nodes and edges)
+    :return: image id
+    """
+
+    store = open_store(task['store'])
+    image_id = task['image_id']
+
+    scene_graph = store.get(image_id)
+
+    if 'html' in formats:
+        from pyvis_graph.html_renderer import save_graph
+
+        save_graph(scene_graph, None, filepath=os.path.join(output_dir, f'{image_id}.html'),
+                   image_src=store.get_image_url(image_id), static_layout=layout,
+                   level_of_detail=level_of_detail)
+
+    if 'gwf' in formats:
+        from gwf_graph.json2gwf import write_gwf
+
+        write_gwf(scene_graph, None, save_path=os.path.join(output_dir, f'{image_id}.gwf'),
+                  name=f'image_{image_id}', layout=layout)
+
+    if 'scs' in formats:
+        from gwf_graph.json2scs import write_scs
+
+        write_scs(scene_graph, None, save_path=os.path.join(output_dir, f'{image_id}.scs'),
+                  name=f'image_{image_id}')
+
+    return str(image_id)
+
+
+def _load(source: Union[str, Dict, None], key: str) -> Dict:
+    """
+    Loads image record if task holds path to it
+
+    :param source: path to one image file, record or None
+    :param key: key of list in record ('relationships' or 'attributes')
+    :return: image record
+    """
+
+    if source is None:
+        return {key: list()}
+
+    if isinstance(source, str):
+        return load(source)
+
+    return source
+
+
+def convert_task(task: Dict, output_dir: str, formats: Tuple[str, ...], layout: bool = False,
+                 cache_dir: Optional[str] = None, cache_size: int = 2 ** 30,
+                 level_of_detail: Optional['LevelOfDetail'] = None) -> str:
+    """
+    Converts one image. Runs in worker process.
+
+    :param task: task with relationships and attributes (records or paths)
+    :param output_dir: directory for result files
+    :param formats: output formats ('html', 'gwf' and/or 'scs')
+    :param layout: compute node coordinates (static layout for .html files)
+    :param cache_dir: directory of result files cache (None to disable cache)
+    :param cache_size: max size of cache in bytes
+    :param level_of_detail: level-of-detail cut of .html files (None to render all nodes and edges)
+    :return: image id
+    """
+
+    if 'store' in task:
+        return convert_store_task(task, output_dir, formats, layout=layout, level_of_detail=level_of_detail)
+
+    cache = get_cache(cache_dir, max_size=cache_size)
+
+    relationships = _load(task['relationships'], key='relationships')
+    attributes = _load(task['attributes'], key='attributes')
+
+    image_id = relationships.get('image_id', attributes.get('image_id', task['key']))
+    filename = task.get('prefix', '') + str(image_id)
+
+    if 'html' in formats:
+        from pyvis_graph.GraphCreation import convert_image as convert_html
+
+        res_file = os.path.join(output_dir, f'{filename}.html')
+        convert_html(relationships, attributes, res_file=res_file, static_layout=layout, cache=cache,
+                     level_of_detail=level_of_detail)
+
+    if 'gwf' in formats:
+        from gwf_graph.json2gwf import convert_image as convert_gwf
+
+        save_path = os.path.join(output_dir, f'{filename}.gwf')
+        convert_gwf(relationships, attributes, save_path=save_path, name=f'image_{image_id}',
+                    layout=layout, cache=cache)
+
+    if 'scs' in formats:
+        from gwf_graph.json2scs import convert_image as convert_scs
+
+        save_path = os.path.join(output_dir, f'{filename}.scs')
+        convert_scs(relationships, attributes, save_path=save_path, name=f'image_{image_id}', cache=cache)
+
+    return str(image_id)
+
+
+_profiler = None
+
+
+def init_worker(log_level: Optional[str] = None, stats_enabled: bool = False,
+                profile_dir: Optional[str] = None):
+    """
+    Configures instrumentation in worker process
+
+    :param log_level: log level (None to keep default)
+    :param stats_enabled: collect per-stage timers and counters
+    :param profile_dir: directory for cProfile dumps (one file per worker), None to disable
+    """
+
+    global _profiler
+
+    configure(level=log_level, stats_enabled=stats_enabled)
+
+    if profile_dir is not None:
+        _profiler = Profiler(path=os.path.join(profile_dir, f'worker_{os.getpid()}.prof'))
+
+
+def run_task(task: Dict, output_dir: str, formats: Tuple[str, ...], layout: bool = False,
+             cache_dir: Optional[str] = None, cache_size: int = 2 ** 30,
+             level_of_detail: Optional['LevelOfDetail'] = None) -> Tuple[str, Dict]:
+    """
+    Converts one image (under profiler if it is enabled). Runs in worker process.
+
+    :param task: task with relationships and attributes (records or paths)
+    :param output_dir: directory for result files
+    :param formats: output formats ('html', 'gwf' and/or 'scs')
+    :param layout: compute node coordinates (static layout for .html files)
+    :param cache_dir: directory of result files cache (None to disable cache)
+    :param cache_size: max size of cache in bytes
+    :param level_of_detail: level-of-detail cut of .html files (None to render all nodes and edges)
+    :return: image id and stats of this task
+    """
+
+    with _profiler or contextlib.nullcontext():
+        image_id = convert_task(task, output_dir, formats, layout=layout,
+                                cache_dir=cache_dir, cache_size=cache_size, level_of_detail=level_of_detail)
+
+    return image_id, stats.pop()
+
+
+def run_batch(tasks: Iterator[Dict], output_dir: str, formats: Tuple[str, ...] = DEFAULT_FORMATS,
+              workers: Optional[int] = None, retries: int = 1, progress_every: int = 1000,
+              layout: bool = False, cache_dir: Optional[str] = None,
+              cache_size: int = 2 ** 30, log_level: Optional[str] = None,
+              stats_enabled: bool = False, profile_dir: Optional[str] = None,
+              level_of_detail: Optional['LevelOfDetail'] = None) -> BatchResult:
+    """
+    Converts all tasks on process pool. Failed tasks are retried
+    and skipped after all retries.
+
+    Only limited number of tasks is submitted at once, so
+    memory doesn't depend on dataset size.
+
+    :param tasks: iterator over tasks
+    :param output_dir: directory for result files
+    :param formats: output formats ('html', 'gwf' and/or 'scs')
+    :param workers: number of worker processes (cpu count by default)
+    :param retries: number of retries for failed image
+    :param progress_every: log throughput after every N images (0 to disable)
+    :param layout: compute node coordinates (static layout for .html files)
+    :param cache_dir: directory of result files cache (None to disable cache)
+    :param cache_size: max size of cache in bytes
+    :param log_level: log level in worker processes (None to keep default)
+    :param stats_enabled: collect per-stage timers and counters (result.stats)
+    :param profile_dir: directory for cProfile dumps of worker processes (None to disable)
+    :param level_of_detail: level-of-detail cut of .html files (None to render all nodes and edges)
+    :return: summary of conversion
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    result = BatchResult()
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 4
+
+    tasks = iter(tasks)
+    in_flight = dict()
+    start = time.perf_counter()
+
+    def create_executor() -> ProcessPoolExecutor:
+        res = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                  initargs=(log_level, stats_enabled, profile_dir))
+
+        return res
+
+    def submit(curr_task: Dict, attempt: int):
+        future = executor.submit(run_task, curr_task, output_dir, formats, layout, cache_dir, cache_size,
+                                 level_of_detail)
+        in_flight[future] = (curr_task, attempt)
+
+    executor = create_executor()
+
+    try:
+        for task in tasks:
+            submit(task, attempt=0)
+
+            if len(in_flight) >= max_in_flight:
+                break
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+            # dead worker breaks the pool: all its tasks fail, they are retried in new pool
+            if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                logger.warning('worker process died, restarting %d tasks in new process pool', len(in_flight))
+
+                executor.shutdown(wait=True)
+                executor = create_executor()
+
+                done = list(in_flight)
+
+            for future in done:
+                task, attempt = in_flight.pop(future)
+                error = future.exception()
+
+                if error is None:
+                    result.converted += 1
+                    result.stats.merge(future.result()[1])
+
+                    if progress_every and result.converted % progress_every == 0:
+                        result.elapsed = time.perf_counter() - start
+                        logger.info('%s', result)
+                elif attempt < retries:
+                    logger.warning('%s failed (%r), retrying', task['key'], error)
+
+                    result.retried += 1
+                    submit(task, attempt=attempt + 1)
+                else:
+                    result.failed.append((task['key'], repr(error)))
+
+            for task in tasks:
+                submit(task, attempt=0)
+
+                if len(in_flight) >= max_in_flight:
+                    break
+    finally:
+        executor.shutdown(wait=True)
+
+    result.elapsed = time.perf_counter() - start
+
+    return result
+
+
+def create_parser() -> argparse.ArgumentParser:
+    """
+    Creates parser for command line arguments
+
+    :return: parser
+    """
+
+    parser = argparse.ArgumentParser(description='Converts all images in dataset into .html and .gwf files')
+
+    parser.add_argument('dataset', help='directory with one image files, store directory or relationships dump')
+    parser.add_argument('--attributes', help='attributes dump (if dataset is relationships dump)')
+    parser.add_argument('-o', '--output-dir', default='res', help='directory for result files')
+    parser.add_argument('--format', nargs='+', choices=FORMATS, default=list(DEFAULT_FORMATS), dest='formats',
+                        help='output formats')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--retries', type=int, default=1, help='number of retries for failed image')
+    parser.add_argument('--progress-every', type=int, default=1000,
+                        help='log throughput after every N images with --log-level INFO (0 to disable)')
+    parser.add_argument('--layout', action='store_true',
+                        help='compute node coordinates (and turn off physics in .html files)')
+    parser.add_argument('--max-nodes', type=int, default=None,
+                        help='level-of-detail cut of .html files: max number of nodes (highest degree first)')
+    parser.add_argument('--max-edges', type=int, default=1000, help='max number of edges with --max-nodes')
+    parser.add_argument('--attribute-nodes', action='store_true',
+                        help='keep attributes as nodes with --max-nodes (they are collapsed into count badge)')
+    parser.add_argument('--cluster-predicates', action='store_true',
+                        help='merge leaf objects of the same subject and predicate with --max-nodes')
+    parser.add_argument('--cache-dir', default=None, help='directory of result files cache (images which '
+                                                          'didn\'t change aren\'t rebuilt)')
+    parser.add_argument('--cache-size', type=int, default=1024, help='max size of cache in MB')
+    parser.add_argument('--log-level', default=None, choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+                        help='log level (nothing is logged by default)')
+    parser.add_argument('--stats', action='store_true', help='print per-stage timers and counters')
+    parser.add_argument('--profile-dir', default=None, help='directory for cProfile dumps of workers')
+
+    return parser
+
+
+def cli(args: Optional[List[str]] = None):
+    """
+    Command line entry point
+
+    :param args: command line arguments (sys.argv by default)
+    """
+
+    args = create_parser().parse_args(args)
+
+    configure(level=args.log_level)
+
+    if is_store(args.dataset):
+        tasks = iter_store_tasks(args.dataset)
+    elif os.path.isdir(args.dataset):
+        tasks = iter_directory_tasks(args.dataset)
+    elif args.attributes:
+        tasks = iter_dump_tasks(args.dataset, args.attributes)
+    else:
+        raise SystemExit('--attributes is required when dataset is relationships dump')
+
+    level_of_detail = None
+
+    if args.max_nodes is not None:
+        from pyvis_graph.level_of_detail import LevelOfDetail
+
+        level_of_detail = LevelOfDetail(max_nodes=args.max_nodes, max_edges=args.max_edges,
+                                        collapse_attributes=not args.attribute_nodes,
+                                        cluster_predicates=args.cluster_predicates)
+
+    result = run_batch(tasks, output_dir=args.output_dir, formats=tuple(args.formats),
+                       workers=args.workers, retries=args.retries,
+                       progress_every=args.progress_every, layout=args.layout,
+                       cache_dir=args.cache_dir, cache_size=args.cache_size * 2 ** 20,
+                       log_level=args.log_level, stats_enabled=args.stats, profile_dir=args.profile_dir,
+                       level_of_detail=level_of_detail)
+
+    print(result, file=sys.stderr)
+
+    if args.stats:
+        print(result.stats.report(), file=sys.stderr)
+
+    for key, error in result.failed:
+        print(f'failed: {key}: {error}', file=sys.stderr)
+
+    if result.failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,247 @@
+"""
+On-disk cache of result files (.html and .gwf)
+
+Key is hash of image relationships, attributes, output settings and
+sources of modules which build result files, so unchanged images aren't
+rebuilt and files of older code are never served. Cache has size limit, least
+recently used files are removed first.
+
+@by Vadbeg
+"""
+
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import importlib.util
+
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+CACHE_VERSION = 2
+
+# modules which change bytes of result files
+OUTPUT_MODULES = ('graph_creation.structure',
+                  'graph_creation.scene_graph',
+                  'graph_creation.layout',
+                  'gwf_graph.gwf_template',
+                  'gwf_graph.id_allocator',
+                  'gwf_graph.json2gwf',
+                  'gwf_graph.scs_template',
+                  'gwf_graph.json2scs',
+                  'pyvis_graph.GraphCreation',
+                  'pyvis_graph.html_renderer',
+                  'pyvis_graph.level_of_detail')
+
+_code_version = None
+
+
+def get_code_version() -> str:
+    """
+    Creates hash of sources of output modules (modules aren't imported, computed once per process)
+
+    :return: hex digest
+    """
+
+    global _code_version
+
+    if _code_version is None:
+        digest = hashlib.sha256(str(CACHE_VERSION).encode('utf-8'))
+
+        for name in OUTPUT_MODULES:
+            spec = importlib.util.find_spec(name)
+
+            with open(spec.origin, mode='rb') as file:
+                digest.update(name.encode('utf-8'))
+                digest.update(file.read())
+
+        _code_version = digest.hexdigest()
+
+    return _code_version
+
+
+def get_key(relationships: Dict, attributes: Dict, settings: Dict) -> str:
+    """
+    Creates cache key for image
+
+    :param relationships: raw dict of relationships for image
+    :param attributes: raw dict of attributes for image
+    :param settings: output settings (format and its options)
+    :return: hex digest
+    """
+
+    data = {'version': get_code_version(),
+            'relationships': relationships,
+            'attributes': attributes,
+            'settings': settings}
+
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    key = hashlib.sha256(encoded).hexdigest()
+
+    return key
+
+
+class OutputCache:
+    """
+    Cache of result files with LRU eviction. Several processes can use
+    the same directory, every process evicts files by its own view of cache
+    """
+
+    def __init__(self, directory: str, max_size: int = 2 ** 30):
+        """
+        :param directory: cache directory
+        :param max_size: max size of cache in bytes
+        """
+
+        self.directory = directory
+        self.max_size = max_size
+
+        self.entries = OrderedDict()  # path -> size, from least to most recently used
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.__load_entries__()
+
+    def __load_entries__(self):
+        """
+        Reads existing cache files (ordered by modification time)
+        """
+
+        entries = list()
+
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.startswith('.'):
+                    continue
+
+                path = os.path.join(dirpath, filename)
+                stat = os.stat(path)
+
+                entries.append((stat.st_mtime, path, stat.st_size))
+
+        for _, path, size in sorted(entries):
+            self.entries[path] = size
+            self.size += size
+
+    def __get_path__(self, key: str, extension: str) -> str:
+        """
+        Creates path to cache file
+
+        :param key: cache key
+        :param extension: file extension (for example '.html')
+        :return: path
+        """
+
+        path = os.path.join(self.directory, key[:2], key + extension)
+
+        return path
+
+    def __evict__(self):
+        """
+        Removes least recently used files while cache is bigger than max_size
+        """
+
+        while self.size > self.max_size and self.entries:
+            path, size = self.entries.popitem(last=False)
+            self.size -= size
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, key: str, extension: str, res_file: str) -> bool:
+        """
+        Copies cached file into res_file (if it is in cache)
+
+        :param key: cache key
+        :param extension: file extension (for example '.html')
+        :param res_file: path to result file
+        :return: True if file was in cache
+        """
+
+        path = self.__get_path__(key, extension)
+
+        try:
+            shutil.copyfile(path, res_file)
+        except FileNotFoundError:
+            self.size -= self.entries.pop(path, 0)
+            self.misses += 1
+
+            return False
+
+        # file can be evicted by other process right after it is copied
+        try:
+            os.utime(path)
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            self.size -= self.entries.pop(path, 0)
+            self.misses += 1
+
+            return False
+
+        if path in self.entries:
+            self.entries.move_to_end(path)
+        else:
+            self.entries[path] = size
+            self.size += size
+
+        self.hits += 1
+
+        return True
+
+    def put(self, key: str, extension: str, res_file: str):
+        """
+        Adds result file into cache
+
+        :param key: cache key
+        :param extension: file extension (for example '.html')
+        :param res_file: path to result file
+        """
+
+        path = self.__get_path__(key, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # file is copied into temporary file first, so other processes never see half of it
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.')
+        os.close(fd)
+
+        shutil.copyfile(res_file, tmp_path)
+        os.replace(tmp_path, path)
+
+        self.size -= self.entries.pop(path, 0)
+        self.entries[path] = os.path.getsize(path)
+        self.size += self.entries[path]
+
+        self.__evict__()
+
+
+_caches = dict()
+
+
+def get_cache(directory: Optional[str], max_size: int = 2 ** 30) -> Optional[OutputCache]:
+    """
+    Gets cache for directory (one object per process, so files are listed only once)
+
+    :param directory: cache directory (None means no cache)
+    :param max_size: max size of cache in bytes
+    :return: cache or None
+    """
+
+    if directory is None:
+        return None
+
+    cache = _caches.get(directory)
+
+    if cache is None:
+        cache = OutputCache(directory, max_size=max_size)
+        _caches[directory] = cache
+
+    return cache
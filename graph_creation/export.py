@@ -0,0 +1,491 @@
+"""
+Export of scene graphs for analytics tools
+
+Processed relationships and attributes (see graph_creation.structure)
+of every image are written as edges keyed by image id:
+
+    image_id, source, target, label, kind
+
+kind is 'relation' (label is predicate) or 'attribute' (target is
+attribute, label is empty). Writers get images one by one and write
+them at once (edge list, GraphML) or in chunks of rows (columnar
+formats), so memory doesn't depend on dataset size:
+
+    - .tsv / .csv: edge list with header
+    - .graphml: one directed graph, nodes and edges have image_id
+    - .parquet: one row group per chunk (needs pyarrow)
+    - .npz: chunks of integer columns and vocabulary of strings (needs only numpy)
+
+Usage:
+    python -m graph_creation.export relationships.json attributes.json -o edges.parquet
+    python -m graph_creation.export store -o edges.tsv
+
+@by Vadbeg
+"""
+
+
+import os
+import csv
+import zipfile
+import argparse
+import importlib.util
+
+from xml.sax.saxutils import escape
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union, TextIO, BinaryIO
+
+from graph_creation.reader import iter_images
+from graph_creation.structure import create_graph_structure, create_graph_structure_attributes
+from graph_creation.scene_graph import SceneGraph, Vocabulary, get_relation_items, get_attribute_items
+from graph_creation.store import is_store, open_store
+from graph_creation.instrumentation import logger, stats
+
+
+FORMATS = ('tsv', 'csv', 'graphml', 'parquet', 'npz')
+COLUMNS = ('image_id', 'source', 'target', 'label', 'kind')
+KINDS = ('relation', 'attribute')
+
+
+def iter_edges(graph_structure: Union[Dict[str, Set[Tuple[str, str]]], SceneGraph],
+               graph_structure_attributes: Optional[Dict[str, Set[str]]] = None
+               ) -> Iterator[Tuple[str, str, str, str]]:
+    """
+    Creates edges of one image (sorted, so output doesn't depend on order of sets)
+
+    :param graph_structure: processed relationships or scene graph
+    :param graph_structure_attributes: attributes for every node
+        (can be None if graph_structure is scene graph)
+    :return: iterator over (source, target, label, kind)
+    """
+
+    if graph_structure_attributes is None:
+        graph_structure_attributes = graph_structure
+
+    for subject, relations in get_relation_items(graph_structure):
+        for predicate, object_name in sorted(relations):
+            yield subject, object_name, predicate, 'relation'
+
+    for subject, attributes in get_attribute_items(graph_structure_attributes):
+        for attribute in sorted(attributes):
+            yield subject, attribute, '', 'attribute'
+
+
+class ExportWriter:
+    """
+    Base class of writers. Images are added one by one with add_image
+    """
+
+    mode = 'w'
+
+    def __init__(self, target: Union[str, TextIO, BinaryIO]):
+        """
+        :param target: path to result file or file object
+        """
+
+        if isinstance(target, str):
+            if self.mode == 'w':
+                self.file = open(target, mode='w', encoding='utf-8', newline='')
+            else:
+                self.file = open(target, mode=self.mode)
+
+            self.is_own_file = True
+        else:
+            self.file = target
+            self.is_own_file = False
+
+        self.images = 0
+        self.edges = 0
+
+        self.is_closed = False
+
+    def __str__(self) -> str:
+        res = f'{type(self).__name__}({self.file!r}, images={self.images}, edges={self.edges})'
+
+        return res
+
+    def __enter__(self) -> 'ExportWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __write_image__(self, image_id: int, edges: List[Tuple[str, str, str, str]]):
+        """
+        Writes edges of one image
+
+        :param image_id: id of image
+        :param edges: list of (source, target, label, kind)
+        """
+
+        raise NotImplementedError
+
+    def __finish__(self):
+        """
+        Writes everything which is left before file is closed
+        """
+
+    def add_image(self, image_id: int, graph_structure: Union[Dict[str, Set[Tuple[str, str]]], SceneGraph],
+                  graph_structure_attributes: Optional[Dict[str, Set[str]]] = None):
+        """
+        Writes one image
+
+        :param image_id: id of image
+        :param graph_structure: processed relationships or scene graph
+        :param graph_structure_attributes: attributes for every node
+            (can be None if graph_structure is scene graph)
+        """
+
+        edges = list(iter_edges(graph_structure, graph_structure_attributes))
+
+        with stats.stage('export_write'):
+            self.__write_image__(image_id, edges)
+
+        self.images += 1
+        self.edges += len(edges)
+
+        stats.count('export_edges', len(edges))
+
+    def close(self):
+        """
+        Finishes file and closes it (if it was opened by this object)
+        """
+
+        if self.is_closed:
+            return
+
+        self.__finish__()
+
+        if self.is_own_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+        self.is_closed = True
+
+
+class EdgeListWriter(ExportWriter):
+    """
+    Writes edges as rows of .tsv (or .csv) file
+    """
+
+    def __init__(self, target: Union[str, TextIO], delimiter: str = '\t'):
+        """
+        :param target: path to result file or text file object
+        :param delimiter: delimiter of columns ('\\t' or ',')
+        """
+
+        super().__init__(target)
+
+        self.writer = csv.writer(self.file, delimiter=delimiter, lineterminator='\n')
+        self.writer.writerow(COLUMNS)
+
+    def __write_image__(self, image_id: int, edges: List[Tuple[str, str, str, str]]):
+        self.writer.writerows((image_id, *edge) for edge in edges)
+
+
+class GraphMLWriter(ExportWriter):
+    """
+    Writes all images into one directed graph of .graphml file (tools
+    like networkx and Gephi read only the first graph of document).
+    Every image has its own nodes, node data is name and image_id,
+    edge data is label, kind and image_id
+    """
+
+    def __init__(self, target: Union[str, TextIO]):
+        """
+        :param target: path to result file or text file object
+        """
+
+        super().__init__(target)
+
+        self.file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                        '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                        '  <key id="name" for="node" attr.name="name" attr.type="string"/>\n'
+                        '  <key id="node_image_id" for="node" attr.name="image_id" attr.type="long"/>\n'
+                        '  <key id="label" for="edge" attr.name="label" attr.type="string"/>\n'
+                        '  <key id="kind" for="edge" attr.name="kind" attr.type="string"/>\n'
+                        '  <key id="edge_image_id" for="edge" attr.name="image_id" attr.type="long"/>\n'
+                        '  <graph id="scene_graphs" edgedefault="directed">\n')
+
+    def __write_image__(self, image_id: int, edges: List[Tuple[str, str, str, str]]):
+        # ids of nodes should be unique in whole graph, so they have image prefix
+        node_ids = dict()
+        lines = list()
+
+        for source, target, _, _ in edges:
+            for name in (source, target):
+                if name not in node_ids:
+                    node_ids[name] = f'i{image_id}n{len(node_ids)}'
+                    lines.append(f'    <node id="{node_ids[name]}"><data key="name">{escape(name)}</data>'
+                                 f'<data key="node_image_id">{image_id}</data></node>\n')
+
+        for source, target, label, kind in edges:
+            lines.append(f'    <edge source="{node_ids[source]}" target="{node_ids[target]}">'
+                         f'<data key="label">{escape(label)}</data><data key="kind">{kind}</data>'
+                         f'<data key="edge_image_id">{image_id}</data></edge>\n')
+
+        self.file.write(''.join(lines))
+
+    def __finish__(self):
+        self.file.write('  </graph>\n'
+                        '</graphml>\n')
+
+
+class ColumnarWriter(ExportWriter):
+    """
+    Collects rows into columns and writes them in chunks: as row groups of .parquet
+    file (with pyarrow) or as arrays of .npz file (strings are coded with vocabulary,
+    which is written at the end)
+    """
+
+    mode = 'wb'
+
+    def __init__(self, target: Union[str, BinaryIO], file_format: Optional[str] = None,
+                 chunk_size: int = 2 ** 20):
+        """
+        :param target: path to result file or binary file object
+        :param file_format: 'parquet' or 'npz' (None for parquet if pyarrow is installed)
+        :param chunk_size: number of rows in chunk
+        """
+
+        has_pyarrow = importlib.util.find_spec('pyarrow') is not None
+
+        if file_format is None:
+            file_format = 'parquet' if has_pyarrow else 'npz'
+
+        if file_format not in ('parquet', 'npz'):
+            raise ValueError(f'Unknown columnar format: {file_format}')
+
+        # checked before target is opened, so it isn't truncated
+        if file_format == 'parquet' and not has_pyarrow:
+            raise ValueError('.parquet needs pyarrow (pip install -e .[parquet]), use .npz instead')
+
+        super().__init__(target)
+
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self.chunks = 0
+
+        self.columns = {column: list() for column in COLUMNS}
+
+        if file_format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            self.schema = pa.schema([('image_id', pa.int64()), ('source', pa.string()), ('target', pa.string()),
+                                     ('label', pa.string()), ('kind', pa.string())])
+            self.writer = pq.ParquetWriter(self.file, self.schema)
+        else:
+            self.vocabulary = Vocabulary()
+            self.writer = zipfile.ZipFile(self.file, mode='w', compression=zipfile.ZIP_DEFLATED)
+
+    def __write_image__(self, image_id: int, edges: List[Tuple[str, str, str, str]]):
+        columns = self.columns
+
+        for source, target, label, kind in edges:
+            columns['image_id'].append(image_id)
+            columns['source'].append(source)
+            columns['target'].append(target)
+            columns['label'].append(label)
+            columns['kind'].append(kind)
+
+        if len(columns['image_id']) >= self.chunk_size:
+            self.flush()
+
+    def __write_array__(self, name: str, values):
+        """
+        Writes array into .npz file
+
+        :param name: name of array
+        :param values: numpy array
+        """
+
+        import numpy as np
+
+        with self.writer.open(f'{name}.npy', mode='w', force_zip64=True) as file:
+            np.lib.format.write_array(file, values, allow_pickle=False)
+
+    def flush(self):
+        """
+        Writes collected rows as one chunk
+        """
+
+        if not self.columns['image_id']:
+            return
+
+        if self.file_format == 'parquet':
+            import pyarrow as pa
+
+            self.writer.write_table(pa.Table.from_pydict(self.columns, schema=self.schema))
+        else:
+            import numpy as np
+
+            prefix = f'chunk_{self.chunks:06d}'
+            self.__write_array__(f'{prefix}/image_id', np.array(self.columns['image_id'], dtype=np.int64))
+
+            for column in ('source', 'target', 'label'):
+                values = [self.vocabulary.add(value) for value in self.columns[column]]
+                self.__write_array__(f'{prefix}/{column}', np.array(values, dtype=np.uint32))
+
+            kinds = [KINDS.index(kind) for kind in self.columns['kind']]
+            self.__write_array__(f'{prefix}/kind', np.array(kinds, dtype=np.uint8))
+
+        self.chunks += 1
+        self.columns = {column: list() for column in COLUMNS}
+
+    def __finish__(self):
+        self.flush()
+
+        if self.file_format == 'parquet':
+            self.writer.close()
+        else:
+            import numpy as np
+
+            self.__write_array__('vocabulary', np.array(self.vocabulary.names, dtype=np.str_))
+            self.__write_array__('kinds', np.array(KINDS, dtype=np.str_))
+            self.writer.close()
+
+
+def iter_npz_chunks(path: str) -> Iterator[Dict[str, List]]:
+    """
+    Reads .npz file of ColumnarWriter chunk by chunk
+
+    :param path: path to .npz file
+    :return: iterator over chunks (dicts with columns, strings are decoded)
+    """
+
+    import numpy as np
+
+    with np.load(path, allow_pickle=False) as data:
+        vocabulary = data['vocabulary']
+        kinds = data['kinds']
+
+        chunks = sorted({name.split('/')[0] for name in data.files if name.startswith('chunk_')})
+
+        for chunk in chunks:
+            res = {'image_id': data[f'{chunk}/image_id'],
+                   'source': vocabulary[data[f'{chunk}/source']],
+                   'target': vocabulary[data[f'{chunk}/target']],
+                   'label': vocabulary[data[f'{chunk}/label']],
+                   'kind': kinds[data[f'{chunk}/kind']]}
+
+            yield res
+
+
+def get_format(path: str) -> str:
+    """
+    Gets export format from extension of file
+
+    :param path: path to result file
+    :return: format
+    """
+
+    res = os.path.splitext(path)[1].lstrip('.').lower()
+
+    if res not in FORMATS:
+        raise ValueError(f'Unknown export format of {path}, use one of: {", ".join(FORMATS)}')
+
+    return res
+
+
+def create_writer(target: Union[str, TextIO, BinaryIO], file_format: Optional[str] = None,
+                  chunk_size: int = 2 ** 20) -> ExportWriter:
+    """
+    Creates writer for given format
+
+    :param target: path to result file or file object
+    :param file_format: one of FORMATS (None to get it from extension of target path,
+        required for file objects)
+    :param chunk_size: number of rows in chunk (for columnar formats)
+    :return: writer
+    """
+
+    if file_format is None:
+        if not isinstance(target, str):
+            raise ValueError(f'file_format is required for file object, use one of: {", ".join(FORMATS)}')
+
+        file_format = get_format(target)
+
+    if file_format == 'tsv':
+        res = EdgeListWriter(target, delimiter='\t')
+    elif file_format == 'csv':
+        res = EdgeListWriter(target, delimiter=',')
+    elif file_format == 'graphml':
+        res = GraphMLWriter(target)
+    elif file_format in ('parquet', 'npz'):
+        res = ColumnarWriter(target, file_format=file_format, chunk_size=chunk_size)
+    else:
+        raise ValueError(f'Unknown export format: {file_format}')
+
+    return res
+
+
+def export_dataset(relationships_path: str, attributes_path: Optional[str], save_path: Union[str, TextIO, BinaryIO],
+                   file_format: Optional[str] = None, chunk_size: int = 2 ** 20,
+                   progress_every: int = 10000) -> ExportWriter:
+    """
+    Exports all images of dataset. Images are read one by one
+
+    :param relationships_path: relationships file (one image or VG dump) or binary store directory
+    :param attributes_path: attributes file (not used for store)
+    :param save_path: path to result file or file object
+    :param file_format: one of FORMATS (None to get it from extension of save_path, required for file objects)
+    :param chunk_size: number of rows in chunk (for columnar formats)
+    :param progress_every: log progress after every N images (0 to disable)
+    :return: writer (with number of images and edges)
+    """
+
+    with create_writer(save_path, file_format=file_format, chunk_size=chunk_size) as writer:
+        if is_store(relationships_path):
+            store = open_store(relationships_path)
+
+            for image_id in store.image_ids():
+                writer.add_image(image_id, store.get(image_id))
+
+                if progress_every and writer.images % progress_every == 0:
+                    logger.info('%d images exported', writer.images)
+        else:
+            for relationships, attributes in iter_images(relationships_path, attributes_path):
+                image_id = relationships.get('image_id', attributes.get('image_id'))
+
+                writer.add_image(image_id, create_graph_structure(relationships),
+                                 create_graph_structure_attributes(attributes))
+
+                if progress_every and writer.images % progress_every == 0:
+                    logger.info('%d images exported', writer.images)
+
+    logger.info('%s: %d images, %d edges', writer, writer.images, writer.edges)
+
+    return writer
+
+
+def cli(args: Optional[List[str]] = None):
+    """
+    Command line entry point
+
+    :param args: command line arguments (sys.argv by default)
+    """
+
+    from graph_creation.instrumentation import configure
+
+    parser = argparse.ArgumentParser(description='Exports scene graphs as edge list, GraphML or columnar file')
+
+    parser.add_argument('relationships', help='relationships file (one image or VG dump) or binary store')
+    parser.add_argument('attributes', nargs='?', default=None, help='attributes file (not used for store)')
+    parser.add_argument('-o', '--output', required=True, help='result file (format is taken from extension)')
+    parser.add_argument('--format', choices=FORMATS, default=None, dest='file_format',
+                        help='export format (if extension of result file is different)')
+    parser.add_argument('--chunk-size', type=int, default=2 ** 20, help='number of rows in chunk of columnar file')
+
+    args = parser.parse_args(args)
+
+    if args.attributes is None and not is_store(args.relationships):
+        parser.error('attributes file is required for json input')
+
+    configure(level='INFO')
+
+    export_dataset(args.relationships, args.attributes, args.output, file_format=args.file_format,
+                   chunk_size=args.chunk_size)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,448 @@
+"""
+Persistent inverted index of relationships and attributes
+
+For every subject, predicate and object name index stores sorted
+posting list of (image id, relationship id) keys, and for every
+object name and attribute - list of (image id, object id) keys.
+Posting lists are written into one binary file, which is memory
+mapped on reading, so query touches only lists it intersects.
+
+Terms are normalized (stripped and lowercased), so 'ON' and 'on'
+are the same predicate.
+
+Usage:
+    python -m graph_creation.index build relationships.json attributes.json index_dir
+    python -m graph_creation.index query index_dir --subject man --predicate wearing --object backpack
+    python -m graph_creation.index query index_dir --name car --attribute red
+
+@by Vadbeg
+"""
+
+
+import os
+import mmap
+import json
+import argparse
+
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from graph_creation.reader import iter_images
+from graph_creation.scene_graph import get_name
+from graph_creation.instrumentation import logger
+
+
+INDEX_VERSION = 1
+
+RELATION_FIELDS = ('subject', 'predicate', 'object')
+OBJECT_FIELDS = ('name', 'attribute')
+
+LEXICON_FILENAME = 'lexicon.json'
+POSTINGS_FILENAME = 'postings.bin'
+
+KEY_DTYPE = np.dtype('<u8')
+
+
+def normalize(term: str) -> str:
+    """
+    Normalizes term (the same way on indexing and querying)
+
+    :param term: name, predicate or attribute
+    :return: normalized term
+    """
+
+    res = term.strip().lower()
+
+    return res
+
+
+def get_key(image_id: int, item_id: int) -> int:
+    """
+    Creates posting key (sorted by image, then by relationship or object id)
+
+    :param image_id: id of image
+    :param item_id: id of relationship or object
+    :return: key
+    """
+
+    res = (image_id << 32) | item_id
+
+    return res
+
+
+class IndexBuilder:
+    """
+    Collects posting lists in memory and writes index into directory
+    """
+
+    def __init__(self):
+        self.postings = {field: dict() for field in RELATION_FIELDS + OBJECT_FIELDS}
+        self.images = 0
+
+    def __add_key__(self, field: str, term: str, key: int):
+        """
+        Adds key into posting list of term
+
+        :param field: field of term
+        :param term: term
+        :param key: posting key
+        """
+
+        postings = self.postings[field].get(term)
+
+        if postings is None:
+            postings = array('Q')
+            self.postings[field][term] = postings
+
+        postings.append(key)
+
+    def add_image(self, relationships: Dict, attributes: Optional[Dict] = None):
+        """
+        Adds one image into index
+
+        :param relationships: raw dict of relationships for image
+        :param attributes: raw dict of attributes for image
+        """
+
+        image_id = relationships.get('image_id')
+
+        if image_id is None and attributes is not None:
+            image_id = attributes.get('image_id')
+
+        if image_id is None:
+            raise ValueError('Image without image_id can\'t be indexed')
+
+        self.images += 1
+
+        # object can appear in many relationships (and in attributes), duplicates are removed on save
+        for relationship_idx, relationship in enumerate(relationships['relationships']):
+            relationship_key = get_key(image_id, relationship.get('relationship_id', relationship_idx))
+
+            subject_info = relationship['subject']
+            object_info = relationship['object']
+
+            self.__add_key__('subject', normalize(get_name(subject_info)), relationship_key)
+            self.__add_key__('predicate', normalize(relationship['predicate']), relationship_key)
+            self.__add_key__('object', normalize(get_name(object_info)), relationship_key)
+
+            for info in (subject_info, object_info):
+                if 'object_id' in info:
+                    self.__add_key__('name', normalize(get_name(info)), get_key(image_id, info['object_id']))
+
+        if attributes is None:
+            return
+
+        # without object_id attributes can't be joined with names of the same object
+        for attribute in attributes['attributes']:
+            if 'object_id' not in attribute:
+                continue
+
+            object_key = get_key(image_id, attribute['object_id'])
+
+            for name in attribute.get('names', list()):
+                self.__add_key__('name', normalize(name), object_key)
+
+            for real_attribute in attribute.get('attributes', list()):
+                self.__add_key__('attribute', normalize(real_attribute), object_key)
+
+    def save(self, directory: str):
+        """
+        Writes index into directory (sorted posting lists and lexicon with their offsets)
+
+        :param directory: index directory
+        """
+
+        os.makedirs(directory, exist_ok=True)
+
+        lexicon = {'version': INDEX_VERSION, 'images': self.images, 'fields': dict()}
+        offset = 0
+
+        with open(os.path.join(directory, POSTINGS_FILENAME), mode='wb') as file:
+            for field, terms in self.postings.items():
+                field_lexicon = dict()
+
+                for term in sorted(terms):
+                    postings = np.unique(np.frombuffer(terms[term], dtype=np.uint64)).astype(KEY_DTYPE)
+                    file.write(postings.tobytes())
+
+                    field_lexicon[term] = (offset, len(postings))
+                    offset += len(postings)
+
+                lexicon['fields'][field] = field_lexicon
+
+        with open(os.path.join(directory, LEXICON_FILENAME), mode='w', encoding='utf-8') as file:
+            json.dump(lexicon, file, ensure_ascii=False)
+
+
+def build_index(relationships_path: str, attributes_path: str, directory: str) -> IndexBuilder:
+    """
+    Builds index of dataset files
+
+    :param relationships_path: relationships file (one image or VG dump)
+    :param attributes_path: attributes file (one image or VG dump)
+    :param directory: index directory
+    :return: index builder
+    """
+
+    builder = IndexBuilder()
+
+    for relationships, attributes in iter_images(relationships_path, attributes_path):
+        builder.add_image(relationships, attributes)
+
+    builder.save(directory)
+    logger.info('indexed %d images into %s', builder.images, directory)
+
+    return builder
+
+
+def intersect(postings: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Intersects sorted posting lists. Starts from the shortest list and
+    looks its keys up in longer ones with binary search, so long lists
+    are read only in few places
+
+    :param postings: sorted posting lists
+    :return: sorted keys which are in all lists
+    """
+
+    postings = sorted(postings, key=len)
+    res = np.asarray(postings[0])
+
+    for other in postings[1:]:
+        if len(res) == 0:
+            break
+
+        positions = np.searchsorted(other, res)
+        found = positions < len(other)
+        found[found] = other[positions[found]] == res[found]
+
+        res = res[found]
+
+    return res
+
+
+class InvertedIndex:
+    """
+    Memory mapped index. Use as context manager (or call close)
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory: index directory
+        """
+
+        with open(os.path.join(directory, LEXICON_FILENAME), encoding='utf-8') as file:
+            lexicon = json.load(file)
+
+        if lexicon.get('version') != INDEX_VERSION:
+            raise ValueError(f'Unsupported index version: {lexicon.get("version")}')
+
+        self.lexicon = lexicon['fields']
+        self.images = lexicon['images']
+
+        self.file = open(os.path.join(directory, POSTINGS_FILENAME), mode='rb')
+
+        if os.fstat(self.file.fileno()).st_size > 0:
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.buffer = b''
+
+    def __enter__(self) -> 'InvertedIndex':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Closes postings file. If posting lists are still used,
+        mapping is closed when they are deleted
+        """
+
+        if isinstance(self.buffer, mmap.mmap):
+            try:
+                self.buffer.close()
+            except BufferError:
+                pass
+
+        self.file.close()
+
+    def terms(self, field: str) -> List[str]:
+        """
+        Gets all terms of field
+
+        :param field: 'subject', 'predicate', 'object', 'name' or 'attribute'
+        :return: terms
+        """
+
+        return list(self.lexicon[field])
+
+    def postings(self, field: str, term: str) -> np.ndarray:
+        """
+        Gets posting list of term (view of memory mapped file, nothing is copied)
+
+        :param field: 'subject', 'predicate', 'object', 'name' or 'attribute'
+        :param term: term
+        :return: sorted keys (image_id << 32 | relationship or object id)
+        """
+
+        entry = self.lexicon[field].get(normalize(term))
+
+        if entry is None:
+            return np.zeros(0, dtype=KEY_DTYPE)
+
+        offset, count = entry
+        res = np.frombuffer(self.buffer, dtype=KEY_DTYPE, count=count, offset=offset * KEY_DTYPE.itemsize)
+
+        return res
+
+    def __query__(self, terms: Dict[str, Sequence[str]]) -> np.ndarray:
+        """
+        Intersects posting lists of all terms
+
+        :param terms: field -> terms
+        :return: sorted keys
+        """
+
+        postings = [self.postings(field, term) for field, field_terms in terms.items() for term in field_terms]
+
+        if not postings:
+            raise ValueError('At least one term is needed')
+
+        res = intersect(postings)
+
+        return res
+
+    def find_relationships(self, subject: Optional[str] = None, predicate: Optional[str] = None,
+                           object_name: Optional[str] = None) -> List[Tuple[int, int]]:
+        """
+        Finds relationships with given subject, predicate and object (None means any)
+
+        :param subject: subject name
+        :param predicate: predicate
+        :param object_name: object name
+        :return: list of (image id, relationship id)
+        """
+
+        terms = {field: [term] for field, term in zip(RELATION_FIELDS, (subject, predicate, object_name))
+                 if term is not None}
+
+        res = split_keys(self.__query__(terms))
+
+        return res
+
+    def find_objects(self, name: Optional[str] = None, attributes: Sequence[str] = ()) -> List[Tuple[int, int]]:
+        """
+        Finds objects with given name and all given attributes
+
+        :param name: object name (None means any)
+        :param attributes: attributes
+        :return: list of (image id, object id)
+        """
+
+        terms = {'attribute': list(attributes)}
+
+        if name is not None:
+            terms['name'] = [name]
+
+        res = split_keys(self.__query__(terms))
+
+        return res
+
+    def find_images(self, relationships: Sequence[Tuple[Optional[str], Optional[str], Optional[str]]] = (),
+                    objects: Sequence[Tuple[Optional[str], Sequence[str]]] = ()) -> List[int]:
+        """
+        Finds images which have all given relationships and objects
+
+        :param relationships: list of (subject, predicate, object), None means any
+        :param objects: list of (name, attributes)
+        :return: sorted image ids
+        """
+
+        images = list()
+
+        for subject, predicate, object_name in relationships:
+            terms = {field: [term] for field, term in zip(RELATION_FIELDS, (subject, predicate, object_name))
+                     if term is not None}
+            images.append(np.unique(self.__query__(terms) >> np.uint64(32)))
+
+        for name, attributes in objects:
+            terms = {'attribute': list(attributes)}
+
+            if name is not None:
+                terms['name'] = [name]
+
+            images.append(np.unique(self.__query__(terms) >> np.uint64(32)))
+
+        if not images:
+            raise ValueError('At least one relationship or object is needed')
+
+        res = intersect(images).tolist()
+
+        return res
+
+
+def split_keys(keys: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Splits posting keys into image ids and relationship (or object) ids
+
+    :param keys: posting keys
+    :return: list of (image id, relationship or object id)
+    """
+
+    image_ids = (keys >> np.uint64(32)).tolist()
+    item_ids = (keys & np.uint64(0xFFFFFFFF)).tolist()
+
+    return list(zip(image_ids, item_ids))
+
+
+def cli(args: Optional[List[str]] = None):
+    """
+    Command line entry point
+
+    :param args: command line arguments (sys.argv by default)
+    """
+
+    parser = argparse.ArgumentParser(description='Builds and queries inverted index of dataset')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='build index')
+    build_parser.add_argument('relationships', help='relationships file (one image or VG dump)')
+    build_parser.add_argument('attributes', help='attributes file (one image or VG dump)')
+    build_parser.add_argument('directory', help='index directory')
+
+    query_parser = subparsers.add_parser('query', help='find images')
+    query_parser.add_argument('directory', help='index directory')
+    query_parser.add_argument('--subject', default=None, help='subject of relationship')
+    query_parser.add_argument('--predicate', default=None, help='predicate of relationship')
+    query_parser.add_argument('--object', default=None, help='object of relationship')
+    query_parser.add_argument('--name', default=None, help='name of object with attributes')
+    query_parser.add_argument('--attribute', nargs='+', default=list(), help='attributes of object')
+    query_parser.add_argument('--limit', type=int, default=100, help='max number of printed image ids')
+
+    args = parser.parse_args(args)
+
+    if args.command == 'build':
+        build_index(args.relationships, args.attributes, args.directory)
+        return
+
+    relationships = list()
+    objects = list()
+
+    if args.subject or args.predicate or args.object:
+        relationships.append((args.subject, args.predicate, args.object))
+
+    if args.name or args.attribute:
+        objects.append((args.name, args.attribute))
+
+    with InvertedIndex(args.directory) as index:
+        image_ids = index.find_images(relationships=relationships, objects=objects)
+
+    print(f'{len(image_ids)} images')
+    print(' '.join(map(str, image_ids[:args.limit])))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,255 @@
+"""
+Logging, per-stage timers, counters and profiling hooks
+
+All modules log into 'graph_creation' logger (nothing is shown until
+configure is called). Timers and counters are collected only when
+stats are enabled, otherwise they cost one attribute check, so hot
+loops do no I/O.
+
+Usage:
+    configure(level='DEBUG', stats_enabled=True)
+
+    with stats.stage('build'):
+        ...
+    stats.count('elements_emitted', 10)
+
+    print(stats.report())
+
+@by Vadbeg
+"""
+
+
+import io
+import os
+import logging
+import functools
+import contextlib
+
+from time import perf_counter
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterator, Optional, Union
+
+
+logger = logging.getLogger('graph_creation')
+
+LOG_FORMAT = '%(asctime)s %(processName)s %(name)s %(levelname)s: %(message)s'
+
+
+class Stats:
+    """
+    Per-stage timers and counters of current process
+    """
+
+    def __init__(self, enabled: bool = False):
+        """
+        :param enabled: collect timers and counters
+        """
+
+        self.enabled = enabled
+
+        self.counters = Counter()
+        self.seconds = defaultdict(float)
+        self.calls = Counter()
+
+    def count(self, name: str, value: int = 1):
+        """
+        Increases counter
+
+        :param name: counter name
+        :param value: increment
+        """
+
+        if self.enabled:
+            self.counters[name] += value
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Measures time of code inside with block
+
+        :param name: stage name
+        """
+
+        if not self.enabled:
+            yield
+            return
+
+        start = perf_counter()
+
+        try:
+            yield
+        finally:
+            self.seconds[name] += perf_counter() - start
+            self.calls[name] += 1
+
+    def snapshot(self) -> Dict:
+        """
+        Creates copy of timers and counters (can be sent between processes)
+
+        :return: dict with counters and stages
+        """
+
+        res = {'counters': dict(self.counters),
+               'stages': {name: {'seconds': seconds, 'calls': self.calls[name]}
+                          for name, seconds in self.seconds.items()}}
+
+        return res
+
+    def merge(self, snapshot: Dict):
+        """
+        Adds timers and counters from snapshot (for example from worker process)
+
+        :param snapshot: result of snapshot method
+        """
+
+        self.counters.update(snapshot['counters'])
+
+        for name, stage in snapshot['stages'].items():
+            self.seconds[name] += stage['seconds']
+            self.calls[name] += stage['calls']
+
+    def reset(self):
+        """
+        Removes all timers and counters
+        """
+
+        self.counters.clear()
+        self.seconds.clear()
+        self.calls.clear()
+
+    def pop(self) -> Dict:
+        """
+        Creates snapshot and resets stats
+
+        :return: dict with counters and stages
+        """
+
+        res = self.snapshot()
+        self.reset()
+
+        return res
+
+    def report(self) -> str:
+        """
+        Creates human readable report
+
+        :return: report
+        """
+
+        lines = list()
+
+        for name, seconds in sorted(self.seconds.items(), key=lambda item: -item[1]):
+            lines.append(f'{name:<40} {seconds:>10.3f}s {self.calls[name]:>10} calls')
+
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'{name:<40} {value:>11}')
+
+        res = '\n'.join(lines)
+
+        return res
+
+
+stats = Stats()
+
+
+def timed(name: str) -> Callable:
+    """
+    Decorator which measures time of every function call as stage
+
+    :param name: stage name
+    :return: decorator
+    """
+
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not stats.enabled:
+                return function(*args, **kwargs)
+
+            with stats.stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def configure(level: Union[int, str, None] = None, stats_enabled: Optional[bool] = None):
+    """
+    Sets log level (and adds stderr handler once) and turns stats on or off
+
+    :param level: log level ('DEBUG', 'INFO', ...), None to keep current
+    :param stats_enabled: collect timers and counters, None to keep current
+    """
+
+    if level is not None:
+        if not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            logger.addHandler(handler)
+
+        logger.setLevel(level.upper() if isinstance(level, str) else level)
+
+    if stats_enabled is not None:
+        stats.enabled = stats_enabled
+
+
+class Profiler:
+    """
+    cProfile (and optionally tracemalloc) hook. Can be entered several
+    times, results are accumulated and written into path after every exit
+    """
+
+    def __init__(self, path: Optional[str] = None, memory: bool = False, top: int = 20):
+        """
+        :param path: file for pstats dump (report is logged if None)
+        :param memory: trace memory allocations with tracemalloc
+        :param top: number of functions (and allocation places) in logged report
+        """
+
+        self.path = path
+        self.memory = memory
+        self.top = top
+
+        # profilers are imported only when they are used (they slow down worker start)
+        import cProfile
+
+        self.profile = cProfile.Profile()
+
+    def __enter__(self) -> 'Profiler':
+        import tracemalloc
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        self.profile.enable()
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        import pstats
+        import tracemalloc
+
+        self.profile.disable()
+
+        if self.path is not None:
+            directory = os.path.dirname(self.path)
+
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            self.profile.dump_stats(self.path)
+        else:
+            stream = io.StringIO()
+            pstats.Stats(self.profile, stream=stream).sort_stats('cumulative').print_stats(self.top)
+
+            logger.info('profile:\n%s', stream.getvalue())
+
+        if self.memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+
+            lines = [str(stat) for stat in snapshot.statistics('lineno')[:self.top]]
+
+            logger.info('memory: current %.1f MB, peak %.1f MB\n%s',
+                        current / 2 ** 20, peak / 2 ** 20, '\n'.join(lines))
@@ -0,0 +1,183 @@
+"""
+Pluggable json parser with field projection
+
+Fastest installed parser is used: orjson, pysimdjson or standard json.
+Loaded records can be projected on fields spec: dict of kept keys, where
+value is None (key is kept as is) or nested spec (for dicts and lists
+of dicts). Projection is opt-in: only with simdjson dropped fields aren't
+converted into python objects, other parsers build whole record first,
+so projection makes parsing slower (see benchmarks/bench_json.py).
+Projected records don't have boxes (x, y, w, h) and object ids.
+
+Usage:
+    record = loads(data, fields=RELATIONSHIPS_FIELDS)
+
+@by Vadbeg
+"""
+
+
+import json
+
+from typing import Any, Dict, Optional, Union
+
+
+BACKENDS = ('orjson', 'simdjson', 'json')
+
+# fields read by structure builders and output backends
+OBJECT_FIELDS = {'name': None, 'names': None}
+
+RELATIONSHIPS_FIELDS = {'image_id': None,
+                        'relationships': {'predicate': None,
+                                          'subject': OBJECT_FIELDS,
+                                          'object': OBJECT_FIELDS}}
+
+ATTRIBUTES_FIELDS = {'image_id': None,
+                     'image_url': None,
+                     'attributes': {'names': None, 'attributes': None}}
+
+
+backend = None
+_loads = None
+_parser = None
+
+
+def set_backend(name: Optional[str] = None) -> str:
+    """
+    Selects json parser
+
+    :param name: 'orjson', 'simdjson' or 'json' (None for the fastest installed one)
+    :return: name of selected parser
+    """
+
+    global backend, _loads, _parser
+
+    if name is not None and name not in BACKENDS:
+        raise ValueError(f'Unknown json backend: {name}')
+
+    for curr_name in BACKENDS if name is None else (name,):
+        try:
+            if curr_name == 'orjson':
+                import orjson
+
+                _loads = orjson.loads
+            elif curr_name == 'simdjson':
+                import simdjson
+
+                _parser = simdjson.Parser()
+                _loads = simdjson.loads
+            else:
+                _loads = json.loads
+        except ImportError:
+            if name is not None:
+                raise
+
+            continue
+
+        backend = curr_name
+        break
+
+    return backend
+
+
+def materialize(value: Any) -> Any:
+    """
+    Converts lazy simdjson object or array into python one (other values are returned as is)
+
+    :param value: parsed value
+    :return: python value
+    """
+
+    if hasattr(value, 'as_dict'):
+        return value.as_dict()
+
+    if hasattr(value, 'as_list'):
+        return value.as_list()
+
+    return value
+
+
+def project(value: Any, fields: Optional[Dict]) -> Any:
+    """
+    Keeps only given fields of parsed value
+
+    :param value: parsed dict, list of dicts (or lazy simdjson ones)
+    :param fields: fields spec (None to keep value as is)
+    :return: projected value
+    """
+
+    if fields is None:
+        return materialize(value)
+
+    if isinstance(value, dict):
+        res = dict()
+
+        # values of python dict are python objects, so leaves aren't materialized
+        for key, key_fields in fields.items():
+            if key in value:
+                item = value[key]
+                res[key] = item if key_fields is None else project(item, key_fields)
+
+        return res
+
+    if isinstance(value, list) or hasattr(value, 'as_list'):
+        return [project(item, fields) for item in value]
+
+    if not hasattr(value, 'keys'):
+        return value
+
+    res = {key: project(value[key], key_fields) for key, key_fields in fields.items() if key in value}
+
+    return res
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str], fields: Optional[Dict] = None) -> Any:
+    """
+    Parses json document
+
+    :param data: json document
+    :param fields: fields spec (None to keep all fields)
+    :return: parsed (and projected) value
+    """
+
+    if backend == 'simdjson':
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+
+        if fields is not None:
+            document = _parser.parse(data)
+            res = project(document, fields)
+
+            # parser can be reused only when lazy objects are released
+            del document
+
+            return res
+
+    elif backend == 'json' and not isinstance(data, str):
+        data = bytes(data).decode('utf-8')
+
+    res = _loads(data)
+
+    if fields is not None:
+        res = project(res, fields)
+
+    return res
+
+
+def load(path: str, fields: Optional[Dict] = None) -> Any:
+    """
+    Reads and parses json file
+
+    :param path: path to json file
+    :param fields: fields spec (None to keep all fields)
+    :return: parsed (and projected) value
+    """
+
+    with open(path, mode='rb') as file:
+        data = file.read()
+
+    res = loads(data, fields=fields)
+
+    return res
+
+
+set_backend()
@@ -0,0 +1,233 @@
+"""
+Force-directed (Fruchterman-Reingold) layout for graphs
+
+All forces are computed with NumPy. For big graphs repulsion
+is approximated on grid: nodes in neighbouring cells are compared
+exactly and far cells act as point masses (particle-mesh method
+with FFT convolution), so one iteration is close to linear in
+number of nodes.
+
+@by Vadbeg
+"""
+
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+EXACT_MAX_NODES = 2000
+ROWS_PER_CHUNK = 512
+
+GRID_OFFSETS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+
+def _accumulate(forces: np.ndarray, indices: np.ndarray, values: np.ndarray):
+    """
+    Adds values to forces of given nodes (indices can repeat)
+
+    :param forces: (n, 2) array of forces
+    :param indices: node indices
+    :param values: (len(indices), 2) array of values
+    """
+
+    n_nodes = forces.shape[0]
+
+    forces[:, 0] += np.bincount(indices, weights=values[:, 0], minlength=n_nodes)
+    forces[:, 1] += np.bincount(indices, weights=values[:, 1], minlength=n_nodes)
+
+
+def exact_repulsion(positions: np.ndarray, k: float) -> np.ndarray:
+    """
+    Computes repulsion between all pairs of nodes. O(n^2), rows are processed
+    by chunks, so memory is O(n * ROWS_PER_CHUNK)
+
+    :param positions: (n, 2) array of node positions
+    :param k: ideal edge length
+    :return: (n, 2) array of forces
+    """
+
+    n_nodes = positions.shape[0]
+    forces = np.zeros_like(positions)
+
+    for start in range(0, n_nodes, ROWS_PER_CHUNK):
+        end = min(start + ROWS_PER_CHUNK, n_nodes)
+
+        delta = positions[start:end, None, :] - positions[None, :, :]
+        dist2 = np.einsum('ijk,ijk->ij', delta, delta)
+
+        dist2[np.arange(end - start), np.arange(start, end)] = np.inf
+        np.maximum(dist2, 1e-4, out=dist2)
+
+        forces[start:end] = np.einsum('ijk,ij->ik', delta, k * k / dist2)
+
+    return forces
+
+
+def _get_far_field_kernel(grid_size: int, cell_size: float, k: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Creates FFT of repulsion kernel between grid cells. Cells which are
+    neighbours (or the same) have zero kernel, they are computed exactly
+
+    :param grid_size: number of cells in grid row
+    :param cell_size: size of cell
+    :param k: ideal edge length
+    :return: FFTs of x and y kernel components
+    """
+
+    shape = (2 * grid_size, 2 * grid_size)
+
+    offsets = np.fft.fftfreq(shape[0], 1 / shape[0])
+    dx, dy = np.meshgrid(offsets, offsets, indexing='ij')
+
+    dist2 = (dx * dx + dy * dy) * cell_size * cell_size
+    dist2[(np.abs(dx) <= 1) & (np.abs(dy) <= 1)] = np.inf
+
+    kernel_x = dx * cell_size * k * k / dist2
+    kernel_y = dy * cell_size * k * k / dist2
+
+    return np.fft.rfft2(kernel_x), np.fft.rfft2(kernel_y)
+
+
+def grid_repulsion(positions: np.ndarray, k: float, nodes_per_cell: int = 1,
+                   max_grid_size: int = 512) -> np.ndarray:
+    """
+    Computes approximate repulsion. Nodes are put into grid (cell size is chosen
+    from number of nodes). Nodes in neighbouring cells repel each other exactly,
+    and other cells repel node as point masses in cell centers
+    (their sum is convolution, which is computed with FFT)
+
+    :param positions: (n, 2) array of node positions
+    :param k: ideal edge length
+    :param nodes_per_cell: average number of nodes in cell
+    :param max_grid_size: max number of cells in grid row
+    :return: (n, 2) array of forces
+    """
+
+    n_nodes = positions.shape[0]
+    forces = np.zeros_like(positions)
+
+    grid_size = int(np.clip(np.ceil(np.sqrt(n_nodes / nodes_per_cell)), 1, max_grid_size))
+
+    origin = positions.min(axis=0)
+    cell_size = max(float((positions.max(axis=0) - origin).max()) / grid_size, 1e-9) * (1 + 1e-9)
+
+    cells = np.minimum(((positions - origin) / cell_size).astype(np.int64), grid_size - 1)
+    cell_ids = cells[:, 0] * grid_size + cells[:, 1]
+    order = np.argsort(cell_ids, kind='stable')
+
+    counts = np.bincount(cell_ids, minlength=grid_size * grid_size)
+    starts = np.cumsum(counts) - counts
+
+    # far field
+    if grid_size > 2:
+        shape = (2 * grid_size, 2 * grid_size)
+
+        masses = np.zeros(shape)
+        masses[:grid_size, :grid_size] = counts.reshape(grid_size, grid_size)
+        masses = np.fft.rfft2(masses)
+
+        kernel_x, kernel_y = _get_far_field_kernel(grid_size, cell_size, k)
+
+        field_x = np.fft.irfft2(masses * kernel_x, s=shape)[:grid_size, :grid_size]
+        field_y = np.fft.irfft2(masses * kernel_y, s=shape)[:grid_size, :grid_size]
+
+        forces[:, 0] += field_x[cells[:, 0], cells[:, 1]]
+        forces[:, 1] += field_y[cells[:, 0], cells[:, 1]]
+
+    # near field
+    for dx, dy in GRID_OFFSETS:
+        neighbour_x = cells[:, 0] + dx
+        neighbour_y = cells[:, 1] + dy
+
+        valid = ((neighbour_x >= 0) & (neighbour_x < grid_size) &
+                 (neighbour_y >= 0) & (neighbour_y < grid_size))
+
+        nodes = np.nonzero(valid)[0]
+        neighbour_cells = neighbour_x[valid] * grid_size + neighbour_y[valid]
+        neighbour_counts = counts[neighbour_cells]
+
+        total = int(neighbour_counts.sum())
+
+        if total == 0:
+            continue
+
+        # every node is paired with every node of neighbouring cell
+        first = np.repeat(nodes, neighbour_counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(neighbour_counts) - neighbour_counts, neighbour_counts)
+        second = order[np.repeat(starts[neighbour_cells], neighbour_counts) + offsets]
+
+        mask = first != second
+        first, second = first[mask], second[mask]
+
+        delta = positions[first] - positions[second]
+        dist2 = np.maximum(np.einsum('ij,ij->i', delta, delta), 1e-4)
+
+        _accumulate(forces, first, delta * (k * k / dist2)[:, None])
+
+    return forces
+
+
+def force_directed_layout(edges: np.ndarray, n_nodes: int, iterations: int = 50,
+                          edge_length: float = 100.0, repulsion: str = 'auto',
+                          gravity: float = 1.0, seed: Optional[int] = 0) -> np.ndarray:
+    """
+    Computes node positions with Fruchterman-Reingold algorithm
+
+    :param edges: (m, 2) array of node indices
+    :param n_nodes: number of nodes
+    :param iterations: number of iterations
+    :param edge_length: ideal edge length (in result coordinates)
+    :param repulsion: 'exact', 'grid' or 'auto' (grid for graphs bigger than EXACT_MAX_NODES)
+    :param gravity: pull to center. With gravity 1 repulsion of all nodes is balanced
+        when layout has size about edge_length * sqrt(n_nodes)
+    :param seed: seed for initial positions
+    :return: (n, 2) array of node positions (starting from 0)
+    """
+
+    if repulsion == 'auto':
+        repulsion = 'exact' if n_nodes <= EXACT_MAX_NODES else 'grid'
+
+    if repulsion == 'exact':
+        get_repulsion = exact_repulsion
+    elif repulsion == 'grid':
+        get_repulsion = grid_repulsion
+    else:
+        raise ValueError(f'Unknown repulsion: {repulsion}')
+
+    if n_nodes == 0:
+        return np.zeros((0, 2))
+
+    k = float(edge_length)
+    side = k * np.sqrt(n_nodes)
+
+    rand = np.random.RandomState(seed)
+    positions = rand.uniform(0, side, size=(n_nodes, 2))
+
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+
+    temperature = side / 10
+    cooling = temperature / (iterations + 1)
+
+    for _ in range(iterations):
+        forces = get_repulsion(positions, k)
+
+        delta = positions[edges[:, 0]] - positions[edges[:, 1]]
+        dist = np.sqrt(np.einsum('ij,ij->i', delta, delta))[:, None]
+        attraction = delta * dist / k
+
+        _accumulate(forces, edges[:, 0], -attraction)
+        _accumulate(forces, edges[:, 1], attraction)
+
+        # gravity keeps unconnected components together
+        forces += (side / 2 - positions) * gravity
+
+        length = np.sqrt(np.einsum('ij,ij->i', forces, forces))[:, None]
+        positions += forces / np.maximum(length, 1e-9) * np.minimum(length, temperature)
+
+        temperature -= cooling
+
+    positions -= positions.min(axis=0)
+
+    return positions
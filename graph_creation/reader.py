@@ -0,0 +1,454 @@
+"""
+Incremental reader for Visual Genome json files
+
+Works both with one image files (like the ones in data directory)
+and with full VG dumps, which are top-level arrays of images.
+
+Records are parsed with the fastest installed json parser (see
+graph_creation.json_backend) and can be projected on fields used
+by graph builders (opt-in, it pays off only with simdjson).
+
+@by Vadbeg
+"""
+
+
+import os
+import json
+
+from typing import Dict, Iterator, Tuple, Optional
+
+from graph_creation import json_backend
+from graph_creation.json_backend import RELATIONSHIPS_FIELDS, ATTRIBUTES_FIELDS
+
+
+CHUNK_SIZE = 2 ** 20
+
+_decoder = json.JSONDecoder()
+_whitespace = ' \t\n\r'
+
+# depth change of every byte for bytes.translate (-1 is 255)
+_bracket_depths = bytes(1 if char in b'{[' else 255 if char in b'}]' else 0 for char in range(256))
+
+
+def is_json_array(path: str) -> bool:
+    """
+    Checks if file holds top-level json array (full VG dump)
+
+    :param path: path to json file
+    :return: bool
+    """
+
+    with open(path, mode='r', encoding='utf-8') as file:
+        while True:
+            char = file.read(1)
+
+            if not char:
+                return False
+
+            if char not in _whitespace:
+                return char == '['
+
+
+def iter_json_records(path: str, chunk_size: int = CHUNK_SIZE, fields: Optional[Dict] = None) -> Iterator[Dict]:
+    """
+    Yields records from json file one by one. If file holds top-level
+    array, yields its elements, otherwise yields the only object in file.
+
+    Only one record (and one chunk of file) is kept in memory at a time.
+
+    :param path: path to json file
+    :param chunk_size: number of characters (bytes for fast parsers) read from file at once
+    :param fields: fields spec of records (see json_backend.project), None to keep all fields
+    :return: iterator over records
+    """
+
+    if json_backend.backend != 'json':
+        for record, _ in iter_json_record_offsets(path, chunk_size=chunk_size, fields=fields):
+            yield record
+
+        return
+
+    with open(path, mode='r', encoding='utf-8') as file:
+        buffer = ''
+        position = 0
+        is_eof = False
+        is_array = None
+
+        while True:
+            while position < len(buffer) and buffer[position] in _whitespace:
+                position += 1
+
+            if position == len(buffer):
+                if is_eof:
+                    break
+
+                buffer = file.read(chunk_size)
+                position = 0
+                is_eof = not buffer
+
+                continue
+
+            if is_array is None:
+                is_array = buffer[position] == '['
+
+                if is_array:
+                    position += 1
+
+                continue
+
+            if is_array and buffer[position] == ',':
+                position += 1
+                continue
+
+            if is_array and buffer[position] == ']':
+                break
+
+            try:
+                record, position = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if is_eof:
+                    raise
+
+                # record is split between chunks, so we read more data.
+                # Read size grows with buffer, so big records are parsed
+                # in amortized linear time
+                chunk = file.read(max(chunk_size, len(buffer) - position))
+                buffer = buffer[position:] + chunk
+                position = 0
+                is_eof = not chunk
+
+                continue
+
+            if fields is not None:
+                record = json_backend.project(record, fields)
+
+            yield record
+
+            if not is_array:
+                break
+
+
+def _skip_separators(buffer: bytes, position: int) -> int:
+    """
+    Skips whitespace and commas between records
+
+    :param buffer: part of file
+    :param position: current position
+    :return: position of next record (or end of buffer)
+    """
+
+    length = len(buffer)
+
+    while position < length and buffer[position] in b' \t\n\r,':
+        position += 1
+
+    return position
+
+
+def _find_record_ends(buffer: bytes, position: int) -> list:
+    """
+    Finds ends of top-level array elements by counting brackets
+    (elements are supposed to be objects or arrays). Brackets in strings
+    aren't skipped, so wrong ends are possible: they are caught by parser.
+
+    :param buffer: part of file
+    :param position: position of first element
+    :return: positions after closing brackets of elements
+    """
+
+    import numpy as np
+
+    changes = np.frombuffer(buffer[position:].translate(_bracket_depths), dtype=np.int8)
+
+    brackets = np.flatnonzero(changes.view(np.bool_))
+    changes = changes[brackets]
+    depth = np.cumsum(changes, dtype=np.int64)
+
+    res = (brackets[(depth == 0) & (changes < 0)] + position + 1).tolist()
+
+    return res
+
+
+def _decode_record(buffer: bytes, position: int) -> Tuple[Dict, int]:
+    """
+    Parses one record with standard json (used when brackets in strings break _find_record_ends)
+
+    :param buffer: part of file
+    :param position: position of record
+    :return: record and position after it
+    """
+
+    text = buffer[position:].decode('utf-8', errors='surrogateescape')
+    record, end = _decoder.raw_decode(text)
+
+    position += len(text[:end].encode('utf-8', errors='surrogateescape'))
+
+    return record, position
+
+
+def _parse_records(buffer: bytes, position: int, fields: Optional[Dict], is_eof: bool,
+                   base: int = 0) -> Iterator[Tuple[Dict, int]]:
+    """
+    Parses all complete array elements in buffer
+
+    :param buffer: part of file
+    :param position: position of first element
+    :param fields: fields spec of records, None to keep all fields
+    :param is_eof: buffer holds the end of file
+    :param base: offset of buffer in file
+    :return: iterator over (record, file offset after it), returns position after them
+    """
+
+    view = memoryview(buffer)
+
+    try:
+        while True:
+            position = _skip_separators(buffer, position)
+
+            if position == len(buffer) or buffer[position] == ord(']'):
+                return position
+
+            ends = _find_record_ends(buffer, position)
+
+            for end in ends:
+                try:
+                    record = json_backend.loads(view[position:end], fields=fields)
+                except ValueError:
+                    break
+
+                yield record, base + end
+
+                position = _skip_separators(buffer, end)
+
+                if position == len(buffer) or buffer[position] == ord(']'):
+                    return position
+            else:
+                # the rest of buffer is a part of record, it is parsed after next read.
+                # Brackets in strings can hide the end of record, so it is checked
+                # with standard json once buffer grows
+                if ends or not (is_eof or len(buffer) - position > CHUNK_SIZE):
+                    return position
+
+            # wrong end (brackets in strings), so record is parsed with standard json
+            try:
+                record, position = _decode_record(buffer, position)
+            except json.JSONDecodeError:
+                if is_eof:
+                    raise
+
+                return position
+
+            yield json_backend.project(record, fields), base + position
+    finally:
+        view.release()
+
+
+def iter_json_record_offsets(path: str, chunk_size: int = CHUNK_SIZE, fields: Optional[Dict] = None,
+                             offset: Optional[int] = None) -> Iterator[Tuple[Dict, int]]:
+    """
+    The same as iter_json_records, but file is read as bytes and every record is
+    parsed by fast json parser at once (bounds of records are found with numpy).
+    Byte offset after every record is yielded too, reading can be started from it
+
+    :param path: path to json file
+    :param chunk_size: number of bytes read from file at once
+    :param fields: fields spec of records, None to keep all fields
+    :param offset: offset after record yielded before (None to read from the start)
+    :return: iterator over (record, offset after it)
+    """
+
+    with open(path, mode='rb') as file:
+        buffer = b''
+        position = 0
+
+        if offset is None:
+            while position == len(buffer):
+                buffer = file.read(chunk_size)
+                position = _skip_separators(buffer, 0)
+
+                if not buffer:
+                    return
+
+            if buffer[position] != ord('['):
+                record = json_backend.loads(buffer[position:] + file.read(), fields=fields)
+                yield record, file.tell()
+
+                return
+
+            position += 1
+            base = 0
+        else:
+            # offset is inside top-level array (or after the only object of file)
+            file.seek(offset)
+            buffer = file.read(chunk_size)
+            base = offset
+
+        is_eof = False
+
+        while True:
+            position = yield from _parse_records(buffer, position, fields=fields, is_eof=is_eof, base=base)
+
+            if position < len(buffer) and buffer[position] == ord(']'):
+                break
+
+            if is_eof:
+                break
+
+            # read size grows with buffer, so big records are parsed in amortized linear time
+            chunk = file.read(max(chunk_size, len(buffer) - position))
+            buffer = buffer[position:] + chunk
+            base += position
+            position = 0
+            is_eof = not chunk
+
+
+def _empty_record(image_id: int, key: str) -> Dict:
+    """
+    Creates record for image without relationships or attributes
+
+    :param image_id: id of image
+    :param key: key of list in record ('relationships' or 'attributes')
+    :return: empty record
+    """
+
+    record = {'image_id': image_id, key: list()}
+
+    return record
+
+
+def _is_after(image_id: Optional[int], other_image_id: Optional[int]) -> bool:
+    """
+    Checks if image goes after other image in sorted dump
+
+    :param image_id: id of image
+    :param other_image_id: id of other image
+    :return: True if both ids are numbers and image_id is bigger
+    """
+
+    res = isinstance(image_id, int) and isinstance(other_image_id, int) and image_id > other_image_id
+
+    return res
+
+
+def iter_images(relationships_path: str, attributes_path: str,
+                chunk_size: int = CHUNK_SIZE, projected: bool = False) -> Iterator[Tuple[Dict, Dict]]:
+    """
+    Yields (relationships, attributes) pairs for every image, joined by image_id.
+    Every record has the same format as one image file.
+
+    VG dumps store images in the same order, so while files are aligned
+    only one image is kept in memory. Images which are out of order are
+    held until their pair is found. Dumps are sorted by image_id, so
+    attributes are read ahead only until image_id of relationships is
+    passed (image without attributes record gets empty one).
+
+    :param relationships_path: path to relationships file (one image or full dump)
+    :param attributes_path: path to attributes file (one image or full dump)
+    :param chunk_size: number of characters read from file at once
+    :param projected: keep only fields used by graph builders (RELATIONSHIPS_FIELDS and ATTRIBUTES_FIELDS),
+        it is faster only with simdjson backend and drops boxes of objects
+    :return: iterator over (relationships, attributes) pairs
+    """
+
+    relationships_fields = RELATIONSHIPS_FIELDS if projected else None
+    attributes_fields = ATTRIBUTES_FIELDS if projected else None
+
+    relationships_records = ((record, None) for record in iter_json_records(relationships_path, chunk_size=chunk_size,
+                                                                            fields=relationships_fields))
+    attributes_records = ((record, None) for record in iter_json_records(attributes_path, chunk_size=chunk_size,
+                                                                         fields=attributes_fields))
+
+    for relationships, attributes, _ in _join_images(relationships_records, attributes_records, offsets=(None, None)):
+        yield relationships, attributes
+
+
+def iter_images_with_offsets(relationships_path: str, attributes_path: str, chunk_size: int = CHUNK_SIZE,
+                             projected: bool = False, offsets: Optional[Tuple[Optional[int], Optional[int]]] = None
+                             ) -> Iterator[Tuple[Dict, Dict, Optional[Tuple[Optional[int], Optional[int]]]]]:
+    """
+    The same as iter_images, but byte offsets in both files are yielded after every image,
+    so reading can be resumed without parsing images which were read before
+
+    :param relationships_path: path to relationships file (one image or full dump)
+    :param attributes_path: path to attributes file (one image or full dump)
+    :param chunk_size: number of bytes read from file at once
+    :param projected: keep only fields used by graph builders (see iter_images)
+    :param offsets: offsets yielded before (None to read from the start)
+    :return: iterator over (relationships, attributes, offsets), offsets are None while
+        out of order attributes are held (resuming from that point would lose them)
+    """
+
+    if offsets is None:
+        offsets = (None, None)
+
+    relationships_records = iter_json_record_offsets(relationships_path, chunk_size=chunk_size, offset=offsets[0],
+                                                     fields=RELATIONSHIPS_FIELDS if projected else None)
+    attributes_records = iter_json_record_offsets(attributes_path, chunk_size=chunk_size, offset=offsets[1],
+                                                  fields=ATTRIBUTES_FIELDS if projected else None)
+
+    yield from _join_images(relationships_records, attributes_records, offsets=offsets)
+
+
+def _join_images(relationships_records: Iterator[Tuple[Dict, Optional[int]]],
+                 attributes_records: Iterator[Tuple[Dict, Optional[int]]],
+                 offsets: Tuple[Optional[int], Optional[int]]
+                 ) -> Iterator[Tuple[Dict, Dict, Optional[Tuple[Optional[int], Optional[int]]]]]:
+    """
+    Joins relationships and attributes records by image_id (see iter_images)
+
+    :param relationships_records: iterator over (record, offset after it)
+    :param attributes_records: iterator over (record, offset after it)
+    :param offsets: offsets of files before the first records
+    :return: iterator over (relationships, attributes, offsets after them or None)
+    """
+
+    relationships_offset, attributes_offset = offsets
+    pending_attributes = dict()
+
+    for relationships, relationships_offset in relationships_records:
+        image_id = relationships.get('image_id')
+
+        attributes = pending_attributes.pop(image_id, None)
+
+        if attributes is None:
+            for curr_attributes, attributes_offset in attributes_records:
+                curr_image_id = curr_attributes.get('image_id')
+
+                if curr_image_id == image_id:
+                    attributes = curr_attributes
+                    break
+
+                pending_attributes[curr_image_id] = curr_attributes
+
+                if _is_after(curr_image_id, image_id):
+                    break
+
+        if attributes is None:
+            attributes = _empty_record(image_id, key='attributes')
+
+        yield relationships, attributes, None if pending_attributes else (relationships_offset, attributes_offset)
+
+    while pending_attributes:
+        attributes = pending_attributes.pop(next(iter(pending_attributes)))
+
+        yield (_empty_record(attributes.get('image_id'), key='relationships'), attributes,
+               None if pending_attributes else (relationships_offset, attributes_offset))
+
+    for attributes, attributes_offset in attributes_records:
+        yield _empty_record(attributes.get('image_id'), key='relationships'), attributes, (relationships_offset,
+                                                                                           attributes_offset)
+
+
+def get_image_filename(res_file: str, image_id: Optional[int]) -> str:
+    """
+    Creates name of result file for given image
+
+    :param res_file: name of result file (for example res.html)
+    :param image_id: id of image
+    :return: name of result file for image (for example res_1.html)
+    """
+
+    name, extension = os.path.splitext(res_file)
+    res = f'{name}_{image_id}{extension}'
+
+    return res
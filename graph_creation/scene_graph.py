@@ -0,0 +1,278 @@
+"""
+Compact representation of image scene graph
+
+Names, predicates and attributes are interned in vocabulary
+(one per store or batch, passed explicitly to share it between
+images) and edges are stored in array columns of integer ids
+instead of sets of string tuples. Consumers read edges grouped
+by subject (relation_items, attribute_items), so sets of strings
+are never built.
+
+@by Vadbeg
+"""
+
+
+from array import array
+from typing import Dict, List, Set, Tuple, Optional, Union
+
+
+TYPECODE = 'I'
+
+
+class Vocabulary:
+    """
+    Maps strings to integer ids and back
+    """
+
+    __slots__ = ('ids', 'names')
+
+    def __init__(self):
+        self.ids = dict()
+        self.names = list()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, idx: int) -> str:
+        return self.names[idx]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    def add(self, name: str) -> int:
+        """
+        Adds string into vocabulary (if it isn't there yet)
+
+        :param name: string to add
+        :return: id of string
+        """
+
+        idx = self.ids.get(name)
+
+        if idx is None:
+            idx = len(self.names)
+
+            self.ids[name] = idx
+            self.names.append(name)
+
+        return idx
+
+
+def get_name(info: Dict) -> str:
+    """
+    Gets name of object from raw object dict
+
+    :param info: raw object dict
+    :return: name of object
+    """
+
+    if 'names' in info.keys():
+        name = info['names'][0]
+    elif 'name' in info.keys():
+        name = info['name']
+    else:
+        name = ''
+
+    return name
+
+
+class SceneGraph:
+    """
+    Compact scene graph of one image. Holds the same data
+    as create_graph_structure and create_graph_structure_attributes results.
+
+    Columns are arrays, or memoryviews when scene graph is loaded from SceneGraphStore.
+    """
+
+    __slots__ = ('vocabulary', 'image_id',
+                 'relation_subjects', 'relation_predicates', 'relation_objects',
+                 'attribute_subjects', 'attribute_values', 'attribute_nodes')
+
+    def __init__(self, vocabulary: Optional[Vocabulary] = None, image_id: Optional[int] = None):
+        """
+        :param vocabulary: vocabulary for strings (new one by default, pass vocabulary to share it between images)
+        :param image_id: id of image
+        """
+
+        if vocabulary is None:
+            vocabulary = Vocabulary()
+
+        self.vocabulary = vocabulary
+        self.image_id = image_id
+
+        self.relation_subjects = array(TYPECODE)
+        self.relation_predicates = array(TYPECODE)
+        self.relation_objects = array(TYPECODE)
+
+        self.attribute_subjects = array(TYPECODE)
+        self.attribute_values = array(TYPECODE)
+
+        # every subject from attributes file, even one without attributes
+        self.attribute_nodes = array(TYPECODE)
+
+    def __len__(self) -> int:
+        return len(self.relation_subjects) + len(self.attribute_subjects)
+
+    @classmethod
+    def from_json(cls, relationships: Dict, attributes: Optional[Dict] = None,
+                  vocabulary: Optional[Vocabulary] = None) -> 'SceneGraph':
+        """
+        Creates scene graph from raw relationships and attributes dicts.
+        Only first predicate between subject and object is kept.
+
+        :param relationships: raw dict of relationships
+        :param attributes: raw dict of attributes
+        :param vocabulary: vocabulary for strings (new one by default)
+        :return: scene graph
+        """
+
+        scene_graph = cls(vocabulary=vocabulary, image_id=relationships.get('image_id'))
+        add = scene_graph.vocabulary.add
+
+        seen_pairs = set()
+
+        for relationship in relationships['relationships']:
+            subject_idx = add(get_name(relationship['subject']))
+            object_idx = add(get_name(relationship['object']))
+
+            if (subject_idx, object_idx) in seen_pairs:
+                continue
+
+            seen_pairs.add((subject_idx, object_idx))
+
+            scene_graph.relation_subjects.append(subject_idx)
+            scene_graph.relation_predicates.append(add(relationship['predicate']))
+            scene_graph.relation_objects.append(object_idx)
+
+        if attributes is None:
+            return scene_graph
+
+        seen_nodes = set()
+        seen_pairs = set()
+
+        for attribute in attributes['attributes']:
+            real_attributes = attribute.get('attributes', list())
+
+            for subject in attribute.get('names', list()):
+                subject_idx = add(subject)
+
+                if subject_idx not in seen_nodes:
+                    seen_nodes.add(subject_idx)
+                    scene_graph.attribute_nodes.append(subject_idx)
+
+                for real_attribute in real_attributes:
+                    value_idx = add(real_attribute)
+
+                    if (subject_idx, value_idx) in seen_pairs:
+                        continue
+
+                    seen_pairs.add((subject_idx, value_idx))
+
+                    scene_graph.attribute_subjects.append(subject_idx)
+                    scene_graph.attribute_values.append(value_idx)
+
+        return scene_graph
+
+    def relations(self) -> Dict[str, Set[Tuple[str, str]]]:
+        """
+        Creates processed relationships (the same as create_graph_structure result)
+
+        :return: processed relationships
+        """
+
+        names = self.vocabulary.names
+        result = dict()
+
+        for subject_idx, predicate_idx, object_idx in zip(self.relation_subjects,
+                                                          self.relation_predicates,
+                                                          self.relation_objects):
+            result.setdefault(names[subject_idx], set()).add((names[predicate_idx], names[object_idx]))
+
+        return result
+
+    def attributes(self) -> Dict[str, Set[str]]:
+        """
+        Creates processed attributes (the same as create_graph_structure_attributes result)
+
+        :return: processed attributes
+        """
+
+        names = self.vocabulary.names
+        result = {names[subject_idx]: set() for subject_idx in self.attribute_nodes}
+
+        for subject_idx, value_idx in zip(self.attribute_subjects, self.attribute_values):
+            result[names[subject_idx]].add(names[value_idx])
+
+        return result
+
+    def relation_items(self) -> List[Tuple[str, List[Tuple[str, str]]]]:
+        """
+        Creates relations list in format used by json2gwf and renderers.
+        Edges are grouped by subject id, pairs are unique already, so sets aren't built
+
+        :return: list of (subject, relations) pairs
+        """
+
+        names = self.vocabulary.names
+        groups = dict()
+
+        for subject_idx, predicate_idx, object_idx in zip(self.relation_subjects,
+                                                          self.relation_predicates,
+                                                          self.relation_objects):
+            groups.setdefault(subject_idx, list()).append((names[predicate_idx], names[object_idx]))
+
+        res = [(names[subject_idx], relations) for subject_idx, relations in groups.items()]
+
+        return res
+
+    def attribute_items(self) -> List[Tuple[str, List[str]]]:
+        """
+        Creates attributes list in format used by json2gwf and renderers
+        (every subject from attributes file, even one without attributes)
+
+        :return: list of (subject, attributes) pairs
+        """
+
+        names = self.vocabulary.names
+        groups = {subject_idx: list() for subject_idx in self.attribute_nodes}
+
+        for subject_idx, value_idx in zip(self.attribute_subjects, self.attribute_values):
+            groups[subject_idx].append(names[value_idx])
+
+        res = [(names[subject_idx], attributes) for subject_idx, attributes in groups.items()]
+
+        return res
+
+
+def get_relation_items(relations: Union[SceneGraph, Dict, List]) -> List[Tuple[str, Set[Tuple[str, str]]]]:
+    """
+    Creates relations list from scene graph, processed relationships dict or list
+
+    :param relations: scene graph, processed relationships or list of (subject, relations) pairs
+    :return: list of (subject, relations) pairs
+    """
+
+    if isinstance(relations, SceneGraph):
+        return relations.relation_items()
+
+    if isinstance(relations, dict):
+        return list(relations.items())
+
+    return relations
+
+
+def get_attribute_items(attributes: Union[SceneGraph, Dict, List]) -> List[Tuple[str, Set[str]]]:
+    """
+    Creates attributes list from scene graph, processed attributes dict or list
+
+    :param attributes: scene graph, processed attributes or list of (subject, attributes) pairs
+    :return: list of (subject, attributes) pairs
+    """
+
+    if isinstance(attributes, SceneGraph):
+        return attributes.attribute_items()
+
+    if isinstance(attributes, dict):
+        return list(attributes.items())
+
+    return attributes
@@ -0,0 +1,603 @@
+"""
+Local conversion service (HTTP on localhost or Unix socket)
+
+Service keeps converters imported and templates compiled in worker
+processes, so one image is converted without starting new python.
+Small requests which come at the same time are sent to worker in
+one batch.
+
+API:
+    POST /convert/html, POST /convert/gwf
+        body: {"relationships": {...}, "attributes": {...},
+               "name": "image_1" (contour name, optional), "layout": false}
+        response: .html or .gwf file
+    GET /metrics - latency, queue depth and batch statistics (json)
+    GET /health
+
+Usage:
+    python -m graph_creation.service --port 8765 --workers 4
+    python -m graph_creation.service --socket /tmp/graph.sock
+
+    client = ServiceClient('/tmp/graph.sock')
+    html = client.convert('html', relationships, attributes)
+
+@by Vadbeg
+"""
+
+
+import io
+import os
+import json
+import stat
+import time
+import queue
+import socket
+import argparse
+import threading
+import http.client
+import socketserver
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple, Union
+
+from graph_creation.instrumentation import configure, logger
+from graph_creation.json_backend import loads
+from graph_creation.structure import create_graph_structure, create_graph_structure_attributes
+
+
+FORMATS = ('html', 'gwf')
+CONTENT_TYPES = {'html': 'text/html; charset=utf-8', 'gwf': 'application/xml'}
+
+
+class RequestError(ValueError):
+    """
+    Request body is not valid (client gets 400)
+    """
+
+
+def init_worker(log_level: Optional[str] = None):
+    """
+    Imports converters and compiles html template, so first request isn't slow
+
+    :param log_level: log level in worker process (None to keep default)
+    """
+
+    configure(level=log_level)
+
+    from pyvis_graph.html_renderer import get_template
+    import gwf_graph.json2gwf
+
+    get_template()
+
+
+def convert(output_format: str, body: bytes) -> bytes:
+    """
+    Converts one image from request body
+
+    :param output_format: 'html' or 'gwf'
+    :param body: request body (json)
+    :return: content of result file
+    """
+
+    try:
+        request = loads(body)
+        relationships = request['relationships']
+        attributes = request['attributes']
+    except (ValueError, KeyError, TypeError) as error:
+        raise RequestError(f'Body should be json with relationships and attributes: {error!r}')
+
+    if not isinstance(relationships.get('relationships') if isinstance(relationships, dict) else None, list):
+        raise RequestError('relationships should be image record with "relationships" list')
+
+    if not isinstance(attributes.get('attributes') if isinstance(attributes, dict) else None, list):
+        raise RequestError('attributes should be image record with "attributes" list')
+
+    layout = bool(request.get('layout', False))
+
+    # records inside lists are checked by structure builders (missing keys are client errors)
+    try:
+        graph_structure = create_graph_structure(relationships)
+        graph_structure_attributes = create_graph_structure_attributes(attributes)
+    except (KeyError, TypeError, AttributeError) as error:
+        raise RequestError(f'Wrong relationship or attribute record: {error!r}')
+
+    if output_format == 'html':
+        from pyvis_graph.html_renderer import render_graph
+
+        html = render_graph(graph_structure, graph_structure_attributes,
+                            image_src=attributes.get('image_url'), static_layout=layout)
+        res = html.encode('utf-8')
+    else:
+        from gwf_graph.json2gwf import write_gwf
+
+        image_id = relationships.get('image_id', attributes.get('image_id'))
+        name = request.get('name', f'image_{image_id}')
+
+        buffer = io.BytesIO()
+        write_gwf(list(graph_structure.items()), list(graph_structure_attributes.items()),
+                  save_path=buffer, name=name, layout=layout)
+        res = buffer.getvalue()
+
+    return res
+
+
+def convert_batch(jobs: List[Tuple[str, bytes]]) -> List[Tuple[int, bytes]]:
+    """
+    Converts several images. Runs in worker process. Every image
+    gets its own status, so one bad request doesn't fail others
+
+    :param jobs: list of (format, request body)
+    :return: list of (http status, response body)
+    """
+
+    results = list()
+
+    for output_format, body in jobs:
+        try:
+            results.append((200, convert(output_format, body)))
+        except RequestError as error:
+            results.append((400, str(error).encode('utf-8')))
+        except Exception as error:
+            logger.exception('conversion failed')
+            results.append((500, repr(error).encode('utf-8')))
+
+    return results
+
+
+class Metrics:
+    """
+    Thread-safe request counters and latencies
+    """
+
+    def __init__(self, window: int = 4096):
+        """
+        :param window: number of last requests used for latency percentiles
+        """
+
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+        self.requests = 0
+        self.statuses = dict()
+        self.latencies = {output_format: deque(maxlen=window) for output_format in FORMATS}
+
+        self.in_flight = 0
+
+        self.batches = 0
+        self.batched_jobs = 0
+
+    def add_request(self, output_format: str, status: int, seconds: float):
+        """
+        Adds finished request
+
+        :param output_format: 'html' or 'gwf'
+        :param status: http status
+        :param seconds: latency
+        """
+
+        with self.lock:
+            self.requests += 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.latencies[output_format].append(seconds)
+
+    def add_batch(self, size: int):
+        """
+        Adds batch sent to worker
+
+        :param size: number of jobs in batch
+        """
+
+        with self.lock:
+            self.batches += 1
+            self.batched_jobs += size
+            self.in_flight += size
+
+    def to_dict(self, queue_size: int) -> Dict:
+        """
+        Creates metrics report
+
+        :param queue_size: number of jobs waiting for batching
+        :return: metrics
+        """
+
+        with self.lock:
+            latencies = dict()
+
+            for output_format, values in self.latencies.items():
+                values = sorted(values)
+
+                if not values:
+                    continue
+
+                latencies[output_format] = {
+                    f'p{percentile}': values[min(len(values) - 1, len(values) * percentile // 100)]
+                    for percentile in (50, 90, 99)
+                }
+                latencies[output_format]['mean'] = sum(values) / len(values)
+
+            res = {'uptime': time.time() - self.started,
+                   'requests': self.requests,
+                   'statuses': {str(status): count for status, count in self.statuses.items()},
+                   'latency_seconds': latencies,
+                   'queue_depth': queue_size,
+                   'in_flight': self.in_flight,
+                   'batches': self.batches,
+                   'mean_batch_size': self.batched_jobs / self.batches if self.batches else 0.0}
+
+        return res
+
+
+class ConversionService:
+    """
+    Process pool with batching dispatcher. Requests are queued, dispatcher
+    collects small requests which come during batch_delay into one batch
+    """
+
+    def __init__(self, workers: Optional[int] = None, batch_size: int = 16, batch_delay: float = 0.005,
+                 batch_max_bytes: int = 2 ** 18, max_queue: int = 1024, log_level: Optional[str] = None):
+        """
+        :param workers: number of worker processes (cpu count by default)
+        :param batch_size: max number of requests in batch
+        :param batch_delay: max time (in seconds) which request waits for other requests
+        :param batch_max_bytes: requests bigger than this are sent to worker alone
+        :param max_queue: max number of waiting requests (others get 503)
+        :param log_level: log level in worker processes
+        """
+
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.batch_max_bytes = batch_max_bytes
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.metrics = Metrics()
+
+        self.executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                                            initializer=init_worker, initargs=(log_level,))
+
+        self.dispatcher = threading.Thread(target=self.__dispatch__, name='dispatcher', daemon=True)
+        self.dispatcher.start()
+
+    def submit(self, output_format: str, body: bytes) -> Future:
+        """
+        Adds request into queue
+
+        :param output_format: 'html' or 'gwf'
+        :param body: request body
+        :return: future with (http status, response body)
+        """
+
+        future = Future()
+
+        try:
+            self.queue.put_nowait((output_format, body, future))
+        except queue.Full:
+            future.set_result((503, b'Queue is full'))
+
+        return future
+
+    def __dispatch__(self):
+        """
+        Collects requests into batches and sends them to workers
+        """
+
+        pending = list()  # job which didn't fit into previous batch
+
+        while True:
+            job = pending.pop() if pending else self.queue.get()
+
+            if job is None:
+                return
+
+            batch = [job]
+
+            if len(job[1]) <= self.batch_max_bytes:
+                deadline = time.monotonic() + self.batch_delay
+
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+
+                    try:
+                        job = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                    if job is None or len(job[1]) > self.batch_max_bytes:
+                        # big job (or stop signal) is handled on next iteration
+                        pending.append(job)
+                        break
+
+                    batch.append(job)
+
+            self.__send__(batch)
+
+    def __send__(self, batch: List[Tuple[str, bytes, Future]]):
+        """
+        Sends batch to worker process
+
+        :param batch: list of (format, body, future)
+        """
+
+        self.metrics.add_batch(len(batch))
+
+        try:
+            pool_future = self.executor.submit(convert_batch, [(output_format, body)
+                                                               for output_format, body, _ in batch])
+        except RuntimeError as error:
+            pool_future = Future()
+            pool_future.set_exception(error)
+
+        def distribute(done: Future):
+            error = done.exception()
+
+            with self.metrics.lock:
+                self.metrics.in_flight -= len(batch)
+
+            for idx, (_, _, future) in enumerate(batch):
+                if error is None:
+                    future.set_result(done.result()[idx])
+                else:
+                    future.set_result((500, repr(error).encode('utf-8')))
+
+        pool_future.add_done_callback(distribute)
+
+    def close(self):
+        """
+        Stops dispatcher and worker processes
+        """
+
+        self.queue.put(None)
+        self.dispatcher.join()
+        self.executor.shutdown()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler of service (server.service is ConversionService)
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            metrics = self.server.service.metrics.to_dict(queue_size=self.server.service.queue.qsize())
+            self.__respond__(200, json.dumps(metrics).encode('utf-8'), 'application/json')
+        elif self.path == '/health':
+            self.__respond__(200, b'ok', 'text/plain')
+        else:
+            self.__respond__(404, b'Not found', 'text/plain')
+
+    def do_POST(self):
+        start = time.perf_counter()
+
+        output_format = self.path.rstrip('/').rsplit('/', 1)[-1]
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        if not self.path.startswith('/convert/') or output_format not in FORMATS:
+            self.__respond__(404, b'Use /convert/html or /convert/gwf', 'text/plain')
+            return
+
+        status, content = self.server.service.submit(output_format, body).result()
+        content_type = CONTENT_TYPES[output_format] if status == 200 else 'text/plain'
+
+        self.__respond__(status, content, content_type)
+        self.server.service.metrics.add_request(output_format, status, time.perf_counter() - start)
+
+    def __respond__(self, status: int, content: bytes, content_type: str):
+        """
+        Sends response
+
+        :param status: http status
+        :param content: response body
+        :param content_type: content type
+        """
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+
+        self.wfile.write(content)
+
+    def address_string(self) -> str:
+        # client address of unix socket is empty string
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format: str, *args):
+        logger.debug('%s %s', self.address_string(), format % args)
+
+
+class TCPHTTPServer(ThreadingHTTPServer):
+    """
+    HTTP server on TCP socket
+    """
+
+    request_queue_size = 128
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    HTTP server on Unix socket
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def create_server(service: ConversionService, host: str = '127.0.0.1', port: int = 8765,
+                  socket_path: Optional[str] = None) -> socketserver.BaseServer:
+    """
+    Creates HTTP server for service
+
+    :param service: conversion service
+    :param host: host (only for TCP)
+    :param port: port (only for TCP, 0 to choose free port)
+    :param socket_path: path to Unix socket (TCP is used if None)
+    :return: server (call serve_forever)
+    """
+
+    if socket_path is not None:
+        # only stale socket of previous run is removed, never other files
+        if os.path.lexists(socket_path):
+            if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+                raise ValueError(f'{socket_path} exists and isn\'t a socket')
+
+            os.remove(socket_path)
+
+        server = UnixHTTPServer(socket_path, RequestHandler)
+    else:
+        server = TCPHTTPServer((host, port), RequestHandler)
+
+    server.service = service
+
+    return server
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over Unix socket
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 60.0):
+        """
+        :param socket_path: path to Unix socket
+        :param timeout: socket timeout
+        """
+
+        super().__init__('localhost', timeout=timeout)
+
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class ServiceClient:
+    """
+    Client of conversion service (one connection per client, not thread-safe)
+    """
+
+    def __init__(self, address: Union[str, Tuple[str, int]], timeout: float = 60.0):
+        """
+        :param address: path to Unix socket or (host, port)
+        :param timeout: socket timeout
+        """
+
+        if isinstance(address, str):
+            self.connection = UnixHTTPConnection(address, timeout=timeout)
+        else:
+            self.connection = http.client.HTTPConnection(*address, timeout=timeout)
+
+    def __request__(self, method: str, path: str, body: Optional[bytes] = None) -> bytes:
+        """
+        Sends request
+
+        :param method: http method
+        :param path: url path
+        :param body: request body
+        :return: response body
+        """
+
+        headers = {'Content-Type': 'application/json'} if body is not None else dict()
+
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        content = response.read()
+
+        if response.status != 200:
+            raise RuntimeError(f'{response.status}: {content.decode("utf-8", errors="replace")}')
+
+        return content
+
+    def convert(self, output_format: str, relationships: Dict, attributes: Dict,
+                name: Optional[str] = None, layout: bool = False) -> bytes:
+        """
+        Converts one image
+
+        :param output_format: 'html' or 'gwf'
+        :param relationships: raw dict of relationships for image
+        :param attributes: raw dict of attributes for image
+        :param name: name of contour (for .gwf)
+        :param layout: compute node coordinates
+        :return: content of result file
+        """
+
+        request = {'relationships': relationships, 'attributes': attributes, 'layout': layout}
+
+        if name is not None:
+            request['name'] = name
+
+        res = self.__request__('POST', f'/convert/{output_format}', body=json.dumps(request).encode('utf-8'))
+
+        return res
+
+    def metrics(self) -> Dict:
+        """
+        Gets service metrics
+
+        :return: metrics
+        """
+
+        res = json.loads(self.__request__('GET', '/metrics'))
+
+        return res
+
+    def close(self):
+        self.connection.close()
+
+
+def create_parser() -> argparse.ArgumentParser:
+    """
+    Creates parser for command line arguments
+
+    :return: parser
+    """
+
+    parser = argparse.ArgumentParser(description='Local service which converts images into .html and .gwf files')
+
+    parser.add_argument('--host', default='127.0.0.1', help='host to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='port to listen on')
+    parser.add_argument('--socket', default=None, help='path to Unix socket (used instead of host and port)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--batch-size', type=int, default=16, help='max number of requests in batch')
+    parser.add_argument('--batch-delay', type=float, default=5.0,
+                        help='max time (in ms) which request waits for other requests')
+    parser.add_argument('--max-queue', type=int, default=1024, help='max number of waiting requests')
+    parser.add_argument('--log-level', default='INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+                        help='log level')
+
+    return parser
+
+
+def cli(args: Optional[List[str]] = None):
+    """
+    Command line entry point
+
+    :param args: command line arguments (sys.argv by default)
+    """
+
+    args = create_parser().parse_args(args)
+
+    configure(level=args.log_level)
+
+    service = ConversionService(workers=args.workers, batch_size=args.batch_size,
+                                batch_delay=args.batch_delay / 1000, max_queue=args.max_queue,
+                                log_level=args.log_level)
+    server = create_server(service, host=args.host, port=args.port, socket_path=args.socket)
+
+    logger.info('listening on %s', args.socket or f'http://{args.host}:{args.port}')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    cli()
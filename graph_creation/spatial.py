@@ -0,0 +1,436 @@
+"""
+Spatial relations between objects of image
+
+Boxes of objects (x, y, w, h of VG records or store columns) are loaded
+into NumPy arrays and all pairs are compared at once with broadcasting:
+IoU, containment and relative position (left of, above, inside).
+Derived spatial edges can be added into processed relationships,
+GridIndex finds objects which overlap given region.
+
+Image coordinates are used: x grows to the right, y grows down.
+
+Usage:
+    boxes = Boxes.from_json(relationships, attributes)
+    graph_structure = create_graph_structure(relationships)
+    add_spatial_relations(graph_structure, boxes, spatial_edges(boxes))
+
+    GridIndex(boxes).query(0, 0, 100, 100)  # indices of objects
+
+Note: projected records (iter_images(..., projected=True)) don't have boxes.
+
+@by Vadbeg
+"""
+
+
+import math
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from graph_creation.scene_graph import get_name
+from graph_creation.structure import create_graph_structure
+
+if TYPE_CHECKING:
+    from graph_creation.store import SceneGraphStore
+
+
+class Boxes:
+    """
+    Boxes of objects of one image: ids, names and (x0, y0, x1, y1) rows
+    """
+
+    def __init__(self, ids: np.ndarray, names: List[str], boxes: np.ndarray):
+        """
+        :param ids: object ids
+        :param names: object names
+        :param boxes: array of shape (n, 4) with x0, y0, x1, y1 of every object
+        """
+
+        self.ids = ids
+        self.names = names
+        self.boxes = boxes
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __str__(self) -> str:
+        res = f'Boxes({len(self)} objects)'
+
+        return res
+
+    @classmethod
+    def from_objects(cls, objects: List[Dict]) -> 'Boxes':
+        """
+        Creates boxes from raw object dicts (objects without box are skipped)
+
+        :param objects: raw object dicts
+        :return: boxes
+        """
+
+        objects = [info for info in objects if 'x' in info and 'y' in info and 'w' in info and 'h' in info]
+
+        ids = np.array([info.get('object_id', -1) for info in objects], dtype=np.int64)
+        names = [get_name(info) for info in objects]
+
+        boxes = np.array([(info['x'], info['y'], info['w'], info['h']) for info in objects],
+                         dtype=np.float64).reshape(-1, 4)
+        boxes[:, 2:] += boxes[:, :2]
+
+        res = cls(ids=ids, names=names, boxes=boxes)
+
+        return res
+
+    @classmethod
+    def from_json(cls, relationships: Dict, attributes: Optional[Dict] = None) -> 'Boxes':
+        """
+        Creates boxes of all objects of image (from attributes and relationships, every object once)
+
+        :param relationships: raw dict of relationships for image
+        :param attributes: raw dict of attributes for image
+        :return: boxes
+        """
+
+        from graph_creation.store import get_objects
+
+        res = cls.from_objects(get_objects(relationships, attributes))
+
+        return res
+
+    @classmethod
+    def from_store(cls, store: 'SceneGraphStore', image_id: int) -> 'Boxes':
+        """
+        Creates boxes of image from binary store (columns aren't parsed, only copied into one array)
+
+        :param store: opened store
+        :param image_id: id of image
+        :return: boxes
+        """
+
+        objects = store.get_objects(image_id)
+
+        ids = np.frombuffer(objects['object_ids'], dtype=np.int64)
+        names = [store.vocabulary[idx] for idx in objects['object_names']]
+
+        boxes = np.empty((len(ids), 4), dtype=np.float64)
+
+        for column, name in enumerate(('object_x', 'object_y', 'object_w', 'object_h')):
+            boxes[:, column] = np.frombuffer(objects[name], dtype=np.int32)
+
+        boxes[:, 2:] += boxes[:, :2]
+
+        res = cls(ids=ids, names=names, boxes=boxes)
+
+        return res
+
+    @property
+    def areas(self) -> np.ndarray:
+        res = (self.boxes[:, 2] - self.boxes[:, 0]) * (self.boxes[:, 3] - self.boxes[:, 1])
+
+        return res
+
+
+def compute_relations(boxes: Boxes, inside_threshold: float = 0.9) -> Dict[str, np.ndarray]:
+    """
+    Compares all pairs of boxes at once. Every result is (n, n) matrix,
+    where [i, j] is relation of object i to object j
+
+    :param boxes: boxes of image
+    :param inside_threshold: min part of box area in other box, which is still inside it
+    :return: dict with 'iou', 'containment' (part of area of i in j), 'intersection'
+        and boolean 'left_of', 'above', 'inside' (diagonal is False)
+    """
+
+    x0, y0, x1, y1 = boxes.boxes.T
+    areas = boxes.areas
+
+    width = np.minimum(x1[:, None], x1[None, :]) - np.maximum(x0[:, None], x0[None, :])
+    height = np.minimum(y1[:, None], y1[None, :]) - np.maximum(y0[:, None], y0[None, :])
+
+    intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+    union = areas[:, None] + areas[None, :] - intersection
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        iou = np.where(union > 0, intersection / union, 0.0)
+        containment = np.where(areas[:, None] > 0, intersection / areas[:, None], 0.0)
+
+    not_self = ~np.eye(len(boxes), dtype=bool)
+
+    res = {'intersection': intersection,
+           'iou': iou,
+           'containment': containment,
+           'left_of': (x1[:, None] <= x0[None, :]) & not_self,
+           'above': (y1[:, None] <= y0[None, :]) & not_self,
+           'inside': (containment >= inside_threshold) & (areas[:, None] <= areas[None, :]) & not_self}
+
+    return res
+
+
+def get_nearest(candidates: np.ndarray, distances: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Gets nearest candidate for every row
+
+    :param candidates: boolean (n, n) matrix of candidates
+    :param distances: (n, n) matrix of distances
+    :return: indices of rows which have candidates and their nearest candidates
+    """
+
+    rows = np.flatnonzero(candidates.any(axis=1))
+
+    # argmin of empty rows (image without objects) fails
+    if not len(rows):
+        return rows, np.empty(0, dtype=np.intp)
+
+    distances = np.where(candidates, distances, np.inf)
+
+    res = rows, distances[rows].argmin(axis=1)
+
+    return res
+
+
+def spatial_edges(boxes: Boxes, relations: Optional[Dict[str, np.ndarray]] = None, min_iou: float = 0.5,
+                  inside_threshold: float = 0.9, min_overlap: float = 0.5) -> List[Tuple[int, int, str]]:
+    """
+    Derives spatial edges. Number of edges grows linearly with number
+    of objects (except 'overlaps'), because only nearest objects are linked:
+
+        - 'inside': object is linked with the smallest box it is inside
+        - 'left of' / 'above': object is linked with the nearest object
+          to the right of it (in the same row) / under it (in the same column)
+        - 'overlaps': pairs with IoU >= min_iou (one edge for every pair)
+
+    :param boxes: boxes of image
+    :param relations: result of compute_relations (computed if None)
+    :param min_iou: min IoU of 'overlaps' edge
+    :param inside_threshold: min part of box area in other box, which is still inside it
+    :param min_overlap: min overlap of rows (columns) of two objects (part of the smaller
+        height (width)), which are linked with 'left of' ('above')
+    :return: list of (subject index, object index, predicate)
+    """
+
+    if not len(boxes):
+        return list()
+
+    if relations is None:
+        relations = compute_relations(boxes, inside_threshold=inside_threshold)
+
+    x0, y0, x1, y1 = boxes.boxes.T
+    widths = x1 - x0
+    heights = y1 - y0
+
+    res = list()
+
+    areas = np.broadcast_to(boxes.areas[None, :], relations['inside'].shape)
+
+    rows, nearest = get_nearest(relations['inside'], areas)
+    res.extend((i, j, 'inside') for i, j in zip(rows.tolist(), nearest.tolist()))
+
+    row_overlap = np.minimum(y1[:, None], y1[None, :]) - np.maximum(y0[:, None], y0[None, :])
+    same_row = row_overlap >= min_overlap * np.minimum(heights[:, None], heights[None, :])
+
+    rows, nearest = get_nearest(relations['left_of'] & same_row, x0[None, :] - x1[:, None])
+    res.extend((i, j, 'left of') for i, j in zip(rows.tolist(), nearest.tolist()))
+
+    column_overlap = np.minimum(x1[:, None], x1[None, :]) - np.maximum(x0[:, None], x0[None, :])
+    same_column = column_overlap >= min_overlap * np.minimum(widths[:, None], widths[None, :])
+
+    rows, nearest = get_nearest(relations['above'] & same_column, y0[None, :] - y1[:, None])
+    res.extend((i, j, 'above') for i, j in zip(rows.tolist(), nearest.tolist()))
+
+    overlaps = np.triu(relations['iou'] >= min_iou, k=1)
+    res.extend((i, j, 'overlaps') for i, j in zip(*(index.tolist() for index in np.nonzero(overlaps))))
+
+    return res
+
+
+def add_spatial_relations(graph_structure: Dict[str, Set[Tuple[str, str]]], boxes: Boxes,
+                          edges: List[Tuple[int, int, str]]) -> int:
+    """
+    Adds spatial edges into processed relationships. Like in create_graph_structure
+    only first predicate between subject and object is kept, so edges from
+    relationships aren't replaced
+
+    :param graph_structure: processed relationships (changed in place)
+    :param boxes: boxes of image
+    :param edges: list of (subject index, object index, predicate)
+    :return: number of added edges
+    """
+
+    objects_index = {subject: {object_name for _, object_name in relations}
+                     for subject, relations in graph_structure.items()}
+
+    res = 0
+
+    for i, j, predicate in edges:
+        subject_name = boxes.names[i]
+        object_name = boxes.names[j]
+
+        subject_objects = objects_index.setdefault(subject_name, set())
+
+        if subject_name == object_name or object_name in subject_objects:
+            continue
+
+        subject_objects.add(object_name)
+        graph_structure.setdefault(subject_name, set()).add((predicate, object_name))
+
+        res += 1
+
+    return res
+
+
+def create_graph_structure_spatial(relationships: Dict, attributes: Optional[Dict] = None,
+                                   **kwargs) -> Dict[str, Set[Tuple[str, str]]]:
+    """
+    Creates processed relationships with spatial edges
+
+    :param relationships: raw dict of relationships
+    :param attributes: raw dict of attributes (its objects have boxes too)
+    :param kwargs: arguments of spatial_edges (min_iou, inside_threshold, min_overlap)
+    :return: processed relationships
+    """
+
+    res = create_graph_structure(relationships)
+
+    boxes = Boxes.from_json(relationships, attributes)
+    add_spatial_relations(res, boxes, spatial_edges(boxes, **kwargs))
+
+    return res
+
+
+class GridIndex:
+    """
+    Uniform grid over boxes of image. Every box is added into all cells
+    it covers and cells are stored as one sorted array with offsets of
+    cells (like posting lists), so index is built without python loops
+    over objects and cells of one grid row are read with one slice.
+
+    For small number of objects one vectorized scan of all boxes is
+    faster than reading cells, so grid is used only for scan_limit or
+    more objects (thousands of objects, for example merged images)
+    """
+
+    scan_limit = 2000
+
+    def __init__(self, boxes: Boxes, cell_size: Optional[float] = None):
+        """
+        :param boxes: boxes of image
+        :param cell_size: size of cell (None to get it from number and size of boxes)
+        """
+
+        self.boxes = boxes
+
+        coords = boxes.boxes
+
+        if len(boxes):
+            origin = coords[:, :2].min(axis=0)
+            extent = coords[:, 2:].max(axis=0) - origin
+        else:
+            origin = np.zeros(2)
+            extent = np.zeros(2)
+
+        # cells are not smaller than typical box, so box is added only into a few cells
+        if cell_size is None:
+            cell_size = math.sqrt(float(extent[0]) * float(extent[1]) / max(len(boxes), 1))
+
+            if len(boxes):
+                cell_size = max(cell_size, float(np.median(np.maximum(coords[:, 2] - coords[:, 0],
+                                                                      coords[:, 3] - coords[:, 1]))))
+
+        self.origin = (float(origin[0]), float(origin[1]))
+        self.cell_size = max(cell_size, 1.0)
+        self.shape = (int(extent[0] // self.cell_size) + 1, int(extent[1] // self.cell_size) + 1)
+
+        shape = np.array(self.shape)
+
+        first = np.clip(np.floor((coords[:, :2] - origin) / self.cell_size).astype(np.int64), 0, shape - 1)
+        last = np.clip(np.floor((coords[:, 2:] - origin) / self.cell_size).astype(np.int64), 0, shape - 1)
+
+        spans = last - first + 1
+        counts = spans[:, 0] * spans[:, 1]
+
+        objects = np.repeat(np.arange(len(boxes)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        span_x = np.repeat(spans[:, 0], counts)
+        cell_x = np.repeat(first[:, 0], counts) + local % span_x
+        cell_y = np.repeat(first[:, 1], counts) + local // span_x
+
+        cells = cell_y * self.shape[0] + cell_x
+        order = np.argsort(cells, kind='stable')
+
+        self.objects = objects[order]
+
+        self.offsets = np.zeros(self.shape[0] * self.shape[1] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self.shape[0] * self.shape[1]), out=self.offsets[1:])
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def __str__(self) -> str:
+        res = f'GridIndex({len(self)} objects, {self.shape[0]}x{self.shape[1]} cells of {self.cell_size:.1f})'
+
+        return res
+
+    def __get_cell__(self, value: float, axis: int) -> int:
+        """
+        Gets cell of coordinate (clipped to grid)
+
+        :param value: coordinate
+        :param axis: 0 for x, 1 for y
+        :return: cell index along axis
+        """
+
+        res = int((value - self.origin[axis]) // self.cell_size)
+        res = min(max(res, 0), self.shape[axis] - 1)
+
+        return res
+
+    def query(self, x0: float, y0: float, x1: float, y1: float) -> np.ndarray:
+        """
+        Finds objects which overlap region (boxes which touch region are found too)
+
+        :param x0: left side of region
+        :param y0: top side of region
+        :param x1: right side of region
+        :param y1: bottom side of region
+        :return: sorted indices of objects (see boxes.names and boxes.ids)
+        """
+
+        if not len(self) or x0 > x1 or y0 > y1 or x1 < self.origin[0] or y1 < self.origin[1]:
+            return np.empty(0, dtype=np.int64)
+
+        if len(self) < self.scan_limit:
+            boxes = self.boxes.boxes
+            res = np.flatnonzero((boxes[:, 0] <= x1) & (boxes[:, 2] >= x0) & (boxes[:, 1] <= y1) & (boxes[:, 3] >= y0))
+
+            return res
+
+        first_x, last_x = self.__get_cell__(x0, axis=0), self.__get_cell__(x1, axis=0)
+        first_y, last_y = self.__get_cell__(y0, axis=1), self.__get_cell__(y1, axis=1)
+
+        width = self.shape[0]
+        offsets = self.offsets
+
+        # cells of one grid row are neighbours in objects array
+        candidates = [self.objects[offsets[row * width + first_x]:offsets[row * width + last_x + 1]]
+                      for row in range(first_y, last_y + 1)]
+        candidates = np.unique(np.concatenate(candidates))
+
+        boxes = self.boxes.boxes[candidates]
+        overlaps = (boxes[:, 0] <= x1) & (boxes[:, 2] >= x0) & (boxes[:, 1] <= y1) & (boxes[:, 3] >= y0)
+
+        res = candidates[overlaps]
+
+        return res
+
+    def query_point(self, x: float, y: float) -> np.ndarray:
+        """
+        Finds objects which contain point
+
+        :param x: x of point
+        :param y: y of point
+        :return: sorted indices of objects
+        """
+
+        res = self.query(x, y, x, y)
+
+        return res
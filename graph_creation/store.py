@@ -0,0 +1,412 @@
+"""
+Preprocessed binary store of scene graphs
+
+Dataset is converted once: strings are coded with one vocabulary,
+scene graph columns (see SceneGraph), object boxes and image urls
+of all images are written into one file as flat arrays with
+per-image offsets. File is memory mapped on reading, so image is
+loaded as slices of arrays (nothing is parsed or copied) and worker
+processes share the same memory pages.
+
+Usage:
+    python -m graph_creation.store relationships.json attributes.json store_dir
+
+    store = SceneGraphStore('store_dir')
+    scene_graph = store.get(image_id)
+
+@by Vadbeg
+"""
+
+
+import os
+import sys
+import mmap
+import json
+import argparse
+
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from graph_creation.reader import iter_images
+from graph_creation.scene_graph import SceneGraph, Vocabulary, get_name
+from graph_creation.instrumentation import logger
+
+
+STORE_VERSION = 1
+
+META_FILENAME = 'meta.json'
+DATA_FILENAME = 'store.bin'
+
+# per-image offsets into other columns (images + 1 values)
+OFFSET_COLUMNS = ('relation_offsets', 'attribute_offsets', 'node_offsets', 'object_offsets', 'url_offsets')
+
+# scene graph columns (vocabulary ids)
+RELATION_COLUMNS = ('relation_subjects', 'relation_predicates', 'relation_objects')
+ATTRIBUTE_COLUMNS = ('attribute_subjects', 'attribute_values')
+
+# object boxes
+OBJECT_COLUMNS = ('object_ids', 'object_names', 'object_x', 'object_y', 'object_w', 'object_h')
+
+COLUMNS = {'image_ids': 'q',
+           'relation_offsets': 'Q', 'attribute_offsets': 'Q', 'node_offsets': 'Q',
+           'object_offsets': 'Q', 'url_offsets': 'Q',
+           'relation_subjects': 'I', 'relation_predicates': 'I', 'relation_objects': 'I',
+           'attribute_subjects': 'I', 'attribute_values': 'I', 'attribute_nodes': 'I',
+           'object_ids': 'q', 'object_names': 'I',
+           'object_x': 'i', 'object_y': 'i', 'object_w': 'i', 'object_h': 'i',
+           'urls': 'B'}
+
+ALIGNMENT = 8
+
+
+def get_objects(relationships: Dict, attributes: Optional[Dict]) -> List[Dict]:
+    """
+    Gets all objects of image (from attributes and relationships), every object once
+
+    :param relationships: raw dict of relationships for image
+    :param attributes: raw dict of attributes for image
+    :return: raw object dicts
+    """
+
+    objects = dict()
+
+    infos = list(attributes['attributes']) if attributes is not None else list()
+
+    for relationship in relationships['relationships']:
+        infos.append(relationship['subject'])
+        infos.append(relationship['object'])
+
+    for info in infos:
+        object_id = info.get('object_id')
+
+        if object_id is not None and object_id not in objects:
+            objects[object_id] = info
+
+    return list(objects.values())
+
+
+class StoreBuilder:
+    """
+    Collects columns of all images and writes store into directory
+    """
+
+    def __init__(self):
+        self.vocabulary = Vocabulary()
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+
+        for name in OFFSET_COLUMNS:
+            self.columns[name].append(0)
+
+    def add_image(self, relationships: Dict, attributes: Optional[Dict] = None):
+        """
+        Adds one image into store
+
+        :param relationships: raw dict of relationships for image
+        :param attributes: raw dict of attributes for image
+        """
+
+        columns = self.columns
+
+        scene_graph = SceneGraph.from_json(relationships, attributes, vocabulary=self.vocabulary)
+
+        image_id = relationships.get('image_id')
+
+        if image_id is None and attributes is not None:
+            image_id = attributes.get('image_id')
+
+        if image_id is None:
+            raise ValueError('Image without image_id can\'t be stored')
+
+        columns['image_ids'].append(image_id)
+
+        for name in RELATION_COLUMNS + ATTRIBUTE_COLUMNS + ('attribute_nodes',):
+            columns[name].extend(getattr(scene_graph, name))
+
+        for info in get_objects(relationships, attributes):
+            columns['object_ids'].append(info['object_id'])
+            columns['object_names'].append(self.vocabulary.add(get_name(info)))
+
+            for key in ('x', 'y', 'w', 'h'):
+                columns[f'object_{key}'].append(int(info.get(key, 0)))
+
+        url = (attributes or dict()).get('image_url') or ''
+        columns['urls'].frombytes(url.encode('utf-8'))
+
+        columns['relation_offsets'].append(len(columns['relation_subjects']))
+        columns['attribute_offsets'].append(len(columns['attribute_subjects']))
+        columns['node_offsets'].append(len(columns['attribute_nodes']))
+        columns['object_offsets'].append(len(columns['object_ids']))
+        columns['url_offsets'].append(len(columns['urls']))
+
+    def save(self, directory: str):
+        """
+        Writes store into directory (one data file and meta with column offsets and vocabulary)
+
+        :param directory: store directory
+        """
+
+        os.makedirs(directory, exist_ok=True)
+
+        meta = {'version': STORE_VERSION,
+                'byteorder': sys.byteorder,
+                'images': len(self.columns['image_ids']),
+                'columns': dict(),
+                'vocabulary': self.vocabulary.names}
+
+        offset = 0
+
+        with open(os.path.join(directory, DATA_FILENAME), mode='wb') as file:
+            for name, column in self.columns.items():
+                padding = -offset % ALIGNMENT
+                file.write(b'\0' * padding)
+                offset += padding
+
+                file.write(column.tobytes())
+
+                meta['columns'][name] = {'offset': offset, 'length': len(column),
+                                         'typecode': column.typecode, 'itemsize': column.itemsize}
+                offset += len(column) * column.itemsize
+
+        with open(os.path.join(directory, META_FILENAME), mode='w', encoding='utf-8') as file:
+            json.dump(meta, file, ensure_ascii=False)
+
+
+def build_store(relationships_path: str, attributes_path: str, directory: str) -> StoreBuilder:
+    """
+    Converts dataset files into store
+
+    :param relationships_path: relationships file (one image or VG dump)
+    :param attributes_path: attributes file (one image or VG dump)
+    :param directory: store directory
+    :return: store builder
+    """
+
+    builder = StoreBuilder()
+
+    for relationships, attributes in iter_images(relationships_path, attributes_path):
+        builder.add_image(relationships, attributes)
+
+    builder.save(directory)
+    logger.info('stored %d images into %s', len(builder.columns['image_ids']), directory)
+
+    return builder
+
+
+def is_store(path: str) -> bool:
+    """
+    Checks if path is store directory
+
+    :param path: path to check
+    :return: bool
+    """
+
+    res = os.path.isfile(os.path.join(path, META_FILENAME)) and os.path.isfile(os.path.join(path, DATA_FILENAME))
+
+    return res
+
+
+class SceneGraphStore:
+    """
+    Memory mapped store. Columns are memoryviews of mapped file
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory: store directory
+        """
+
+        with open(os.path.join(directory, META_FILENAME), encoding='utf-8') as file:
+            meta = json.load(file)
+
+        if meta.get('version') != STORE_VERSION:
+            raise ValueError(f'Unsupported store version: {meta.get("version")}')
+
+        if meta['byteorder'] != sys.byteorder:
+            raise ValueError(f'Store is written on {meta["byteorder"]} endian machine')
+
+        self.directory = directory
+        self.images = meta['images']
+
+        self.vocabulary = Vocabulary()
+
+        for name in meta['vocabulary']:
+            self.vocabulary.add(name)
+
+        self.file = open(os.path.join(directory, DATA_FILENAME), mode='rb')
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        view = memoryview(self.buffer)
+        self.columns = dict()
+
+        for name, column in meta['columns'].items():
+            if array(column['typecode']).itemsize != column['itemsize']:
+                raise ValueError(f'Column {name} has unsupported item size')
+
+            start = column['offset']
+            end = start + column['length'] * column['itemsize']
+
+            self.columns[name] = view[start:end].cast(column['typecode'])
+
+        self.rows = {image_id: row for row, image_id in enumerate(self.columns['image_ids'])}
+
+    def __len__(self) -> int:
+        return self.images
+
+    def __contains__(self, image_id: int) -> bool:
+        return image_id in self.rows
+
+    def __enter__(self) -> 'SceneGraphStore':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Closes data file. Scene graphs loaded from store can't be used after that
+        """
+
+        for column in self.columns.values():
+            column.release()
+
+        self.columns = dict()
+
+        try:
+            self.buffer.close()
+        except BufferError:
+            # scene graphs loaded from store still use mapping, it is closed when they are deleted
+            pass
+
+        self.file.close()
+
+    def image_ids(self) -> List[int]:
+        """
+        Gets ids of all images (in dataset order)
+
+        :return: image ids
+        """
+
+        return self.columns['image_ids'].tolist()
+
+    def __slice__(self, offsets_name: str, row: int) -> Tuple[int, int]:
+        """
+        Gets bounds of image in columns
+
+        :param offsets_name: name of offsets column
+        :param row: image row
+        :return: start and end
+        """
+
+        offsets = self.columns[offsets_name]
+
+        return offsets[row], offsets[row + 1]
+
+    def get(self, image_id: int) -> SceneGraph:
+        """
+        Loads scene graph of image. Columns of scene graph are
+        slices of mapped file (nothing is copied)
+
+        :param image_id: id of image
+        :return: scene graph
+        """
+
+        row = self.rows[image_id]
+        columns = self.columns
+
+        scene_graph = SceneGraph(vocabulary=self.vocabulary, image_id=image_id)
+
+        start, end = self.__slice__('relation_offsets', row)
+
+        for name in RELATION_COLUMNS:
+            setattr(scene_graph, name, columns[name][start:end])
+
+        start, end = self.__slice__('attribute_offsets', row)
+
+        for name in ATTRIBUTE_COLUMNS:
+            setattr(scene_graph, name, columns[name][start:end])
+
+        start, end = self.__slice__('node_offsets', row)
+        scene_graph.attribute_nodes = columns['attribute_nodes'][start:end]
+
+        return scene_graph
+
+    def get_objects(self, image_id: int) -> Dict[str, memoryview]:
+        """
+        Loads objects of image (ids, name ids and boxes)
+
+        :param image_id: id of image
+        :return: column name -> slice ('object_ids', 'object_names', 'object_x', ...)
+        """
+
+        start, end = self.__slice__('object_offsets', self.rows[image_id])
+
+        res = {name: self.columns[name][start:end] for name in OBJECT_COLUMNS}
+
+        return res
+
+    def get_image_url(self, image_id: int) -> Optional[str]:
+        """
+        Gets url of image
+
+        :param image_id: id of image
+        :return: url (None if dataset doesn't have it)
+        """
+
+        start, end = self.__slice__('url_offsets', self.rows[image_id])
+
+        if start == end:
+            return None
+
+        res = bytes(self.columns['urls'][start:end]).decode('utf-8')
+
+        return res
+
+    def __iter__(self) -> Iterator[SceneGraph]:
+        for image_id in self.columns['image_ids']:
+            yield self.get(image_id)
+
+
+_stores = dict()
+
+
+def open_store(directory: str) -> SceneGraphStore:
+    """
+    Opens store (one object per process, so vocabulary is read only once)
+
+    :param directory: store directory
+    :return: store
+    """
+
+    store = _stores.get(directory)
+
+    if store is None:
+        store = SceneGraphStore(directory)
+        _stores[directory] = store
+
+    return store
+
+
+def cli(args: Optional[List[str]] = None):
+    """
+    Command line entry point
+
+    :param args: command line arguments (sys.argv by default)
+    """
+
+    from graph_creation.instrumentation import configure
+
+    parser = argparse.ArgumentParser(description='Converts dataset into binary store of scene graphs')
+
+    parser.add_argument('relationships', help='relationships file (one image or VG dump)')
+    parser.add_argument('attributes', help='attributes file (one image or VG dump)')
+    parser.add_argument('directory', help='store directory')
+
+    args = parser.parse_args(args)
+
+    configure(level='INFO')
+
+    build_store(args.relationships, args.attributes, args.directory)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,106 @@
+"""
+Parsing of raw relationships and attributes into graph structures
+
+Module has no dependencies, so it can be imported by every
+output format (and worker process) without pyvis and lxml.
+
+@by Vadbeg
+"""
+
+
+from typing import Set, Tuple, Dict, Optional
+
+from graph_creation.instrumentation import timed
+
+
+def have_predicate(relationships: Set[Optional[Tuple[str, str]]], name: str) -> bool:
+    """
+    Check if subject have more than one predicate
+    to the same object
+
+    :param relationships: predicates and objects for subject
+    :param name: name of object which we like to add
+    :return: bool
+    """
+
+    for relationship in relationships:
+        if name == relationship[1]:
+            return True
+
+    return False
+
+
+@timed('create_graph_structure')
+def create_graph_structure(relationships: Dict) -> Dict[str, Set[Tuple[str, str]]]:
+    """
+    Creates graph structure from raw relationships dict.
+    Only first predicate between subject and object is kept
+    (objects of every subject are indexed, so check is O(1))
+
+    :param relationships: raw dict of relationships
+    :return: processed relationships
+    """
+
+    result = dict()
+    objects_index = dict()  # subject -> objects which are already connected to it
+
+    for relationship in (relationships['relationships']):
+        predicate = relationship['predicate']
+        object_info = relationship['object']
+        subject_info = relationship['subject']
+
+        if 'names' in object_info.keys():
+            object_name = object_info['names'][0]
+        elif 'name' in object_info.keys():
+            object_name = object_info['name']
+        else:
+            object_name = ''
+
+        if 'names' in subject_info.keys():
+            subject_name = subject_info['names'][0]
+        elif 'name' in subject_info.keys():
+            subject_name = subject_info['name']
+        else:
+            subject_name = ''
+
+        subject_objects = objects_index.setdefault(subject_name, set())
+        result.setdefault(subject_name, set())
+
+        if object_name in subject_objects:
+            continue
+
+        subject_objects.add(object_name)
+        result[subject_name].add((predicate, object_name))
+
+    return result
+
+
+@timed('create_graph_structure_attributes')
+def create_graph_structure_attributes(attributes: Dict) -> Dict[str, Set[str]]:
+    """
+    Creates graph attributes structure from raw attributes dict
+
+    :param attributes: raw dict of attributes
+    :return: processed attributes
+    """
+
+    result = dict()
+
+    for attribute in attributes['attributes']:
+        if 'attributes' in attribute.keys():
+            real_attributes = attribute['attributes']
+        else:
+            real_attributes = list()
+
+        if 'names' in attribute.keys():
+            subjects = attribute['names']
+        else:
+            subjects = ''
+
+        for subject in subjects:
+            result.setdefault(subject, set())
+
+            for real_attribute in real_attributes:
+                result[subject].add(real_attribute)
+
+    return result
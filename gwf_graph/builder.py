@@ -0,0 +1,328 @@
+"""
+Builder of .gwf elements which doesn't depend on document backend
+
+transform fills any template with GWF API (GWF and StreamingGWF from
+gwf_template, StreamingSCs from scs_template), so lxml is imported
+only by templates which need it.
+
+@by Vadbeg
+"""
+
+import os
+from typing import Tuple, Set, List, Optional, Union, BinaryIO, TYPE_CHECKING
+
+from graph_creation.scene_graph import SceneGraph, get_relation_items, get_attribute_items
+from graph_creation.instrumentation import logger, stats
+
+if TYPE_CHECKING:
+    from lxml import etree
+
+    from gwf_graph.gwf_template import GWF
+
+
+def add_class_to_general_node(gwf: 'GWF', general_node: 'etree.SubElement') -> List['etree.SubElement']:
+    """
+    Adds class to general node (every general node need some kind of class)
+
+    :param gwf: gwf template class
+    :param general_node: general node
+    :return: elements created in this function
+    """
+
+    class_node = gwf.add_group_node(name='concept_' + general_node.attrib['idtf'])
+    # class_node = gwf.add_group_node(name='')
+
+    pos_arc = gwf.add_pos_arc(id1=class_node.attrib['id'], id2=general_node.attrib['id'])
+
+    contour_els_list = [class_node, pos_arc]
+
+    return contour_els_list
+
+
+class SymbolTable:
+    """
+    Ids of nodes which are already created in current contour.
+    Lets create every general node (with its class), relation node
+    and attribute node only once
+    """
+
+    def __init__(self):
+        self.general_nodes = dict()
+        self.relation_nodes = dict()
+        self.attribute_nodes = dict()
+
+        self.deduplicated = 0
+
+    def get_general_node(self, gwf: 'GWF', name: str, contour_els_list: List['etree.SubElement']) -> str:
+        """
+        Gets id of general node with given name. Creates node
+        and its class if they don't exist yet
+
+        :param gwf: gwf template class
+        :param name: node name
+        :param contour_els_list: list to which created elements are added
+        :return: node id
+        """
+
+        node_id = self.general_nodes.get(name)
+
+        if node_id is not None:
+            self.deduplicated += 1
+            return node_id
+
+        node = gwf.add_general_node(name)
+        class_contour_els = add_class_to_general_node(gwf=gwf, general_node=node)
+
+        contour_els_list.append(node)
+        contour_els_list.extend(class_contour_els)
+
+        node_id = node.attrib['id']
+        self.general_nodes[name] = node_id
+
+        return node_id
+
+    def get_relation_node(self, gwf: 'GWF', name: str, contour_els_list: List['etree.SubElement']) -> str:
+        """
+        Gets id of relation node with given name. Creates it if it doesn't exist yet
+
+        :param gwf: gwf template class
+        :param name: relation name
+        :param contour_els_list: list to which created elements are added
+        :return: node id
+        """
+
+        node_id = self.relation_nodes.get(name)
+
+        if node_id is not None:
+            self.deduplicated += 1
+            return node_id
+
+        node = gwf.add_relation_node(name)
+        contour_els_list.append(node)
+
+        node_id = node.attrib['id']
+        self.relation_nodes[name] = node_id
+
+        return node_id
+
+    def get_attribute_node(self, gwf: 'GWF', name: str, contour_els_list: List['etree.SubElement']) -> str:
+        """
+        Gets id of attribute (group) node with given name. Creates it if it doesn't exist yet
+
+        :param gwf: gwf template class
+        :param name: attribute name
+        :param contour_els_list: list to which created elements are added
+        :return: node id
+        """
+
+        node_id = self.attribute_nodes.get(name)
+
+        if node_id is not None:
+            self.deduplicated += 1
+            return node_id
+
+        node = gwf.add_group_node(name)
+        contour_els_list.append(node)
+
+        node_id = node.attrib['id']
+        self.attribute_nodes[name] = node_id
+
+        return node_id
+
+
+def add_relation(gwf: 'GWF', main_node_name: str, relations: Set[Tuple[str, str]],
+                 symbols: Optional[SymbolTable] = None) -> List['etree.SubElement']:
+    """
+    Adds relation between nodes
+
+    :param gwf: gwf template class
+    :param main_node_name: name of node from which relation begins
+    :param relations: given relations
+    :param symbols: nodes which are already created in contour (new table by default)
+    :return: elements created in this function
+    """
+
+    if symbols is None:
+        symbols = SymbolTable()
+
+    contour_els_list = list()
+
+    main_node_id = symbols.get_general_node(gwf, main_node_name, contour_els_list)
+
+    for curr_relation in relations:
+        relation_name, sub_node_name = curr_relation
+
+        sub_node_id = symbols.get_general_node(gwf, sub_node_name, contour_els_list)
+
+        orient_pair = gwf.add_orient_pair(id1=main_node_id, id2=sub_node_id)
+        contour_els_list.append(orient_pair)
+
+        relation_node_id = symbols.get_relation_node(gwf, relation_name, contour_els_list)
+
+        pos_arc = gwf.add_pos_arc(id1=relation_node_id, id2=orient_pair.attrib['id'])
+        contour_els_list.append(pos_arc)
+
+    return contour_els_list
+
+
+def add_attribute(gwf: 'GWF', main_node_name: str, attributes: Set[str],
+                  symbols: Optional[SymbolTable] = None) -> List['etree.SubElement']:
+    """
+    Creates attributes from given nodes
+
+    :param gwf: gwf template class
+    :param main_node_name: name of node from which relation begins
+    :param attributes: give attributes
+    :param symbols: nodes which are already created in contour (new table by default)
+    :return: elements created in this function
+    """
+
+    if symbols is None:
+        symbols = SymbolTable()
+
+    contour_els_list = list()
+
+    main_node_id = symbols.get_general_node(gwf, main_node_name, contour_els_list)
+
+    for curr_attribute_name in attributes:
+        attr_node_id = symbols.get_attribute_node(gwf, curr_attribute_name, contour_els_list)
+
+        arc = gwf.add_pos_arc(id1=attr_node_id, id2=main_node_id)
+        contour_els_list.append(arc)
+
+    return contour_els_list
+
+
+def add_all_relations(gwf: 'GWF', all_relations: Union[List[Tuple[str, Set[Tuple[str, str]]]], SceneGraph],
+                      symbols: Optional[SymbolTable] = None) -> List['etree.SubElement']:
+    """
+    Creates all relations
+
+    :param gwf: gwf template class
+    :param all_relations: all relations (or scene graph)
+    :param symbols: nodes which are already created in contour (new table by default)
+    :return: elements created in this function
+    """
+
+    if symbols is None:
+        symbols = SymbolTable()
+
+    nodes_list = list()
+
+    for curr_relation in get_relation_items(all_relations):
+        node_name = curr_relation[0]
+        sub_relation = curr_relation[1]
+
+        temp_nodes_list = add_relation(gwf, main_node_name=node_name, relations=sub_relation, symbols=symbols)
+        nodes_list.extend(temp_nodes_list)
+
+    return nodes_list
+
+
+def add_all_attributes(gwf: 'GWF', all_attributes: Union[List[Tuple[str, Set[str]]], SceneGraph],
+                       symbols: Optional[SymbolTable] = None):
+    """
+    Creates all attributes
+
+    :param gwf: gwf template object
+    :param all_attributes: all attributes (or scene graph)
+    :param symbols: nodes which are already created in contour (new table by default)
+    :return: elements created in this function
+    """
+
+    if symbols is None:
+        symbols = SymbolTable()
+
+    nodes_list = list()
+
+    for curr_attribute in get_attribute_items(all_attributes):
+        node_name = curr_attribute[0]
+        sub_attribute = curr_attribute[1]
+
+        temp_nodes_list = add_attribute(gwf, main_node_name=node_name, attributes=sub_attribute, symbols=symbols)
+        nodes_list.extend(temp_nodes_list)
+
+    return nodes_list
+
+
+def wrap_in_contour(gwf: 'GWF', all_nodes_in_contour: List['etree.SubElement'],
+                    contour_name) -> 'etree.SubElement':
+    """
+    Creates wrapper around all elements. To make easier access to them in ostis
+
+    :param gwf: gwf template object
+    :param all_nodes_in_contour: all nodes which we need to add in contour
+    :param contour_name: name of contour
+    :return: contour element (etree element)
+    """
+
+    contour = gwf.add_contour(all_nodes_in_contour=all_nodes_in_contour)
+
+    name_node = gwf.add_general_node(contour_name)
+    gwf.add_pos_arc(id1=name_node.attrib['id'], id2=contour.attrib['id'])
+
+    return contour
+
+
+def transform(gwf: 'GWF', all_relations: Union[List[Tuple[str, Set[Tuple[str, str]]]], SceneGraph],
+              all_attributes: Optional[List[Tuple[str, Set[str]]]], name: str,
+              save_path: Union[str, BinaryIO], layout: bool = False, stage_prefix: str = 'gwf'):
+    """
+    Preforms transform on all data.
+
+    :param gwf: gwf template object
+    :param all_relations: all relations from data (or scene graph)
+    :param all_attributes: all attributes from data (can be None if all_relations is scene graph)
+    :param name: name of conour
+    :param save_path: path (or binary file object) to which we want to save them (ignored for StreamingGWF)
+    :param layout: compute node coordinates with force-directed layout (only for GWF)
+    :param stage_prefix: prefix of stats stages and counters ('scs' for StreamingSCs)
+    """
+
+    if isinstance(all_relations, SceneGraph) and all_attributes is None:
+        all_attributes = all_relations
+
+    # elements get parent when they are created, so they aren't collected
+    # (that also lets StreamingGWF write them at once)
+    with stats.stage(f'{stage_prefix}_build'):
+        gwf.begin_contour()
+        symbols = SymbolTable()
+
+        for node_name, relations in get_relation_items(all_relations):
+            add_relation(gwf, main_node_name=node_name, relations=relations, symbols=symbols)
+
+        for node_name, attributes in get_attribute_items(all_attributes):
+            add_attribute(gwf, main_node_name=node_name, attributes=attributes, symbols=symbols)
+
+        contour = wrap_in_contour(gwf, all_nodes_in_contour=list(), contour_name=name)
+
+    if layout:
+        with stats.stage(f'{stage_prefix}_layout'):
+            gwf.apply_layout()
+
+    with stats.stage(f'{stage_prefix}_save'):
+        gwf.save(save_path)
+
+    stats.count(f'{stage_prefix}_elements_emitted', gwf.emitted)
+    stats.count(f'{stage_prefix}_nodes_deduplicated', symbols.deduplicated)
+    stats.count(f'{stage_prefix}_bytes_written', gwf.bytes_written)
+
+    logger.debug('%s: %d elements (%d nodes deduplicated), %d bytes',
+                 name, gwf.emitted, symbols.deduplicated, gwf.bytes_written)
+
+
+def check_target(target: Union[str, BinaryIO], path: Optional[Union[str, BinaryIO]]):
+    """
+    Checks that streaming document is saved into target it was opened with
+
+    :param target: path or file object of streaming document
+    :param path: path or file object passed to save (None is always valid)
+    """
+
+    if path is None or path is target:
+        return
+
+    if isinstance(target, str) and isinstance(path, str) and os.path.abspath(path) == os.path.abspath(target):
+        return
+
+    raise ValueError(f'Document is written into {target!r}, it can\'t be saved into {path!r}')
@@ -8,22 +8,38 @@ Template for .gwf file
 import os
 import json
 import random
-from typing import Tuple, List
+from typing import Tuple, List, Union, Optional, BinaryIO
 
 from lxml import etree
 
+from gwf_graph.id_allocator import SequentialIdAllocator
+from gwf_graph.builder import check_target
+
 
 class GWF:
     """
     Template class. implements simple API for creating .gwf file
     """
 
-    def __init__(self):
+    def __init__(self, id_allocator=None):
+        """
+        :param id_allocator: allocator of element ids (SequentialIdAllocator by default).
+            Allocator with start offset lets merge documents without remapping ids
+        """
+
         self.root = etree.Element('GWF')
         self.root.attrib['version'] = '2.0'
 
         self.static_sector = etree.SubElement(self.root, 'staticSector')
-        self.id_list = set()
+
+        if id_allocator is None:
+            id_allocator = SequentialIdAllocator()
+
+        self.id_allocator = id_allocator
+        self.current_parent = '0'
+
+        self.emitted = 0
+        self.bytes_written = 0
 
     def __str__(self) -> str:
         res = str(etree.tostring(self.root, pretty_print=False))
@@ -37,13 +53,32 @@ class GWF:
         :return: new unique id
         """
 
-        id = random.randint(0, 10**5)
-
-        while id in self.id_list:
-            id = random.randint(0, 10 ** 5)
+        id = self.id_allocator.allocate()
 
         return id
 
+    def __create_element__(self, tag: str) -> etree.SubElement:
+        """
+        Creates new element of static sector
+
+        :param tag: element tag
+        :return: etree element
+        """
+
+        element = etree.SubElement(self.static_sector, tag)
+
+        return element
+
+    def __emit__(self, element: etree.SubElement):
+        """
+        Called when element is fully created. Elements are already
+        in the tree, so only counter is changed here (used by StreamingGWF)
+
+        :param element: created element
+        """
+
+        self.emitted += 1
+
     @staticmethod
     def __get_random_coord__() -> Tuple[str, str]:
         """
@@ -70,12 +105,12 @@ class GWF:
         :return: etree element
         """
 
-        node = etree.SubElement(self.static_sector, 'node')
+        node = self.__create_element__('node')
 
         node.attrib['type'] = node_type
         node.attrib['idtf'] = name
         node.attrib['id'] = str(self.__get_unique_id__())
-        node.attrib['parent'] = '0'
+        node.attrib['parent'] = self.current_parent
 
         x, y = self.__get_random_coord__()  # TODO: think about better way to get coordinates
         node.attrib['x'] = str(x)
@@ -86,6 +121,8 @@ class GWF:
         content.attrib['content_visibility'] = 'false'
         content.attrib['mime_type'] = ''
 
+        self.__emit__(node)
+
         return node
 
     def __add_arc__(self, id1: str, id2: str, arc_type: str = 'arc/const/pos') -> etree.SubElement:
@@ -98,12 +135,12 @@ class GWF:
         :return: etree element
         """
 
-        arc = etree.SubElement(self.static_sector, 'arc')
+        arc = self.__create_element__('arc')
 
         arc.attrib['type'] = arc_type
         arc.attrib['idtf'] = ''
         arc.attrib['id'] = str(self.__get_unique_id__())
-        arc.attrib['parent'] = '0'
+        arc.attrib['parent'] = self.current_parent
 
         arc.attrib['id_b'] = str(id1)
         arc.attrib['id_e'] = str(id2)
@@ -113,36 +150,59 @@ class GWF:
 
         content = etree.SubElement(arc, 'points')
 
+        self.__emit__(arc)
+
         return arc
 
     def __add_contour__(self, all_els_in_contour: List[etree.SubElement]):
         """
         Creates contour around elements given in all_nodes_in_contour
+        and elements added after begin_contour
 
         :param all_els_in_contour: elements around which we need contout
         :return:
         """
 
-        contour = etree.SubElement(self.static_sector, 'contour')
+        if self.current_parent == '0':
+            contour_id = str(self.__get_unique_id__())
+        else:
+            contour_id = self.current_parent
+            self.current_parent = '0'
+
+        contour = self.__create_element__('contour')
 
         contour.attrib['type'] = ''
         contour.attrib['idtf'] = ''
-        contour.attrib['id'] = str(self.__get_unique_id__())
+        contour.attrib['id'] = contour_id
         contour.attrib['parent'] = '0'
 
         content = etree.SubElement(contour, 'points')
-        print(dict(zip(('x', 'y'), self.__get_random_coord__())))
         point1 = etree.SubElement(content, 'point', attrib=dict(zip(('x', 'y'), self.__get_random_coord__())))
         point2 = etree.SubElement(content, 'point', attrib=dict(zip(('x', 'y'), self.__get_random_coord__())))
         point3 = etree.SubElement(content, 'point', attrib=dict(zip(('x', 'y'), self.__get_random_coord__())))
 
         for node in all_els_in_contour:
-            # print(contour)
-            print(node)
             node.attrib['parent'] = contour.attrib['id']
 
+        self.__emit__(contour)
+
         return contour
 
+    def begin_contour(self) -> str:
+        """
+        Creates id for next contour. All elements added before
+        add_contour call are placed into this contour
+
+        :return: contour id
+        """
+
+        if self.current_parent != '0':
+            raise ValueError(f'Contour {self.current_parent} is not closed yet')
+
+        self.current_parent = str(self.__get_unique_id__())
+
+        return self.current_parent
+
     def add_group_node(self, name: str) -> etree.SubElement:
         """
         Adds group node
@@ -229,17 +289,239 @@ class GWF:
 
         return contour
 
-    def save(self, path: str):
+    def apply_layout(self, iterations: int = 50, edge_length: float = 100.0,
+                     repulsion: str = 'auto', seed: Optional[int] = 0, margin: int = 50):
+        """
+        Computes coordinates of all nodes from arcs with force-directed layout.
+        Arcs which end in other arcs are connected to begin node of that arc.
+        Contour points are set to bounding box of nodes in contour
+
+        :param iterations: number of layout iterations
+        :param edge_length: ideal edge length
+        :param repulsion: 'exact', 'grid' or 'auto' (see graph_creation.layout)
+        :param seed: seed for initial positions
+        :param margin: padding around nodes (and contours)
+        """
+
+        from graph_creation.layout import force_directed_layout
+
+        nodes = self.static_sector.findall('node')
+        node_indices = {node.attrib['id']: idx for idx, node in enumerate(nodes)}
+
+        arc_begins = {arc.attrib['id']: arc.attrib['id_b'] for arc in self.static_sector.findall('arc')}
+
+        def get_node_index(element_id: str) -> Optional[int]:
+            for _ in range(len(arc_begins) + 1):
+                if element_id in node_indices:
+                    return node_indices[element_id]
+
+                element_id = arc_begins.get(element_id)
+
+                if element_id is None:
+                    return None
+
+            return None
+
+        edges = list()
+
+        for arc in self.static_sector.findall('arc'):
+            begin = get_node_index(arc.attrib['id_b'])
+            end = get_node_index(arc.attrib['id_e'])
+
+            if begin is not None and end is not None:
+                edges.append((begin, end))
+
+        positions = force_directed_layout(edges, n_nodes=len(nodes), iterations=iterations,
+                                          edge_length=edge_length, repulsion=repulsion, seed=seed)
+        positions = positions.round().astype(int) + margin
+
+        contour_positions = dict()
+
+        for node, (x, y) in zip(nodes, positions.tolist()):
+            node.attrib['x'] = str(x)
+            node.attrib['y'] = str(y)
+
+            contour_positions.setdefault(node.attrib['parent'], list()).append((x, y))
+
+        for contour in self.static_sector.findall('contour'):
+            node_positions = contour_positions.get(contour.attrib['id'])
+
+            if not node_positions:
+                continue
+
+            xs, ys = zip(*node_positions)
+            x_min, x_max = min(xs) - margin, max(xs) + margin
+            y_min, y_max = min(ys) - margin, max(ys) + margin
+
+            points = contour.find('points')
+
+            for point in list(points):
+                points.remove(point)
+
+            for x, y in ((x_min, y_min), (x_max, y_min), (x_max, y_max), (x_min, y_max)):
+                etree.SubElement(points, 'point', attrib={'x': str(x), 'y': str(y)})
+
+    def save(self, path: Union[str, BinaryIO]):
         """
         Saves .gwf file in give path
 
-        :param path: path for saving
+        :param path: path for saving or binary file object
         """
 
         res = etree.tostring(self.root, pretty_print=True)
 
-        with open(path, mode='wb') as file:
-            file.write(res)
+        if isinstance(path, str):
+            with open(path, mode='wb') as file:
+                file.write(res)
+        else:
+            path.write(res)
+
+        self.bytes_written = len(res)
+
+
+class StreamingGWF(GWF):
+    """
+    Template class which writes every element into file as soon as it is created.
+    Output is the same as GWF.save result, but memory doesn't grow with document size.
+
+    Elements can't be changed after creation, so contours should be opened
+    with begin_contour before their elements are added.
+    """
+
+    indent = b'    '
+
+    header = b'<GWF version="2.0">\n  <staticSector>\n'
+    footer = b'  </staticSector>\n</GWF>\n'
+    empty_document = b'<GWF version="2.0">\n  <staticSector/>\n</GWF>\n'
+
+    def __init__(self, target: Union[str, BinaryIO], id_allocator=None):
+        """
+        :param target: path to .gwf file or binary file object
+        :param id_allocator: allocator of element ids (SequentialIdAllocator by default)
+        """
+
+        super().__init__(id_allocator=id_allocator)
+
+        self.root = None
+        self.static_sector = None
+
+        self.target = target
+
+        if isinstance(target, str):
+            self.file = open(target, mode='wb')
+            self.is_own_file = True
+        else:
+            self.file = target
+            self.is_own_file = False
+
+        self.is_empty = True
+        self.is_closed = False
+
+    def __str__(self) -> str:
+        res = f'StreamingGWF({self.file!r})'
+
+        return res
+
+    def __enter__(self) -> 'StreamingGWF':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __create_element__(self, tag: str) -> etree.SubElement:
+        """
+        Creates new element, which isn't attached to any tree
+
+        :param tag: element tag
+        :return: etree element
+        """
+
+        element = etree.Element(tag)
+
+        return element
+
+    def __emit__(self, element: etree.SubElement):
+        """
+        Writes element into file
+
+        :param element: created element
+        """
+
+        super().__emit__(element)
+
+        if self.is_empty:
+            self.__write__(self.header)
+            self.is_empty = False
+
+        lines = etree.tostring(element, pretty_print=True).splitlines(keepends=True)
+        self.__write__(b''.join(self.indent + line for line in lines))
+
+    def __write__(self, data: bytes):
+        """
+        Writes data into file
+
+        :param data: bytes to write
+        """
+
+        self.file.write(data)
+        self.bytes_written += len(data)
+
+    def __add_contour__(self, all_els_in_contour: List[etree.SubElement]):
+        """
+        Creates contour around elements added after begin_contour
+
+        :param all_els_in_contour: elements around which we need contout (should be already in contour)
+        :return:
+        """
+
+        contour_id = self.current_parent
+
+        for element in all_els_in_contour:
+            if contour_id == '0' or element.attrib['parent'] != contour_id:
+                raise ValueError('Element is already written, use begin_contour before adding it')
+
+        contour = super().__add_contour__(all_els_in_contour=list())
+
+        return contour
+
+    def close(self):
+        """
+        Finishes document and closes file (if it was opened by this object)
+        """
+
+        if self.is_closed:
+            return
+
+        if self.is_empty:
+            self.__write__(self.empty_document)
+        else:
+            self.__write__(self.footer)
+
+        if self.is_own_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+        self.is_closed = True
+
+    def apply_layout(self, *args, **kwargs):
+        """
+        Layout needs all elements, but they are already written. Use GWF instead
+        """
+
+        raise TypeError('StreamingGWF elements are already written, use GWF for layout')
+
+    def save(self, path: Optional[Union[str, BinaryIO]] = None):
+        """
+        Finishes document. Elements are already written into target,
+        so path can only be the same target (for compatibility with GWF.save)
+
+        :param path: target of this object (None to finish document)
+        """
+
+        check_target(self.target, path)
+
+        self.close()
 
 
 if __name__ == '__main__':
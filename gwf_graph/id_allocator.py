@@ -0,0 +1,94 @@
+"""
+Allocators of unique ids for .gwf elements
+
+Every allocator gives new id in O(1) and has no upper limit.
+Id 0 is reserved in .gwf (parent="0" means no parent), so ids start from 1.
+
+@by Vadbeg
+"""
+
+
+import random
+
+
+class SequentialIdAllocator:
+    """
+    Gives ids one by one: start, start + 1, start + 2, ...
+    """
+
+    def __init__(self, start: int = 1):
+        """
+        :param start: first id (use end of other document's allocator to merge documents)
+        """
+
+        self.start = start
+        self.end = start
+
+    def allocate(self) -> int:
+        """
+        Creates new unique id
+
+        :return: new id
+        """
+
+        idx = self.end
+        self.end += 1
+
+        return idx
+
+
+class SeededIdAllocator:
+    """
+    Gives deterministic pseudo random ids. Ids are split into blocks
+    of block_size, and ids inside block are shuffled by affine
+    permutation (a * i + b) mod block_size, so they never collide.
+    """
+
+    def __init__(self, seed: int = 0, start: int = 1, block_size: int = 2 ** 16):
+        """
+        :param seed: seed for random
+        :param start: first id in first block
+        :param block_size: size of block (power of two)
+        """
+
+        if block_size < 1 or block_size & (block_size - 1):
+            raise ValueError(f'block_size should be power of two, got {block_size}')
+
+        self.start = start
+        self.block_size = block_size
+
+        self.__random = random.Random(seed)
+        self.__count = 0
+        self.__multiplier = 1
+        self.__shift = 0
+
+    @property
+    def end(self) -> int:
+        """
+        Upper bound of allocated ids (end of last used block)
+        """
+
+        blocks = -(-self.__count // self.block_size)
+
+        return self.start + blocks * self.block_size
+
+    def allocate(self) -> int:
+        """
+        Creates new unique id
+
+        :return: new id
+        """
+
+        block, position = divmod(self.__count, self.block_size)
+
+        if position == 0:
+            # odd multiplier makes permutation for power of two block_size
+            self.__multiplier = self.__random.randrange(1, self.block_size, 2) if self.block_size > 1 else 1
+            self.__shift = self.__random.randrange(self.block_size)
+
+        self.__count += 1
+
+        offset = (self.__multiplier * position + self.__shift) % self.block_size
+        idx = self.start + block * self.block_size + offset
+
+        return idx
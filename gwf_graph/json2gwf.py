@@ -5,229 +5,130 @@ Main converter module
 """
 
 import os
-from typing import Tuple, Dict, Set, List, Optional
+from typing import Tuple, Dict, Set, List, Optional, Union, BinaryIO
 
-import json
+from graph_creation.structure import create_graph_structure, create_graph_structure_attributes
+from graph_creation.reader import iter_images, is_json_array, get_image_filename
+from graph_creation.scene_graph import SceneGraph
+from graph_creation.cache import OutputCache, get_cache, get_key
+from graph_creation.instrumentation import logger, stats
 
-from lxml import etree
+from gwf_graph.gwf_template import GWF, StreamingGWF
+from gwf_graph.builder import transform
 
-from pyvis_graph.GraphCreation import create_graph_structure, create_graph_structure_attributes
 
-from gwf_graph.gwf_template import GWF
-
-
-def add_class_to_general_node(gwf: GWF, general_node: etree.SubElement) -> List[etree.SubElement]:
-    """
-    Adds class to general node (every general node need some kind of class)
-
-    :param gwf: gwf template class
-    :param general_node: general node
-    :return: elements created in this function
-    """
-
-    class_node = gwf.add_group_node(name='concept_' + general_node.attrib['idtf'])
-    # class_node = gwf.add_group_node(name='')
-
-    pos_arc = gwf.add_pos_arc(id1=class_node.attrib['id'], id2=general_node.attrib['id'])
-
-    contour_els_list = [class_node, pos_arc]
-
-    return contour_els_list
-
-
-def add_relation(gwf: GWF, main_node_name: str, relations: Set[Tuple[str, str]]) -> List[etree.SubElement]:
-    """
-    Adds relation between nodes
-
-    :param gwf: gwf template class
-    :param main_node_name: name of node from which relation begins
-    :param relations: given relations
-    :return: elements created in this function
-    """
-
-    contour_els_list = list()
-
-    main_node = gwf.add_general_node(main_node_name)
-    class_contour_els = add_class_to_general_node(gwf=gwf, general_node=main_node)
-
-    contour_els_list.append(main_node)
-    contour_els_list.extend(class_contour_els)
-
-    for curr_relation in relations:
-        relation_name, sub_node_name = curr_relation
-
-        sub_node = gwf.add_general_node(sub_node_name)
-        class_contour_els_sub = add_class_to_general_node(gwf=gwf, general_node=sub_node)
-
-        contour_els_list.append(sub_node)
-        contour_els_list.extend(class_contour_els_sub)
-
-        orient_pair = gwf.add_orient_pair(id1=main_node.attrib['id'], id2=sub_node.attrib['id'])
-        contour_els_list.append(orient_pair)
-
-        relation_node = gwf.add_relation_node(relation_name)
-        contour_els_list.append(relation_node)
-
-        pos_arc = gwf.add_pos_arc(id1=relation_node.attrib['id'], id2=orient_pair.attrib['id'])
-        contour_els_list.append(pos_arc)
-
-    return contour_els_list
-
-
-def add_attribute(gwf: GWF, main_node_name: str, attributes: Set[str]) -> List[etree.SubElement]:
+def convert_image(relationships: Dict, attributes: Dict, save_path: str, name: str, layout: bool = False,
+                  cache: Optional[OutputCache] = None):
     """
-    Creates attributes from given nodes
+    Transforms one image into .gwf file
 
-    :param gwf: gwf template class
-    :param main_node_name: name of node from which relation begins
-    :param attributes: give attributes
-    :return: elements created in this function
+    :param relationships: raw dict of relationships for image
+    :param attributes: raw dict of attributes for image
+    :param save_path: path to which we want to save .gwf file
+    :param name: name of contour
+    :param layout: compute node coordinates with force-directed layout
+        (document is built in memory, otherwise it is streamed into file)
+    :param cache: cache of result files (image isn't rebuilt if it is in cache)
     """
 
-    contour_els_list = list()
+    if cache is not None:
+        key = get_key(relationships, attributes, settings={'format': 'gwf', 'name': name, 'layout': layout})
 
-    main_node = gwf.add_general_node(main_node_name)
-    class_contour_els = add_class_to_general_node(gwf=gwf, general_node=main_node)
+        if cache.get(key, extension='.gwf', res_file=save_path):
+            stats.count('gwf_cache_hits')
+            return
 
-    contour_els_list.append(main_node)
-    contour_els_list.extend(class_contour_els)
+    build_gwf(relationships, attributes, save_path=save_path, name=name, layout=layout)
 
-    for curr_attribute_name in attributes:
-        attr_node = gwf.add_group_node(curr_attribute_name)
+    if cache is not None:
+        cache.put(key, extension='.gwf', res_file=save_path)
 
-        contour_els_list.append(attr_node)
 
-        arc = gwf.add_pos_arc(id1=attr_node.attrib['id'], id2=main_node.attrib['id'])
-        contour_els_list.append(arc)
-
-    return contour_els_list
-
-
-def add_all_relations(gwf: GWF, all_relations: List[Tuple[str, Set[Tuple[str, str]]]]) -> List[etree.SubElement]:
+def build_gwf(relationships: Dict, attributes: Dict, save_path: Union[str, BinaryIO], name: str,
+              layout: bool = False):
     """
-    Creates all relations
+    Builds .gwf file for one image
 
-    :param gwf: gwf template class
-    :param all_relations: all relations
-    :return: elements created in this function
+    :param relationships: raw dict of relationships for image
+    :param attributes: raw dict of attributes for image
+    :param save_path: path (or binary file object) to which we want to save .gwf file
+    :param name: name of contour
+    :param layout: compute node coordinates with force-directed layout
     """
 
-    nodes_list = list()
-
-    for curr_relation in all_relations:
-        node_name = curr_relation[0]
-        sub_relation = curr_relation[1]
-
-        temp_nodes_list = add_relation(gwf, main_node_name=node_name, relations=sub_relation)
-        nodes_list.extend(temp_nodes_list)
-
-    return nodes_list
-
-
-def add_all_attributes(gwf: GWF, all_attributes: List[Tuple[str, Set[str]]]):
-    """
-    Creates all attributes
-
-    :param gwf: gwf template object
-    :param all_attributes: all attributes
-    :return: elements created in this function
-    """
-
-    nodes_list = list()
+    res_rel = create_graph_structure(relationships)
+    res_attr = create_graph_structure_attributes(attributes)
 
-    for curr_attribute in all_attributes:
-        node_name = curr_attribute[0]
-        sub_attribute = curr_attribute[1]
+    res_rel = list(res_rel.items())
+    res_attr = list(res_attr.items())
 
-        temp_nodes_list = add_attribute(gwf, main_node_name=node_name, attributes=sub_attribute)
-        nodes_list.extend(temp_nodes_list)
+    logger.debug('%s: %d subjects with relations, %d subjects with attributes', name, len(res_rel), len(res_attr))
 
-    return nodes_list
+    write_gwf(res_rel, res_attr, save_path=save_path, name=name, layout=layout)
 
 
-def wrap_in_contour(gwf: GWF, all_nodes_in_contour: List[etree.SubElement], contour_name) -> etree.SubElement:
+def write_gwf(all_relations: Union[List[Tuple[str, Set[Tuple[str, str]]]], SceneGraph],
+              all_attributes: Optional[List[Tuple[str, Set[str]]]], save_path: Union[str, BinaryIO],
+              name: str, layout: bool = False):
     """
-    Creates wrapper around all elements. To make easier access to them in ostis
+    Writes processed relationships and attributes (or scene graph) into .gwf file
 
-    :param gwf: gwf template object
-    :param all_nodes_in_contour: all nodes which we need to add in contour
-    :param contour_name: name of contour
-    :return: contour element (etree element)
+    :param all_relations: all relations from data (or scene graph)
+    :param all_attributes: all attributes from data (can be None if all_relations is scene graph)
+    :param save_path: path (or binary file object) to which we want to save .gwf file
+    :param name: name of contour
+    :param layout: compute node coordinates with force-directed layout
+        (document is built in memory, otherwise it is streamed into file)
     """
 
-    contour = gwf.add_contour(all_nodes_in_contour=all_nodes_in_contour)
-
-    name_node = gwf.add_general_node(contour_name)
-    gwf.add_pos_arc(id1=name_node.attrib['id'], id2=contour.attrib['id'])
+    if layout:
+        transform(GWF(), all_relations=all_relations, all_attributes=all_attributes,
+                  save_path=save_path, name=name, layout=True)
+        return
 
-    return contour
+    with StreamingGWF(save_path) as gwf:
+        transform(gwf, all_relations=all_relations, all_attributes=all_attributes,
+                  save_path=save_path, name=name)
 
 
-def transform(gwf: GWF, all_relations: List[Tuple[str, Set[Tuple[str, str]]]],
-              all_attributes: List[Tuple[str, Set[str]]], name: str,
-              save_path: str):
-    """
-    Preforms transform on all data.
-
-    :param gwf: gwf template object
-    :param all_relations: all relations from data
-    :param all_attributes: all attributes from data
-    :param name: name of conour
-    :param save_path: path to which we want to save them
-    """
-
-    nodes = list()
-
-    nodes_list_relations = add_all_relations(gwf, all_relations=all_relations)
-    nodes_list_attributes = add_all_attributes(gwf, all_attributes=all_attributes)
-
-    nodes.extend(nodes_list_relations)
-    nodes.extend(nodes_list_attributes)
-
-    contour = wrap_in_contour(gwf, all_nodes_in_contour=nodes, contour_name=name)
-
-    gwf.save(save_path)
-
-
-def main(relationships_file: str, attributes_file: str, res_file: str):
+def main(relationships_file: str, attributes_file: str, res_file: str, cache_dir: Optional[str] = None):
     """
     Main method. Preforms transformation.
 
+    Files can hold one image or be full VG dumps. For dumps
+    one .gwf file is created for every image (res_<image_id>.gwf).
+
     :param relationships_file: name of file with relations
     :param attributes_file: name of file with attributes
     :param res_file: file for res .gwf file
+    :param cache_dir: directory of result files cache (None to disable cache)
     """
 
+    cache = get_cache(cache_dir)
+
     directory = '../data'
-    print(os.listdir(directory))
+    logger.debug('data directory: %s', os.path.abspath(directory))
 
     filepath_relationship = os.path.join(directory, relationships_file)
     filepath_attributes = os.path.join(directory, attributes_file)
 
-    with open(filepath_relationship, 'rb') as file:
-        relationships = json.load(file)
-
-    with open(filepath_attributes, 'rb') as file:
-        attributes = json.load(file)
-
-    image_url = attributes['image_url']
-
-    res_rel = create_graph_structure(relationships)
-    res_attr = create_graph_structure_attributes(attributes)
-
-    res_rel = list(res_rel.items())
-    res_attr = list(res_attr.items())
+    if not os.path.exists('gwf_examples'):
+        os.makedirs('gwf_examples')
 
-    print(res_rel)
-    print(res_attr)
+    is_dump = is_json_array(filepath_relationship)
 
-    gwf = GWF()
+    for relationships, attributes in iter_images(filepath_relationship, filepath_attributes):
+        if is_dump:
+            image_id = relationships['image_id']
 
-    if not os.path.exists('gwf_examples'):
-        os.makedirs('gwf_examples')
+            curr_res_file = get_image_filename(res_file, image_id=image_id)
+            name = f'image_{image_id}'
+        else:
+            curr_res_file = res_file
+            name = 'first_image'
 
-    transform(gwf, all_relations=res_rel, all_attributes=res_attr,
-              save_path=os.path.join('gwf_examples', res_file), name='first_image')
+        convert_image(relationships, attributes,
+                      save_path=os.path.join('gwf_examples', curr_res_file), name=name, cache=cache)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,78 @@
+"""
+Converter into .scs files (SCs text)
+
+The same elements as in .gwf files (see json2gwf) are written
+with StreamingSCs, without coordinates and xml markup.
+
+@by Vadbeg
+"""
+
+from typing import Tuple, Dict, Set, List, Optional, Union, BinaryIO
+
+from graph_creation.structure import create_graph_structure, create_graph_structure_attributes
+from graph_creation.scene_graph import SceneGraph
+from graph_creation.cache import OutputCache, get_key
+from graph_creation.instrumentation import logger, stats
+
+from gwf_graph.builder import transform
+from gwf_graph.scs_template import StreamingSCs
+
+
+def write_scs(all_relations: Union[List[Tuple[str, Set[Tuple[str, str]]]], SceneGraph],
+              all_attributes: Optional[List[Tuple[str, Set[str]]]], save_path: Union[str, BinaryIO],
+              name: str):
+    """
+    Writes processed relationships and attributes (or scene graph) into .scs file
+
+    :param all_relations: all relations from data (or scene graph)
+    :param all_attributes: all attributes from data (can be None if all_relations is scene graph)
+    :param save_path: path (or binary file object) to which we want to save .scs file
+    :param name: name of contour
+    """
+
+    with StreamingSCs(save_path) as scs:
+        transform(scs, all_relations=all_relations, all_attributes=all_attributes,
+                  save_path=save_path, name=name, stage_prefix='scs')
+
+
+def build_scs(relationships: Dict, attributes: Dict, save_path: Union[str, BinaryIO], name: str):
+    """
+    Builds .scs file for one image
+
+    :param relationships: raw dict of relationships for image
+    :param attributes: raw dict of attributes for image
+    :param save_path: path (or binary file object) to which we want to save .scs file
+    :param name: name of contour
+    """
+
+    res_rel = list(create_graph_structure(relationships).items())
+    res_attr = list(create_graph_structure_attributes(attributes).items())
+
+    logger.debug('%s: %d subjects with relations, %d subjects with attributes', name, len(res_rel), len(res_attr))
+
+    write_scs(res_rel, res_attr, save_path=save_path, name=name)
+
+
+def convert_image(relationships: Dict, attributes: Dict, save_path: str, name: str,
+                  cache: Optional[OutputCache] = None):
+    """
+    Transforms one image into .scs file
+
+    :param relationships: raw dict of relationships for image
+    :param attributes: raw dict of attributes for image
+    :param save_path: path to which we want to save .scs file
+    :param name: name of contour
+    :param cache: cache of result files (image isn't rebuilt if it is in cache)
+    """
+
+    if cache is not None:
+        key = get_key(relationships, attributes, settings={'format': 'scs', 'name': name})
+
+        if cache.get(key, extension='.scs', res_file=save_path):
+            stats.count('scs_cache_hits')
+            return
+
+    build_scs(relationships, attributes, save_path=save_path, name=name)
+
+    if cache is not None:
+        cache.put(key, extension='.scs', res_file=save_path)
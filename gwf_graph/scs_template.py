@@ -0,0 +1,390 @@
+"""
+Template for .scs file (SCs text, OSTIS source code)
+
+StreamingSCs has the same API as GWF, so the same converter
+(see builder.transform) writes .scs files. Elements are written
+into file as soon as they are created, contours are written as
+structures ([* ... *]) and there are no coordinates.
+
+Nodes with names, which are valid system identifiers, are written
+by name (like GWF idtf), other nodes get local identifier and main
+identifier with their name. Arcs get local identifiers, so they can
+be ends of other arcs.
+
+@by Vadbeg
+"""
+
+
+import re
+from typing import Dict, List, Optional, Union, BinaryIO
+
+from gwf_graph.id_allocator import SequentialIdAllocator
+from gwf_graph.builder import check_target
+
+
+SYSTEM_IDTF_PATTERN = re.compile(r'[a-zA-Z0-9_]+')
+
+# .gwf types of elements and their SCs keywords (or connectors)
+NODE_TYPES = {'node/const/general_node': 'sc_node',
+              'node/const/group': 'sc_node_class',
+              'node/const/relation': 'sc_node_norole_relation',
+              'node/const/attribute': 'sc_node_role_relation'}
+
+ARC_TYPES = {'arc/const/pos': '->',
+             'pair/const/orient': '=>',
+             'pair/const/noorient': '<=>'}
+
+
+class SCsElement:
+    """
+    Created element. Has only attributes (like attrib of .gwf element),
+    because it is already written
+    """
+
+    __slots__ = ('attrib',)
+
+    def __init__(self, attrib: Dict[str, str]):
+        """
+        :param attrib: attributes of element (id, idtf, type, parent)
+        """
+
+        self.attrib = attrib
+
+    def __repr__(self) -> str:
+        res = f'SCsElement({self.attrib!r})'
+
+        return res
+
+
+def escape_content(text: str) -> str:
+    """
+    Escapes text of link content ([...])
+
+    :param text: text
+    :return: escaped text
+    """
+
+    res = text.replace('\\', '\\\\').replace('[', '\\[').replace(']', '\\]')
+
+    return res
+
+
+class StreamingSCs:
+    """
+    Template class which writes every element into .scs file as soon as it is created.
+    Memory doesn't grow with number of written documents, only identifiers of
+    nodes of current document are kept.
+
+    Elements can't be changed after creation, so contours should be opened
+    with begin_contour before their elements are added.
+    """
+
+    indent = '    '
+    buffer_size = 2 ** 16
+
+    def __init__(self, target: Union[str, BinaryIO], id_allocator=None):
+        """
+        :param target: path to .scs file or binary file object
+        :param id_allocator: allocator of element ids (SequentialIdAllocator by default)
+        """
+
+        self.target = target
+
+        if isinstance(target, str):
+            self.file = open(target, mode='wb')
+            self.is_own_file = True
+        else:
+            self.file = target
+            self.is_own_file = False
+
+        if id_allocator is None:
+            id_allocator = SequentialIdAllocator()
+
+        self.id_allocator = id_allocator
+        self.current_parent = '0'
+
+        # SCs identifiers of nodes, which are written by name
+        self.identifiers = dict()
+
+        self.lines = list()
+        self.buffered = 0
+
+        self.emitted = 0
+        self.bytes_written = 0
+
+        self.is_closed = False
+
+    def __str__(self) -> str:
+        res = f'StreamingSCs({self.file!r})'
+
+        return res
+
+    def __enter__(self) -> 'StreamingSCs':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __get_unique_id__(self) -> str:
+        """
+        Creates unique ID for every element
+
+        :return: new unique id
+        """
+
+        idx = str(self.id_allocator.allocate())
+
+        return idx
+
+    def __get_identifier__(self, element_id: str) -> str:
+        """
+        Gets SCs identifier of element
+
+        :param element_id: id of element
+        :return: system identifier (for nodes written by name) or local identifier
+        """
+
+        res = self.identifiers.get(element_id)
+
+        if res is None:
+            res = f'..e{element_id}'
+
+        return res
+
+    def __write__(self, line: str):
+        """
+        Writes sentence (in current contour) into buffer
+
+        :param line: sentence
+        """
+
+        if self.current_parent != '0':
+            line = self.indent + line
+
+        self.lines.append(line)
+        self.buffered += len(line)
+
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes buffered sentences into file
+        """
+
+        if not self.lines:
+            return
+
+        data = ''.join(self.lines).encode('utf-8')
+
+        self.file.write(data)
+        self.bytes_written += len(data)
+
+        self.lines = list()
+        self.buffered = 0
+
+    def __add_node__(self, name: str, node_type: str = 'node/const/general_node') -> SCsElement:
+        """
+        Adds node to .scs file
+
+        :param name: node name
+        :param node_type: node type (.gwf type)
+        :return: created element
+        """
+
+        node_id = self.__get_unique_id__()
+        keyword = NODE_TYPES[node_type]
+
+        if SYSTEM_IDTF_PATTERN.fullmatch(name):
+            self.identifiers[node_id] = name
+            self.__write__(f'{keyword} -> {name};;\n')
+        else:
+            self.__write__(f'{keyword} -> ..e{node_id};;\n')
+
+            if name:
+                self.__write__(f'..e{node_id} => nrel_main_idtf: [{escape_content(name)}];;\n')
+
+        self.emitted += 1
+
+        node = SCsElement({'type': node_type, 'idtf': name, 'id': node_id, 'parent': self.current_parent})
+
+        return node
+
+    def __add_arc__(self, id1: str, id2: str, arc_type: str = 'arc/const/pos') -> SCsElement:
+        """
+        Adds arc to .scs file
+
+        :param id1: id of first element (from it arc begins)
+        :param id2: id of second element (on it arc ends)
+        :param arc_type: arc type (.gwf type)
+        :return: created element
+        """
+
+        arc_id = self.__get_unique_id__()
+        connector = ARC_TYPES[arc_type]
+
+        self.__write__(f'..e{arc_id} = ({self.__get_identifier__(str(id1))} {connector} '
+                       f'{self.__get_identifier__(str(id2))});;\n')
+
+        self.emitted += 1
+
+        arc = SCsElement({'type': arc_type, 'idtf': '', 'id': arc_id, 'parent': self.current_parent,
+                          'id_b': str(id1), 'id_e': str(id2)})
+
+        return arc
+
+    def begin_contour(self) -> str:
+        """
+        Creates id for next contour and opens structure. All elements
+        added before add_contour call are placed into this contour
+
+        :return: contour id
+        """
+
+        if self.current_parent != '0':
+            raise ValueError(f'Contour {self.current_parent} is not closed yet')
+
+        contour_id = self.__get_unique_id__()
+
+        self.__write__(f'..e{contour_id} = [*\n')
+        self.current_parent = contour_id
+
+        return contour_id
+
+    def add_group_node(self, name: str) -> SCsElement:
+        """
+        Adds group node
+
+        :param name: node name
+        :return: created element
+        """
+
+        node = self.__add_node__(name=name, node_type='node/const/group')
+
+        return node
+
+    def add_general_node(self, name: str) -> SCsElement:
+        """
+        Adds general node
+
+        :param name: node name
+        :return: created element
+        """
+
+        node = self.__add_node__(name=name, node_type='node/const/general_node')
+
+        return node
+
+    def add_relation_node(self, name: str) -> SCsElement:
+        """
+        Adds relation node
+
+        :param name: node name
+        :return: created element
+        """
+
+        node = self.__add_node__(name=name, node_type='node/const/relation')
+
+        return node
+
+    def add_role_node(self, name: str) -> SCsElement:
+        """
+        Adds role node
+
+        :param name: node name
+        :return: created element
+        """
+
+        node = self.__add_node__(name=name, node_type='node/const/attribute')
+
+        return node
+
+    def add_pos_arc(self, id1: str, id2: str) -> SCsElement:
+        """
+        Adds pos arc
+
+        :param id1: id of beginning element
+        :param id2: id of ending element
+        :return: created element
+        """
+
+        arc = self.__add_arc__(id1=id1, id2=id2, arc_type='arc/const/pos')
+
+        return arc
+
+    def add_orient_pair(self, id1: str, id2: str) -> SCsElement:
+        """
+        Adds orient pair
+
+        :param id1: id of beginning element
+        :param id2: id of ending element
+        :return: created element
+        """
+
+        arc = self.__add_arc__(id1=id1, id2=id2, arc_type='pair/const/orient')
+
+        return arc
+
+    def add_contour(self, all_nodes_in_contour: List[SCsElement]) -> SCsElement:
+        """
+        Closes structure opened by begin_contour (or writes empty one)
+
+        :param all_nodes_in_contour: elements of contour (should be already in contour)
+        :return: created element
+        """
+
+        contour_id = self.current_parent
+
+        for element in all_nodes_in_contour:
+            if contour_id == '0' or element.attrib['parent'] != contour_id:
+                raise ValueError('Element is already written, use begin_contour before adding it')
+
+        if contour_id == '0':
+            contour_id = self.__get_unique_id__()
+            self.__write__(f'..e{contour_id} = [* *];;\n')
+        else:
+            self.current_parent = '0'
+            self.__write__('*];;\n')
+
+        self.emitted += 1
+
+        contour = SCsElement({'type': '', 'idtf': '', 'id': contour_id, 'parent': '0'})
+
+        return contour
+
+    def apply_layout(self, *args, **kwargs):
+        """
+        .scs files don't have coordinates
+        """
+
+        raise TypeError('.scs files have no coordinates, use GWF for layout')
+
+    def close(self):
+        """
+        Finishes document and closes file (if it was opened by this object)
+        """
+
+        if self.is_closed:
+            return
+
+        self.flush()
+
+        if self.is_own_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+        self.identifiers = dict()
+        self.is_closed = True
+
+    def save(self, path: Optional[Union[str, BinaryIO]] = None):
+        """
+        Finishes document. Elements are already written into target,
+        so path can only be the same target (for compatibility with GWF.save)
+
+        :param path: target of this object (None to finish document)
+        """
+
+        check_target(self.target, path)
+
+        self.close()
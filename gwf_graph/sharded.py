@@ -0,0 +1,490 @@
+"""
+Parallel construction of one .gwf document for many images
+
+Images are split into shards, every shard is built on worker process
+into fragment (elements of .gwf without document header and footer,
+every image in its own contour, ids from 1). Fragments are merged in
+order of shards: ids are shifted after ids of previous fragments (one
+regex pass over bytes, document isn't parsed again) and fragments are
+written into output one after another, so memory depends only on
+number of shards in flight. Number of ids of every fragment is known
+when it is built, so offsets are given in order of shards and ids
+are shifted on worker processes too.
+
+Usage:
+    python -m gwf_graph.sharded relationships.json attributes.json dataset.gwf --workers 8
+    python -m gwf_graph.sharded store dataset.gwf --shard-size 500
+
+@by Vadbeg
+"""
+
+
+import io
+import os
+import re
+import argparse
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union, BinaryIO
+
+from graph_creation.reader import iter_images
+from graph_creation.structure import create_graph_structure, create_graph_structure_attributes
+from graph_creation.scene_graph import SceneGraph
+from graph_creation.store import is_store, open_store
+from graph_creation.instrumentation import Stats, configure, logger, stats
+
+from gwf_graph.gwf_template import GWF, StreamingGWF
+from gwf_graph.id_allocator import SequentialIdAllocator
+from gwf_graph.builder import transform
+
+
+# attributes of .gwf elements which hold element ids
+ID_PATTERN = re.compile(rb' (id|parent|id_b|id_e)="(\d+)"')
+
+
+def strip_document(document: bytes) -> bytes:
+    """
+    Gets elements of .gwf document (without header and footer)
+
+    :param document: .gwf document written by GWF.save or StreamingGWF
+    :return: fragment
+    """
+
+    if document == StreamingGWF.empty_document:
+        return b''
+
+    if not document.startswith(StreamingGWF.header) or not document.endswith(StreamingGWF.footer):
+        raise ValueError('Document is not written by GWF.save or StreamingGWF')
+
+    res = document[len(StreamingGWF.header):-len(StreamingGWF.footer)]
+
+    return res
+
+
+def remap_ids(fragment: bytes, offset: int) -> Tuple[bytes, int]:
+    """
+    Shifts all ids of fragment by offset (parent="0" means no parent, so it isn't changed)
+
+    :param fragment: elements of .gwf document
+    :param offset: value which is added to every id
+    :return: fragment with new ids and max id of given fragment
+    """
+
+    max_id = 0
+
+    def replace(match: re.Match) -> bytes:
+        nonlocal max_id
+
+        idx = int(match.group(2))
+
+        if idx == 0:
+            return match.group(0)
+
+        if idx > max_id:
+            max_id = idx
+
+        return b' %s="%d"' % (match.group(1), idx + offset)
+
+    if offset == 0:
+        for match in ID_PATTERN.finditer(fragment):
+            max_id = max(max_id, int(match.group(2)))
+
+        return fragment, max_id
+
+    res = ID_PATTERN.sub(replace, fragment)
+
+    return res, max_id
+
+
+class GWFMerger:
+    """
+    Writes fragments into one .gwf document. Ids of every fragment
+    are shifted after ids of fragments written before it
+    """
+
+    def __init__(self, target: Union[str, BinaryIO]):
+        """
+        :param target: path to .gwf file or binary file object
+        """
+
+        if isinstance(target, str):
+            self.file = open(target, mode='wb')
+            self.is_own_file = True
+        else:
+            self.file = target
+            self.is_own_file = False
+
+        self.offset = 0
+        self.fragments = 0
+        self.bytes_written = 0
+
+        self.is_empty = True
+        self.is_closed = False
+
+    def __str__(self) -> str:
+        res = f'GWFMerger({self.file!r}, fragments={self.fragments}, offset={self.offset})'
+
+        return res
+
+    def __enter__(self) -> 'GWFMerger':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __write__(self, data: bytes):
+        """
+        Writes data into file
+
+        :param data: bytes to write
+        """
+
+        self.file.write(data)
+        self.bytes_written += len(data)
+
+    def reserve(self, ids: int) -> int:
+        """
+        Reserves ids for fragment, which is remapped outside of merger (see write_fragment)
+
+        :param ids: number of ids of fragment (ids are from 1 to ids)
+        :return: offset which should be added to ids of fragment
+        """
+
+        res = self.offset
+        self.offset += ids
+
+        return res
+
+    def write_fragment(self, fragment: bytes):
+        """
+        Writes elements with already shifted ids (fragments should be written in order of reserve calls)
+
+        :param fragment: elements of .gwf document
+        """
+
+        if not fragment:
+            return
+
+        if self.is_empty:
+            self.__write__(StreamingGWF.header)
+            self.is_empty = False
+
+        self.__write__(fragment)
+        self.fragments += 1
+
+    def add_fragment(self, fragment: bytes):
+        """
+        Shifts ids of fragment and writes it
+
+        :param fragment: elements of .gwf document (see strip_document), ids from 1
+        """
+
+        with stats.stage('gwf_merge'):
+            fragment, max_id = remap_ids(fragment, offset=self.offset)
+
+        self.reserve(max_id)
+        self.write_fragment(fragment)
+
+    def add_document(self, document: bytes):
+        """
+        Writes elements of other .gwf document
+
+        :param document: .gwf document written by GWF.save or StreamingGWF
+        """
+
+        self.add_fragment(strip_document(document))
+
+    def close(self):
+        """
+        Finishes document and closes file (if it was opened by this object)
+        """
+
+        if self.is_closed:
+            return
+
+        if self.is_empty:
+            self.__write__(StreamingGWF.empty_document)
+        else:
+            self.__write__(StreamingGWF.footer)
+
+        if self.is_own_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+        self.is_closed = True
+
+
+def merge_files(paths: List[str], save_path: Union[str, BinaryIO]) -> GWFMerger:
+    """
+    Merges .gwf files (for example result of batch conversion) into one document
+
+    :param paths: paths to .gwf files
+    :param save_path: path (or binary file object) of result .gwf file
+    :return: merger (with number of fragments and bytes written)
+    """
+
+    with GWFMerger(save_path) as merger:
+        for path in paths:
+            with open(path, mode='rb') as file:
+                merger.add_document(file.read())
+
+    return merger
+
+
+def build_fragment(images: List[Tuple[Dict, Dict]], layout: bool = False) -> Tuple[bytes, int]:
+    """
+    Builds fragment with contour for every image. Ids are unique
+    in fragment and start from 1
+
+    :param images: relationships and attributes of images
+    :param layout: compute node coordinates with force-directed layout (for every image)
+    :return: fragment and number of its ids
+    """
+
+    id_allocator = SequentialIdAllocator()
+    buffer = io.BytesIO()
+
+    for relationships, attributes in images:
+        all_relations = list(create_graph_structure(relationships).items())
+        all_attributes = list(create_graph_structure_attributes(attributes).items())
+
+        write_image(all_relations, all_attributes, buffer=buffer, name=f'image_{relationships["image_id"]}',
+                    id_allocator=id_allocator, layout=layout)
+
+    res = buffer.getvalue(), id_allocator.end - 1
+
+    return res
+
+
+def build_store_fragment(directory: str, image_ids: List[int], layout: bool = False) -> Tuple[bytes, int]:
+    """
+    Builds fragment with contour for every image of binary store
+
+    :param directory: store directory
+    :param image_ids: ids of images
+    :param layout: compute node coordinates with force-directed layout (for every image)
+    :return: fragment and number of its ids
+    """
+
+    store = open_store(directory)
+
+    id_allocator = SequentialIdAllocator()
+    buffer = io.BytesIO()
+
+    for image_id in image_ids:
+        write_image(store.get(image_id), None, buffer=buffer, name=f'image_{image_id}',
+                    id_allocator=id_allocator, layout=layout)
+
+    res = buffer.getvalue(), id_allocator.end - 1
+
+    return res
+
+
+def write_image(all_relations: Union[List[Tuple[str, Set[Tuple[str, str]]]], SceneGraph],
+                all_attributes: Optional[List[Tuple[str, Set[str]]]], buffer: io.BytesIO, name: str,
+                id_allocator: SequentialIdAllocator, layout: bool = False):
+    """
+    Appends elements of one image (in its own contour) to fragment
+
+    :param all_relations: all relations of image (or scene graph)
+    :param all_attributes: all attributes of image (can be None if all_relations is scene graph)
+    :param buffer: fragment
+    :param name: name of contour
+    :param id_allocator: allocator of fragment ids (shared by all images of fragment)
+    :param layout: compute node coordinates with force-directed layout
+    """
+
+    document = io.BytesIO()
+
+    if layout:
+        gwf = GWF(id_allocator=id_allocator)
+    else:
+        gwf = StreamingGWF(document, id_allocator=id_allocator)
+
+    transform(gwf, all_relations=all_relations, all_attributes=all_attributes,
+              name=name, save_path=document, layout=layout)
+
+    buffer.write(strip_document(document.getvalue()))
+
+
+def run_shard(shard: Dict, layout: bool = False) -> Tuple[bytes, int, Dict]:
+    """
+    Builds fragment of one shard. Runs in worker process.
+
+    :param shard: shard with images (records or store directory and image ids)
+    :param layout: compute node coordinates with force-directed layout
+    :return: fragment, number of its ids and stats of this shard
+    """
+
+    if 'store' in shard:
+        fragment, ids = build_store_fragment(shard['store'], shard['image_ids'], layout=layout)
+    else:
+        fragment, ids = build_fragment(shard['images'], layout=layout)
+
+    return fragment, ids, stats.pop()
+
+
+def run_remap(fragment: bytes, offset: int) -> Tuple[bytes, Dict]:
+    """
+    Shifts ids of fragment. Runs in worker process.
+
+    :param fragment: elements of .gwf document
+    :param offset: value which is added to every id
+    :return: fragment with new ids and stats of this task
+    """
+
+    with stats.stage('gwf_remap'):
+        fragment, _ = remap_ids(fragment, offset=offset)
+
+    return fragment, stats.pop()
+
+
+def iter_shards(relationships_path: str, attributes_path: Optional[str] = None,
+                shard_size: int = 100) -> Iterator[Dict]:
+    """
+    Splits images of dataset into shards
+
+    :param relationships_path: relationships file (one image or VG dump) or binary store directory
+    :param attributes_path: attributes file (not used for store)
+    :param shard_size: number of images in shard
+    :return: iterator over shards
+    """
+
+    if is_store(relationships_path):
+        image_ids = open_store(relationships_path).image_ids()
+
+        for start in range(0, len(image_ids), shard_size):
+            yield {'store': relationships_path, 'image_ids': image_ids[start:start + shard_size]}
+
+        return
+
+    images = list()
+
+    for relationships, attributes in iter_images(relationships_path, attributes_path):
+        images.append((relationships, attributes))
+
+        if len(images) == shard_size:
+            yield {'images': images}
+            images = list()
+
+    if images:
+        yield {'images': images}
+
+
+def init_worker(log_level: Optional[str] = None, stats_enabled: bool = False):
+    """
+    Configures instrumentation in worker process
+
+    :param log_level: log level (None to keep default)
+    :param stats_enabled: collect per-stage timers and counters
+    """
+
+    configure(level=log_level, stats_enabled=stats_enabled)
+
+    # forked worker gets stats of main process, they are already counted there
+    stats.reset()
+
+
+def build_sharded_gwf(relationships_path: str, attributes_path: Optional[str], save_path: Union[str, BinaryIO],
+                      shard_size: int = 100, workers: Optional[int] = None, layout: bool = False,
+                      log_level: Optional[str] = None) -> GWFMerger:
+    """
+    Builds one .gwf document for all images of dataset on process pool.
+
+    Shards are built in parallel. When shard is ready (and all shards before
+    it) its ids get offset and they are shifted on process pool too, so main
+    process only writes fragments in order of shards. Only limited number of
+    shards is in flight, so memory doesn't depend on dataset size.
+
+    :param relationships_path: relationships file (one image or VG dump) or binary store directory
+    :param attributes_path: attributes file (not used for store)
+    :param save_path: path (or binary file object) of result .gwf file
+    :param shard_size: number of images in shard
+    :param workers: number of worker processes (cpu count by default)
+    :param layout: compute node coordinates with force-directed layout (for every image)
+    :param log_level: log level in worker processes (None to keep default)
+    :return: merger (with number of fragments, ids and bytes written)
+    """
+
+    shards = iter_shards(relationships_path, attributes_path, shard_size=shard_size)
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+
+    with GWFMerger(save_path) as merger:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(log_level, stats.enabled)) as executor:
+            building = deque()
+            remapping = deque()
+
+            def write_remapped(limit: int):
+                while remapping and (remapping[0].done() or len(remapping) > limit):
+                    fragment, remap_stats = remapping.popleft().result()
+                    stats.merge(remap_stats)
+
+                    merger.write_fragment(fragment)
+
+            def merge_built():
+                fragment, ids, shard_stats = building.popleft().result()
+                stats.merge(shard_stats)
+
+                offset = merger.reserve(ids)
+
+                if offset == 0:
+                    # first fragment already has right ids
+                    future = Future()
+                    future.set_result((fragment, Stats().snapshot()))
+                else:
+                    future = executor.submit(run_remap, fragment, offset)
+
+                remapping.append(future)
+                write_remapped(limit=max_in_flight)
+
+            for shard in shards:
+                building.append(executor.submit(run_shard, shard, layout))
+
+                if len(building) >= max_in_flight:
+                    merge_built()
+
+            while building:
+                merge_built()
+
+            write_remapped(limit=0)
+
+    logger.info('%d shards merged, %d ids, %d bytes', merger.fragments, merger.offset, merger.bytes_written)
+
+    return merger
+
+
+def cli(args: Optional[List[str]] = None):
+    """
+    Command line entry point
+
+    :param args: command line arguments (sys.argv by default)
+    """
+
+    parser = argparse.ArgumentParser(description='Builds one .gwf file for all images on several processes')
+
+    parser.add_argument('relationships', help='relationships file (one image or VG dump) or binary store')
+    parser.add_argument('attributes', nargs='?', default=None, help='attributes file (not used for store)')
+    parser.add_argument('output', help='path to result .gwf file')
+    parser.add_argument('--shard-size', type=int, default=100, help='number of images built by worker at once')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--layout', action='store_true', help='compute node coordinates of every image')
+    parser.add_argument('--log-level', default='INFO', help='log level')
+
+    args = parser.parse_args(args)
+
+    if args.attributes is None and not is_store(args.relationships):
+        parser.error('attributes file is required for json input')
+
+    configure(level=args.log_level)
+
+    build_sharded_gwf(args.relationships, args.attributes, args.output, shard_size=args.shard_size,
+                      workers=args.workers, layout=args.layout, log_level=args.log_level)
+
+
+if __name__ == '__main__':
+    cli()
@@ -6,199 +6,111 @@ Script for creating graph which describe given image
 """
 
 
-import json
 import os
 
-from typing import List, Set, Tuple, Dict, Optional
+from typing import Set, Tuple, Dict, Optional, Union, TYPE_CHECKING
 
-from pyvis.network import Network
+from graph_creation.reader import iter_images, is_json_array, get_image_filename
+from graph_creation.scene_graph import SceneGraph
+from graph_creation.cache import OutputCache, get_cache, get_key
+from graph_creation.instrumentation import stats
+# structure builders are re-exported for old imports
+from graph_creation.structure import have_predicate, create_graph_structure, create_graph_structure_attributes
+from pyvis_graph.html_renderer import save_graph
 
+if TYPE_CHECKING:
+    from pyvis_graph.level_of_detail import LevelOfDetail
 
-def have_predicate(relationships: Set[Optional[Tuple[str, str]]], name: str) -> bool:
-    """
-    Check if subject have more than one predicate
-    to the same object
-
-    :param relationships: predicates and objects for subject
-    :param name: name of object which we like to add
-    :return: bool
-    """
-
-    for relationship in relationships:
-        if name == relationship[1]:
-            return True
 
-    return False
-
-
-def create_graph_structure(relationships: Dict) -> Dict[str, Set[Tuple[str, str]]]:
+def create_graph(graph_structure: Union[Dict[str, Set[Tuple[str, str]]], SceneGraph],
+                 graph_structure_attributes: Optional[Dict[str, Set[str]]],
+                 filepath: str, static_layout: bool = False,
+                 level_of_detail: Optional['LevelOfDetail'] = None, image_src: Optional[str] = None):
     """
-    Creates graph structure from raw relationships dict
-
-
-    :param relationships: raw dict of relationships
-    :return: processed relationships
-    """
-
-    result = dict()
-
-    for relationship in (relationships['relationships']):
-        predicate = relationship['predicate']
-        object_info = relationship['object']
-        subject_info = relationship['subject']
-
-        if 'names' in object_info.keys():
-            object_name = object_info['names'][0]
-        elif 'name' in object_info.keys():
-            object_name = object_info['name']
-        else:
-            object_name = ''
-
-        if 'names' in subject_info.keys():
-            subject_name = subject_info['names'][0]
-        elif 'name' in subject_info.keys():
-            subject_name = subject_info['name']
-        else:
-            subject_name = ''
-
-        result.setdefault(subject_name, set())
-
-        if have_predicate(result[subject_name], object_name):
-            continue
-
-        result[subject_name].add((predicate, object_name))
-
-    return result
-
-
-def create_graph_structure_attributes(attributes: Dict) -> Dict[str, Set[str]]:
-    """
-    Creates graph attributes structure from raw attributes dict
-
-    :param attributes: raw dict of attributes
-    :return: processed attributes
-    """
-
-    result = dict()
-
-    for attribute in attributes['attributes']:
-        if 'attributes' in attribute.keys():
-            real_attributes = attribute['attributes']
-        else:
-            real_attributes = list()
-
-        if 'names' in attribute.keys():
-            subjects = attribute['names']
-        else:
-            subjects = ''
+    Creates and save graph from given processed relationships. Page is
+    rendered with html_renderer, so pyvis doesn't write lib/ directory
 
-        for subject in subjects:
-            result.setdefault(subject, set())
-
-            for real_attribute in real_attributes:
-                result[subject].add(real_attribute)
-
-    return result
-
-
-def create_graph(graph_structure: Dict[str, Set[Tuple[str, str]]],
-                 graph_structure_attributes: Dict[str, Set[str]],
-                 filepath: str):
-    """
-    Creates and save graph from given processed relationships
-
-    :param graph_structure: processed relationships
+    :param graph_structure: processed relationships or scene graph
     :param graph_structure_attributes: attributes for every node
+        (can be None if graph_structure is scene graph)
     :param filepath: path in which we like to save file
+    :param static_layout: compute node positions in python and turn off physics in browser
+    :param level_of_detail: level-of-detail cut (None to add all nodes and edges)
+    :param image_src: source of image shown near graph
     :return: None
     """
 
-    graph = Network(directed=True, height='800px', width='800px')
-
-    for el1, connected_elements in graph_structure.items():
-        if el1 not in graph.nodes:
-            graph.add_node(el1)
-
-        for connected_element in connected_elements:
-            el2 = connected_element[1]
-            predicate = connected_element[0]
-
-            if el2 not in graph.nodes:
-                graph.add_node(el2)
-
-            graph.add_edge(el1, el2, title=predicate, label=predicate)
-
-    for subject, attributes in graph_structure_attributes.items():
-        if subject not in graph.nodes:
-            graph.add_node(subject)
-
-        for attribute in attributes:
-
-            if attribute not in graph.nodes:
-                graph.add_node(attribute, color='red')
-
-            graph.add_edge(subject, attribute, color='red')
+    save_graph(graph_structure, graph_structure_attributes, filepath=filepath, image_src=image_src,
+               static_layout=static_layout, level_of_detail=level_of_detail)
 
-    graph.save_graph(filepath)
 
-
-def add_image(filepath: str, image_src: str):
+def convert_image(relationships: Dict, attributes: Dict, res_file: str, static_layout: bool = False,
+                  cache: Optional[OutputCache] = None, level_of_detail: Optional['LevelOfDetail'] = None):
     """
-    Adds image into created html file
+    Transforms one image into .html graph. Page is rendered
+    in memory and written once (see html_renderer)
 
-    :param filepath: path to html file
-    :param image_src: source of image
-    :return: None
+    :param relationships: raw dict of relationships for image
+    :param attributes: raw dict of attributes for image
+    :param res_file: file for res .html file
+    :param static_layout: compute node positions in python and turn off physics in browser
+    :param cache: cache of result files (image isn't rebuilt if it is in cache)
+    :param level_of_detail: level-of-detail cut (None to render all nodes and edges)
     """
 
-    image_div = f"""
-    <div align="left" style="float:right; width: 500px; height: 500px; margin=10px">
-        <img src="{image_src}" width="500px" height="500px">
-    </div>
-    """
+    if cache is not None:
+        settings = {'format': 'html', 'static_layout': static_layout}
 
-    with open(filepath, 'r') as file:
-        html = file.readlines()
+        if level_of_detail is not None:
+            settings['level_of_detail'] = level_of_detail.settings()
 
-    body_close_index = 0
+        key = get_key(relationships, attributes, settings=settings)
 
-    for index, line in enumerate(html):
-        if line.strip() == '</body>':
-            body_close_index = index
+        if cache.get(key, extension='.html', res_file=res_file):
+            stats.count('html_cache_hits')
+            return
+
+    graph_structure = create_graph_structure(relationships)
+    graph_structure_attributes = create_graph_structure_attributes(attributes)
 
-    res_html = html[:body_close_index] + [image_div] + html[body_close_index:]
+    with stats.stage('html_render'):
+        save_graph(graph_structure, graph_structure_attributes, filepath=res_file,
+                   image_src=attributes.get('image_url'), static_layout=static_layout,
+                   level_of_detail=level_of_detail)
 
-    with open(filepath, 'w') as file:
-        file.write(''.join(res_html))
+    if cache is not None:
+        cache.put(key, extension='.html', res_file=res_file)
 
 
-def main(relationships_file: str, attributes_file: str, res_file: str):
+def main(relationships_file: str, attributes_file: str, res_file: str, cache_dir: Optional[str] = None):
     """
     Main method. Preforms transformation.
 
+    Files can hold one image or be full VG dumps. For dumps
+    one .html file is created for every image (res_<image_id>.html).
+
     :param relationships_file: name of file with relations
     :param attributes_file: name of file with attributes
     :param res_file: file for res .html file
+    :param cache_dir: directory of result files cache (None to disable cache)
     """
 
+    cache = get_cache(cache_dir)
+
     directory = '../data'
 
     filepath_relationship = os.path.join(directory, relationships_file)
     filepath_attributes = os.path.join(directory, attributes_file)
 
-    with open(filepath_relationship, 'rb') as file:
-        relationships = json.load(file)
-
-    with open(filepath_attributes, 'rb') as file:
-        attributes = json.load(file)
-
-    image_url = attributes['image_url']
+    is_dump = is_json_array(filepath_relationship)
 
-    graph_structure = create_graph_structure(relationships)
-    graph_structure_attributes = create_graph_structure_attributes(attributes)
+    for relationships, attributes in iter_images(filepath_relationship, filepath_attributes):
+        if is_dump:
+            curr_res_file = get_image_filename(res_file, image_id=relationships['image_id'])
+        else:
+            curr_res_file = res_file
 
-    create_graph(graph_structure, graph_structure_attributes, res_file)
-    add_image(filepath=res_file, image_src=image_url)
+        convert_image(relationships, attributes, res_file=curr_res_file, cache=cache)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,287 @@
+"""
+Renderer of graph .html pages without pyvis Network
+
+Template is compiled once per process, nodes, edges and image
+are rendered in one pass and file is written once.
+
+@by Vadbeg
+"""
+
+
+import json
+import functools
+
+from typing import Dict, List, Set, Tuple, Optional, Union, TYPE_CHECKING
+
+from graph_creation.scene_graph import SceneGraph, get_relation_items, get_attribute_items
+from graph_creation.instrumentation import logger, stats
+
+if TYPE_CHECKING:
+    from pyvis_graph.level_of_detail import LevelOfDetail
+
+
+TEMPLATE = """<html>
+<head>
+<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/vis/4.16.1/vis.css" type="text/css" />
+<script type="text/javascript" src="https://cdnjs.cloudflare.com/ajax/libs/vis/4.16.1/vis-network.min.js"> </script>
+
+<style type="text/css">
+
+        #mynetwork {
+            width: {{ width }};
+            height: {{ height }};
+            background-color: #ffffff;
+            border: 1px solid lightgray;
+            position: relative;
+            float: left;
+        }
+
+</style>
+
+</head>
+
+<body>
+<div id = "mynetwork"></div>
+
+<script type="text/javascript">
+
+    var nodes = new vis.DataSet({{ nodes }});
+    var edges = new vis.DataSet({{ edges }});
+
+    var container = document.getElementById('mynetwork');
+    var data = {nodes: nodes, edges: edges};
+    var options = {{ options }};
+
+    var network = new vis.Network(container, data, options);
+
+</script>
+{% if image_src %}
+    <div align="left" style="float:right; width: 500px; height: 500px; margin=10px">
+        <img src="{{ image_src|e }}" width="500px" height="500px">
+    </div>
+{% endif %}
+</body>
+</html>
+"""
+
+NODE_COLOR = '#97c2fc'
+ATTRIBUTE_COLOR = 'red'
+
+
+@functools.lru_cache(maxsize=None)
+def get_template():
+    """
+    Compiles template (once per process)
+
+    :return: jinja2 template
+    """
+
+    import jinja2
+
+    environment = jinja2.Environment(autoescape=False)
+    template = environment.from_string(TEMPLATE)
+
+    return template
+
+
+def to_script_json(value) -> str:
+    """
+    Dumps value into json which is safe inside <script> tag
+
+    :param value: value to dump
+    :return: json string
+    """
+
+    res = json.dumps(value).replace('</', '<\\/')
+
+    return res
+
+
+def create_graph_data(graph_structure: Union[Dict[str, Set[Tuple[str, str]]], SceneGraph],
+                      graph_structure_attributes: Optional[Dict[str, Set[str]]]
+                      ) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Creates vis.js nodes and edges from processed relationships and attributes.
+    Node gets options from its first appearance (like in pyvis)
+
+    :param graph_structure: processed relationships or scene graph
+    :param graph_structure_attributes: attributes for every node
+        (can be None if graph_structure is scene graph)
+    :return: nodes and edges
+    """
+
+    if isinstance(graph_structure, SceneGraph) and graph_structure_attributes is None:
+        graph_structure_attributes = graph_structure
+
+    nodes = dict()
+    edges = list()
+
+    for el1, connected_elements in get_relation_items(graph_structure):
+        if el1 not in nodes:
+            nodes[el1] = {'id': el1, 'label': el1, 'shape': 'dot', 'color': NODE_COLOR}
+
+        for predicate, el2 in connected_elements:
+            if el2 not in nodes:
+                nodes[el2] = {'id': el2, 'label': el2, 'shape': 'dot', 'color': NODE_COLOR}
+
+            edges.append({'from': el1, 'to': el2, 'title': predicate, 'label': predicate, 'arrows': 'to'})
+
+    for subject, attributes in get_attribute_items(graph_structure_attributes):
+        if subject not in nodes:
+            nodes[subject] = {'id': subject, 'label': subject, 'shape': 'dot', 'color': NODE_COLOR}
+
+        for attribute in attributes:
+            if attribute not in nodes:
+                nodes[attribute] = {'id': attribute, 'label': attribute, 'shape': 'dot', 'color': ATTRIBUTE_COLOR}
+
+            edges.append({'from': subject, 'to': attribute, 'color': ATTRIBUTE_COLOR, 'arrows': 'to'})
+
+    return list(nodes.values()), edges
+
+
+def set_static_positions(nodes: List[Dict], edges: List[Dict],
+                         iterations: int = 50, seed: Optional[int] = 0):
+    """
+    Computes node positions with force-directed layout and
+    excludes nodes from physics simulation
+
+    :param nodes: vis.js nodes
+    :param edges: vis.js edges
+    :param iterations: number of layout iterations
+    :param seed: seed for initial positions
+    """
+
+    from graph_creation.layout import force_directed_layout
+
+    node_indices = {node['id']: idx for idx, node in enumerate(nodes)}
+    edge_indices = [(node_indices[edge['from']], node_indices[edge['to']]) for edge in edges]
+
+    positions = force_directed_layout(edge_indices, n_nodes=len(nodes), iterations=iterations, seed=seed)
+    positions = positions - positions.mean(axis=0)
+
+    for node, (x, y) in zip(nodes, positions.round().tolist()):
+        node['x'] = x
+        node['y'] = y
+        node['physics'] = False
+
+
+class HTMLRenderer:
+    """
+    Renders graph page from vis.js nodes and edges
+    """
+
+    def __init__(self, height: str = '800px', width: str = '800px'):
+        """
+        :param height: height of graph
+        :param width: width of graph
+        """
+
+        self.height = height
+        self.width = width
+
+    def render(self, nodes: List[Dict], edges: List[Dict],
+               image_src: Optional[str] = None, physics: bool = True) -> str:
+        """
+        Renders html page
+
+        :param nodes: vis.js nodes
+        :param edges: vis.js edges
+        :param image_src: source of image shown near graph
+        :param physics: run physics simulation in browser
+        :return: html page
+        """
+
+        options = {'physics': {'enabled': physics}}
+
+        html = get_template().render(height=self.height, width=self.width,
+                                     nodes=to_script_json(nodes),
+                                     edges=to_script_json(edges),
+                                     options=to_script_json(options),
+                                     image_src=image_src)
+
+        return html
+
+    def write(self, filepath: str, nodes: List[Dict], edges: List[Dict],
+              image_src: Optional[str] = None, physics: bool = True):
+        """
+        Renders html page and writes it into file
+
+        :param filepath: path to html file
+        :param nodes: vis.js nodes
+        :param edges: vis.js edges
+        :param image_src: source of image shown near graph
+        :param physics: run physics simulation in browser
+        """
+
+        html = self.render(nodes, edges, image_src=image_src, physics=physics)
+
+        with open(filepath, mode='w', encoding='utf-8') as file:
+            file.write(html)
+
+
+def render_graph(graph_structure: Union[Dict[str, Set[Tuple[str, str]]], SceneGraph],
+                 graph_structure_attributes: Optional[Dict[str, Set[str]]],
+                 image_src: Optional[str] = None, static_layout: bool = False,
+                 renderer: Optional[HTMLRenderer] = None,
+                 level_of_detail: Optional['LevelOfDetail'] = None) -> str:
+    """
+    Renders graph page from processed relationships and attributes
+
+    :param graph_structure: processed relationships or scene graph
+    :param graph_structure_attributes: attributes for every node
+        (can be None if graph_structure is scene graph)
+    :param image_src: source of image shown near graph
+    :param static_layout: compute node positions in python and turn off physics in browser
+    :param renderer: html renderer (default one if None)
+    :param level_of_detail: level-of-detail cut (None to render all nodes and edges)
+    :return: html page
+    """
+
+    if renderer is None:
+        renderer = HTMLRenderer()
+
+    if level_of_detail is None:
+        nodes, edges = create_graph_data(graph_structure, graph_structure_attributes)
+    else:
+        with stats.stage('html_level_of_detail'):
+            nodes, edges = level_of_detail.create_graph_data(graph_structure, graph_structure_attributes)
+
+    if static_layout:
+        with stats.stage('html_layout'):
+            set_static_positions(nodes, edges)
+
+    stats.count('html_nodes_emitted', len(nodes))
+    stats.count('html_edges_emitted', len(edges))
+
+    html = renderer.render(nodes, edges, image_src=image_src, physics=not static_layout)
+
+    return html
+
+
+def save_graph(graph_structure: Union[Dict[str, Set[Tuple[str, str]]], SceneGraph],
+               graph_structure_attributes: Optional[Dict[str, Set[str]]],
+               filepath: str, image_src: Optional[str] = None, static_layout: bool = False,
+               renderer: Optional[HTMLRenderer] = None,
+               level_of_detail: Optional['LevelOfDetail'] = None):
+    """
+    Renders graph page and writes it into file (in one pass)
+
+    :param graph_structure: processed relationships or scene graph
+    :param graph_structure_attributes: attributes for every node
+        (can be None if graph_structure is scene graph)
+    :param filepath: path to html file
+    :param image_src: source of image shown near graph
+    :param static_layout: compute node positions in python and turn off physics in browser
+    :param renderer: html renderer (default one if None)
+    :param level_of_detail: level-of-detail cut (None to render all nodes and edges)
+    """
+
+    html = render_graph(graph_structure, graph_structure_attributes, image_src=image_src,
+                        static_layout=static_layout, renderer=renderer,
+                        level_of_detail=level_of_detail).encode('utf-8')
+
+    with open(filepath, mode='wb') as file:
+        file.write(html)
+
+    stats.count('html_bytes_written', len(html))
+    logger.debug('%s: %d bytes', filepath, len(html))
@@ -0,0 +1,270 @@
+"""
+Level-of-detail cut of big graphs before rendering
+
+Graph is reduced in python, so size of page (and load time
+in browser) is bounded however big image or dataset graph is:
+
+    - attributes are collapsed into their subject node (count badge
+      in label, attributes in tooltip)
+    - leaf objects of one subject and predicate can be clustered
+      into one node
+    - only max_nodes nodes with the highest degree (and max_edges
+      edges between them) are kept
+
+@by Vadbeg
+"""
+
+
+import html
+import heapq
+
+from typing import Dict, List, Set, Tuple, Optional, Union
+
+from graph_creation.scene_graph import SceneGraph, get_relation_items, get_attribute_items
+from graph_creation.instrumentation import stats
+from pyvis_graph.html_renderer import NODE_COLOR, ATTRIBUTE_COLOR
+
+
+CLUSTER_COLOR = '#ffa807'
+
+
+def get_title(items: List[str], max_items: int) -> str:
+    """
+    Creates tooltip with list of items (only first max_items are shown)
+
+    :param items: items of list
+    :param max_items: max number of shown items
+    :return: html of tooltip
+    """
+
+    res = ', '.join(html.escape(item) for item in items[:max_items])
+
+    if len(items) > max_items:
+        res += f' and {len(items) - max_items} more'
+
+    return res
+
+
+class LevelOfDetail:
+    """
+    Settings of level-of-detail cut. Creates vis.js nodes
+    and edges like html_renderer.create_graph_data does
+    """
+
+    def __init__(self, max_nodes: Optional[int] = 200, max_edges: Optional[int] = 1000,
+                 collapse_attributes: bool = True, cluster_predicates: bool = False,
+                 max_title_items: int = 20):
+        """
+        :param max_nodes: max number of nodes (None for all nodes)
+        :param max_edges: max number of edges (None for all edges between kept nodes)
+        :param collapse_attributes: show attributes as count badge of subject node
+        :param cluster_predicates: merge objects which are linked only with one subject
+            by the same predicate into one node
+        :param max_title_items: max number of attributes (objects) in tooltip of node
+        """
+
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        self.collapse_attributes = collapse_attributes
+        self.cluster_predicates = cluster_predicates
+        self.max_title_items = max_title_items
+
+    def settings(self) -> Dict:
+        """
+        Gets settings (for cache key)
+
+        :return: settings dict
+        """
+
+        res = {'max_nodes': self.max_nodes, 'max_edges': self.max_edges,
+               'collapse_attributes': self.collapse_attributes,
+               'cluster_predicates': self.cluster_predicates,
+               'max_title_items': self.max_title_items}
+
+        return res
+
+    def __cluster__(self, relations: List[Tuple[str, str, str]],
+                    graph_structure_attributes: Dict[str, Set[str]]
+                    ) -> Tuple[List[Tuple[str, str, str]], Dict[str, List[str]]]:
+        """
+        Merges leaf objects of the same subject and predicate
+
+        :param relations: list of (subject, predicate, object)
+        :param graph_structure_attributes: attributes for every node
+        :return: relations with cluster ids instead of objects and objects of every cluster
+        """
+
+        degrees = dict()
+
+        for subject, _, object_name in relations:
+            degrees[subject] = degrees.get(subject, 0) + 1
+            degrees[object_name] = degrees.get(object_name, 0) + 1
+
+        groups = dict()
+
+        for subject, predicate, object_name in relations:
+            if degrees[object_name] == 1 and not graph_structure_attributes.get(object_name):
+                groups.setdefault((subject, predicate), list()).append(object_name)
+
+        clusters = dict()
+        clustered_objects = set()
+
+        for (subject, predicate), objects in groups.items():
+            if len(objects) > 1:
+                clusters[f'cluster:{subject}:{predicate}'] = objects
+                clustered_objects.update(objects)
+
+        res = list()
+        added_clusters = set()
+
+        for subject, predicate, object_name in relations:
+            if object_name not in clustered_objects:
+                res.append((subject, predicate, object_name))
+                continue
+
+            cluster_id = f'cluster:{subject}:{predicate}'
+
+            if cluster_id not in added_clusters:
+                added_clusters.add(cluster_id)
+                res.append((subject, predicate, cluster_id))
+
+        return res, clusters
+
+    def create_graph_data(self, graph_structure: Union[Dict[str, Set[Tuple[str, str]]], SceneGraph],
+                          graph_structure_attributes: Optional[Dict[str, Set[str]]]
+                          ) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Creates vis.js nodes and edges of reduced graph
+
+        :param graph_structure: processed relationships or scene graph
+        :param graph_structure_attributes: attributes for every node
+            (can be None if graph_structure is scene graph)
+        :return: nodes and edges
+        """
+
+        if isinstance(graph_structure, SceneGraph) and graph_structure_attributes is None:
+            graph_structure_attributes = graph_structure
+
+        relations = [(subject, predicate, object_name)
+                     for subject, connected_elements in get_relation_items(graph_structure)
+                     for predicate, object_name in connected_elements]
+
+        attribute_items = get_attribute_items(graph_structure_attributes)
+
+        clusters = dict()
+
+        if self.cluster_predicates:
+            relations, clusters = self.__cluster__(relations, dict(attribute_items))
+
+        # nodes in order of first appearance (like in create_graph_data)
+        order = dict()
+        edges = list()
+
+        for subject, predicate, object_name in relations:
+            order.setdefault(subject, len(order))
+            order.setdefault(object_name, len(order))
+
+            edges.append((subject, object_name, predicate))
+
+        attribute_nodes = set()
+        collapsed = dict()
+
+        for subject, attributes in attribute_items:
+            order.setdefault(subject, len(order))
+
+            if self.collapse_attributes:
+                if attributes:
+                    collapsed[subject] = sorted(attributes)
+
+                continue
+
+            for attribute in attributes:
+                if attribute not in order:
+                    order[attribute] = len(order)
+                    attribute_nodes.add(attribute)
+
+                edges.append((subject, attribute, None))
+
+        degrees = dict.fromkeys(order, 0)
+
+        for from_node, to_node, _ in edges:
+            degrees[from_node] += 1
+            degrees[to_node] += 1
+
+        for subject, attributes in collapsed.items():
+            degrees[subject] += len(attributes)
+
+        kept = order
+
+        if self.max_nodes is not None and len(order) > self.max_nodes:
+            kept = set(heapq.nlargest(self.max_nodes, order, key=lambda node: (degrees[node], -order[node])))
+
+        kept_edges = [edge for edge in edges if edge[0] in kept and edge[1] in kept]
+
+        if self.max_edges is not None and len(kept_edges) > self.max_edges:
+            kept_edges = sorted(kept_edges, key=lambda edge: -(degrees[edge[0]] + degrees[edge[1]]))
+            kept_edges = kept_edges[:self.max_edges]
+
+        hidden_edges = {node: degrees[node] - len(collapsed.get(node, ())) for node in kept}
+
+        for from_node, to_node, _ in kept_edges:
+            hidden_edges[from_node] -= 1
+            hidden_edges[to_node] -= 1
+
+        nodes = list()
+
+        for node in sorted(kept, key=order.get):
+            nodes.append(self.__create_node__(node, clusters=clusters, collapsed=collapsed,
+                                              is_attribute=node in attribute_nodes,
+                                              hidden_edges=hidden_edges[node]))
+
+        res_edges = list()
+
+        for from_node, to_node, predicate in kept_edges:
+            if predicate is None:
+                res_edges.append({'from': from_node, 'to': to_node, 'color': ATTRIBUTE_COLOR, 'arrows': 'to'})
+            else:
+                res_edges.append({'from': from_node, 'to': to_node, 'title': predicate, 'label': predicate,
+                                  'arrows': 'to'})
+
+        stats.count('html_nodes_hidden', len(order) - len(nodes))
+        stats.count('html_edges_hidden', len(edges) - len(res_edges))
+
+        return nodes, res_edges
+
+    def __create_node__(self, node: str, clusters: Dict[str, List[str]], collapsed: Dict[str, List[str]],
+                        is_attribute: bool, hidden_edges: int) -> Dict:
+        """
+        Creates vis.js node
+
+        :param node: id of node
+        :param clusters: objects of every cluster
+        :param collapsed: collapsed attributes of every node
+        :param is_attribute: node is attribute
+        :param hidden_edges: number of edges of node which were cut
+        :return: vis.js node
+        """
+
+        res = {'id': node, 'label': node, 'shape': 'dot', 'color': ATTRIBUTE_COLOR if is_attribute else NODE_COLOR}
+        title = list()
+
+        if node in clusters:
+            objects = clusters[node]
+
+            res['label'] = f'{len(objects)} objects'
+            res['color'] = CLUSTER_COLOR
+            title.append(get_title(objects, self.max_title_items))
+
+        attributes = collapsed.get(node)
+
+        if attributes:
+            res['label'] = f'{node} +{len(attributes)}'
+            title.append('attributes: ' + get_title(attributes, self.max_title_items))
+
+        if hidden_edges > 0:
+            title.append(f'{hidden_edges} hidden edges')
+
+        if title:
+            res['title'] = '<br>'.join(title)
+
+        return res
@@ -9,5 +9,20 @@ setup(
     name='graph_creation',
     version='2.0',
     packages=find_packages(),
-    install_requires=install_requires
+    install_requires=install_requires,
+    extras_require={
+        'fast': ['orjson'],
+        'parquet': ['pyarrow'],
+    },
+    entry_points={
+        'console_scripts': [
+            'graph-batch=graph_creation.batch:cli',
+            'graph-service=graph_creation.service:cli',
+            'graph-aggregate=graph_creation.aggregate:cli',
+            'graph-index=graph_creation.index:cli',
+            'graph-store=graph_creation.store:cli',
+            'graph-gwf=gwf_graph.sharded:cli',
+            'graph-export=graph_creation.export:cli',
+        ],
+    },
 )
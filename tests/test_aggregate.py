@@ -0,0 +1,139 @@
+"""
+Tests for resuming knowledge graph build from reader offsets
+
+@by Vadbeg
+"""
+
+
+import json
+import itertools
+
+import pytest
+
+from graph_creation import json_backend
+from graph_creation.aggregate import KnowledgeGraph
+from graph_creation.reader import iter_images_with_offsets
+
+
+NAMES = ('man', 'shirt', 'tree', 'café', 'собака', 'street')
+PREDICATES = ('on', 'wears', 'near', 'под')
+ATTRIBUTES = ('red', 'tall', 'зелёный', 'old')
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def backend(request):
+    old_backend = json_backend.backend
+
+    yield json_backend.set_backend(request.param)
+
+    json_backend.set_backend(old_backend)
+
+
+def create_dataset(directory, num_images, out_of_order=False):
+    """
+    Creates VG-like dump files
+
+    :param directory: directory of files
+    :param num_images: number of images
+    :param out_of_order: swap attributes of neighbour images, drop some of them
+        and add attributes of images without relationships
+    :return: paths to relationships and attributes files
+    """
+
+    relationships = list()
+    attributes = list()
+
+    for image_id in range(1, num_images + 1):
+        objects = [{'object_id': image_id * 10 + idx, 'names': [NAMES[(image_id + idx * 7) % len(NAMES)]],
+                    'x': idx, 'y': idx, 'w': 10, 'h': 10}
+                   for idx in range(image_id % 4 + 2)]
+
+        relationships.append({'image_id': image_id,
+                              'relationships': [{'predicate': PREDICATES[(image_id + idx) % len(PREDICATES)],
+                                                 'subject': subject, 'object': obj}
+                                                for idx, (subject, obj) in enumerate(zip(objects, objects[1:]))]})
+        attributes.append({'image_id': image_id,
+                           'attributes': [dict(obj, attributes=[ATTRIBUTES[(image_id * idx) % len(ATTRIBUTES)]])
+                                          for idx, obj in enumerate(objects)]})
+
+    if out_of_order:
+        for idx in range(1, len(attributes) - 1, 3):
+            attributes[idx], attributes[idx + 1] = attributes[idx + 1], attributes[idx]
+
+        attributes = [curr_attributes for idx, curr_attributes in enumerate(attributes) if idx % 11 != 5]
+        attributes.append({'image_id': num_images + 1,
+                           'attributes': [{'object_id': 1, 'names': ['lamp'], 'attributes': ['bright']}]})
+
+    relationships_path = directory / 'relationships.json'
+    attributes_path = directory / 'attributes.json'
+
+    relationships_path.write_text(json.dumps(relationships, ensure_ascii=False, indent=1), encoding='utf-8')
+    attributes_path.write_text(json.dumps(attributes, ensure_ascii=False), encoding='utf-8')
+
+    return str(relationships_path), str(attributes_path)
+
+
+def get_edges(graph):
+    triples = sorted((subject, predicate, obj, count, sorted(image_ids))
+                     for subject, predicate, obj, count, image_ids in graph.triples())
+    attribute_pairs = sorted((subject, attribute, count, sorted(image_ids))
+                             for subject, attribute, count, image_ids in graph.attribute_pairs())
+
+    return triples, attribute_pairs
+
+
+def test_iter_images_from_offsets(tmp_path, backend):
+    paths = create_dataset(tmp_path, num_images=50)
+
+    images = list(iter_images_with_offsets(*paths, chunk_size=512))
+
+    assert len(images) == 50
+    assert all(offsets is not None for _, _, offsets in images)
+
+    for idx in (0, 1, 17, 48, 49):
+        offsets = images[idx][2]
+        resumed = [(relationships, attributes)
+                   for relationships, attributes, _ in iter_images_with_offsets(*paths, chunk_size=512,
+                                                                                offsets=offsets)]
+
+        assert resumed == [(relationships, attributes) for relationships, attributes, _ in images[idx + 1:]]
+
+
+@pytest.mark.parametrize('out_of_order', [False, True])
+def test_resume_from_checkpoint(tmp_path, backend, out_of_order):
+    paths = create_dataset(tmp_path, num_images=500, out_of_order=out_of_order)
+    checkpoint_path = str(tmp_path / 'kg.pickle')
+
+    full_graph = KnowledgeGraph()
+    assert full_graph.add_dataset(*paths) == (501 if out_of_order else 500)
+
+    # build is interrupted after 200 images (out of order attributes of image 201 are held then)
+    graph = KnowledgeGraph()
+    images = itertools.islice(graph.__iter_dataset__(*paths), 200)
+    assert graph.add_images(images, checkpoint_path=checkpoint_path) == 200
+
+    resumed_graph = KnowledgeGraph.load(checkpoint_path)
+    assert resumed_graph.offsets is not None
+
+    if not out_of_order:
+        relationships, _, _ = next(iter_images_with_offsets(*paths, offsets=resumed_graph.offsets))
+        assert relationships['image_id'] == 201
+
+    assert resumed_graph.add_dataset(*paths) == (301 if out_of_order else 300)
+    assert resumed_graph.image_ids == full_graph.image_ids
+    assert get_edges(resumed_graph) == get_edges(full_graph)
+
+
+def test_offsets_of_other_files_are_ignored(tmp_path, backend):
+    paths = create_dataset(tmp_path, num_images=20)
+    checkpoint_path = str(tmp_path / 'kg.pickle')
+
+    graph = KnowledgeGraph()
+    graph.add_images(itertools.islice(graph.__iter_dataset__(*paths), 10), checkpoint_path=checkpoint_path)
+
+    # dataset is rewritten, so saved offsets don't point to the same images
+    paths = create_dataset(tmp_path, num_images=30)
+
+    resumed_graph = KnowledgeGraph.load(checkpoint_path)
+    assert resumed_graph.add_dataset(*paths) == 20
+    assert len(resumed_graph.image_ids) == 30
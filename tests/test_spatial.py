@@ -0,0 +1,127 @@
+"""
+Tests for spatial relations of images with few objects
+
+@by Vadbeg
+"""
+
+
+import numpy as np
+
+from graph_creation.spatial import Boxes, GridIndex, compute_relations, create_graph_structure_spatial, \
+    get_nearest, spatial_edges
+
+
+def test_get_nearest_without_candidates():
+    rows, nearest = get_nearest(np.zeros((0, 0), dtype=bool), np.zeros((0, 0)))
+
+    assert len(rows) == 0
+    assert len(nearest) == 0
+
+    rows, nearest = get_nearest(np.zeros((2, 2), dtype=bool), np.ones((2, 2)))
+
+    assert len(rows) == 0
+    assert len(nearest) == 0
+
+
+def test_image_without_objects():
+    relationships = {'image_id': 1, 'relationships': list()}
+    attributes = {'image_id': 1, 'attributes': list()}
+
+    boxes = Boxes.from_json(relationships, attributes)
+
+    assert len(boxes) == 0
+    assert compute_relations(boxes)['iou'].shape == (0, 0)
+    assert spatial_edges(boxes) == list()
+    assert create_graph_structure_spatial(relationships, attributes) == dict()
+    assert len(GridIndex(boxes).query(0, 0, 100, 100)) == 0
+
+
+def test_objects_without_boxes():
+    relationships = {'image_id': 1,
+                     'relationships': [{'predicate': 'on',
+                                        'subject': {'object_id': 1, 'name': 'cup'},
+                                        'object': {'object_id': 2, 'name': 'table'}}]}
+
+    assert len(Boxes.from_json(relationships)) == 0
+    assert create_graph_structure_spatial(relationships) == {'cup': {('on', 'table')}}
+
+
+def test_one_object():
+    attributes = {'image_id': 1,
+                  'attributes': [{'object_id': 1, 'names': ['cup'], 'x': 10, 'y': 20, 'w': 30, 'h': 40}]}
+
+    boxes = Boxes.from_json({'image_id': 1, 'relationships': list()}, attributes)
+
+    assert len(boxes) == 1
+    assert spatial_edges(boxes) == list()
+    assert GridIndex(boxes).query(0, 0, 15, 25).tolist() == [0]
+    assert len(GridIndex(boxes).query(100, 100, 200, 200)) == 0
+
+
+def create_boxes(coords: list) -> Boxes:
+    res = Boxes(ids=np.arange(len(coords)), names=[f'object{idx}' for idx in range(len(coords))],
+                boxes=np.array(coords, dtype=np.float64).reshape(-1, 4))
+
+    return res
+
+
+def test_relations_of_known_boxes():
+    boxes = create_boxes([(0, 0, 10, 10), (5, 0, 15, 10), (1, 1, 3, 3)])
+    relations = compute_relations(boxes)
+
+    assert np.isclose(relations['intersection'][0, 1], 50)
+    assert np.isclose(relations['iou'][0, 1], 1 / 3)
+    assert np.isclose(relations['iou'][1, 0], 1 / 3)
+    assert np.isclose(relations['containment'][0, 1], 0.5)
+    assert np.isclose(relations['containment'][2, 0], 1.0)
+    assert np.isclose(relations['containment'][0, 2], 0.04)
+    assert relations['iou'][0, 0] == 1.0
+
+    assert relations['inside'][2, 0] and not relations['inside'][0, 2]
+    assert not relations['inside'].diagonal().any()
+    assert relations['left_of'][2, 1] and not relations['left_of'][0, 1]
+
+
+def test_spatial_edges_of_known_boxes():
+    # object1 and object2 are in one row, object1 and object3 in one column, all of them are inside object0
+    boxes = create_boxes([(0, 0, 100, 100), (10, 10, 20, 20), (30, 10, 40, 20), (10, 40, 20, 50)])
+
+    assert set(spatial_edges(boxes)) == {(1, 0, 'inside'), (2, 0, 'inside'), (3, 0, 'inside'),
+                                         (1, 2, 'left of'), (1, 3, 'above')}
+
+
+def test_spatial_edges_nearest_and_overlaps():
+    # object1 is nearer to object0 than object2, object3 is almost the same box as object0
+    boxes = create_boxes([(0, 0, 10, 10), (12, 0, 20, 10), (40, 0, 50, 10), (0, 0, 10, 11)])
+    edges = set(spatial_edges(boxes))
+
+    assert (0, 1, 'left of') in edges
+    assert (0, 2, 'left of') not in edges
+    assert (1, 2, 'left of') in edges
+    assert (0, 3, 'overlaps') in edges
+    assert (0, 3, 'inside') in edges
+
+
+def test_grid_index_matches_scan():
+    rand = np.random.default_rng(0)
+
+    corners = rand.uniform(0, 1000, (5000, 2))
+    boxes = create_boxes(np.hstack([corners, corners + rand.uniform(1, 20, (5000, 2))]))
+    coords = boxes.boxes
+
+    index = GridIndex(boxes)
+    assert len(index) >= index.scan_limit
+
+    regions = [(10, 500, 20, 400), (500, 10, 400, 20), (-100, -100, -50, -50), (2000, 2000, 3000, 3000),
+               (-100, -100, 2000, 2000), (500, 500, 500, 500)]
+
+    for _ in range(100):
+        x0, y0 = rand.uniform(-50, 1050, 2)
+        x1, y1 = x0 + rand.uniform(0, 200), y0 + rand.uniform(0, 200)
+        regions.append((x0, y0, x1, y1))
+
+    for x0, y0, x1, y1 in regions:
+        expected = [idx for idx, (bx0, by0, bx1, by1) in enumerate(coords.tolist())
+                    if bx0 <= x1 and bx1 >= x0 and by0 <= y1 and by1 >= y0]
+
+        assert index.query(x0, y0, x1, y1).tolist() == expected